@@ -28,25 +28,22 @@ export async function POST(request: Request) {
       }, { status: 401 })
     }
 
-    // Store notification in the database for each recipient
-    for (const recipient of emailData.to) {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/notifications`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          "Authorization": authHeader,
-        },
-        body: JSON.stringify({
-          recipient_email: recipient,
-          subject: emailData.subject,
-          body: emailData.body,
-          sent_at: new Date().toISOString(),
-        }),
-      })
-
-      if (!response.ok) {
-        throw new Error(`Failed to create notification: ${response.statusText}`)
-      }
+    // Store the notifications for all recipients in one request (one transaction on the backend)
+    const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/notifications/bulk`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "Authorization": authHeader,
+      },
+      body: JSON.stringify({
+        recipients: emailData.to,
+        subject: emailData.subject,
+        body: emailData.body,
+      }),
+    })
+
+    if (!response.ok) {
+      throw new Error(`Failed to create notifications: ${response.statusText}`)
     }
 
     // Send actual email based on the configured provider
@@ -49,8 +49,7 @@ export default function ManagerDashboardPage() {
         setIsLoading(true)
 
         // Fetch team members
-        const usersResponse = await api.get("/users")
-        const teamUsers = usersResponse.filter((u: any) => u.team_id === user.team_id)
+        const teamUsers = await api.get(`/teams/${user.team_id}/members`)
         setTeamMembers(teamUsers)
 
         // Fetch team tasks
@@ -0,0 +1,90 @@
+"""
+Event-loop blocking benchmark: p50/p99 latency of fast requests while slow queries run.
+
+Simulates async handlers that run a blocking "query" (time.sleep releases the GIL just
+like a pyodbc call waiting on the server). Each run fires a mix of fast and slow requests
+concurrently, either calling the query inline on the event loop (the old behaviour of
+get_current_user, login, create_task and update_task) or through database.run_db.
+
+Run from the backend directory:
+    python -m benchmarks.bench_event_loop --fast 400 --slow 20 --slow-ms 250
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from database import run_db, DB_EXECUTOR_WORKERS
+
+
+def blocking_query(duration: float):
+    time.sleep(duration)
+
+
+async def handle_inline(duration: float):
+    blocking_query(duration)
+
+
+async def handle_executor(duration: float):
+    await run_db(blocking_query, duration)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+async def run_scenario(handler, fast: int, slow: int, fast_ms: float, slow_ms: float, spread_ms: float, seed: int):
+    rng = random.Random(seed)
+    requests = [("fast", fast_ms / 1000)] * fast + [("slow", slow_ms / 1000)] * slow
+    rng.shuffle(requests)
+    latencies = {"fast": [], "slow": []}
+
+    started = time.perf_counter()
+
+    async def one(kind, duration, delay):
+        # Latency counts from the scheduled arrival, so time spent waiting for a blocked loop is included
+        await asyncio.sleep(delay)
+        await handler(duration)
+        latencies[kind].append((time.perf_counter() - started - delay) * 1000)
+
+    await asyncio.gather(*(
+        one(kind, duration, rng.uniform(0, spread_ms / 1000)) for kind, duration in requests
+    ))
+    wall_ms = (time.perf_counter() - started) * 1000
+
+    result = {"wall_ms": round(wall_ms, 1)}
+    for kind, values in latencies.items():
+        if values:
+            result[kind] = {
+                "count": len(values),
+                "p50_ms": round(statistics.median(values), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(max(values), 2),
+            }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fast", type=int, default=400, help="number of fast requests")
+    parser.add_argument("--slow", type=int, default=20, help="number of slow requests")
+    parser.add_argument("--fast-ms", type=float, default=2.0, help="duration of a fast query")
+    parser.add_argument("--slow-ms", type=float, default=250.0, help="duration of a slow query")
+    parser.add_argument("--spread-ms", type=float, default=1000.0, help="requests arrive uniformly over this window")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = {"executor_workers": DB_EXECUTOR_WORKERS, "params": vars(args)}
+    for name, handler in (("inline", handle_inline), ("executor", handle_executor)):
+        report[name] = asyncio.run(run_scenario(
+            handler, args.fast, args.slow, args.fast_ms, args.slow_ms, args.spread_ms, args.seed
+        ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Event push benchmark: fan-out of events.EventBroker to thousands of open event streams.
+
+Opens --subscribers streams (events.event_frames, the body of GET /api/events, consumed on
+one event loop as the server would; only the socket write is missing), spread over --teams
+teams like signed-in users. A publisher thread then publishes, as the write endpoints do
+after committing, --events task events to random teams and users and --notifications
+notification events to random users. Reports:
+  - streams open and memory per open stream (tracemalloc),
+  - publish cost on the writer thread,
+  - deliveries per second and publish-to-stream latency (p50/p99/max),
+  - the unread-count polls per minute the streams replace.
+
+Run from the backend directory:
+    python -m benchmarks.bench_events --subscribers 5000
+"""
+import argparse
+import asyncio
+import gc
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from events import broker, event_frames, publish_notifications, publish_task_event, user_topics
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def consume(topics, latencies: list, ready: asyncio.Event, opened: list, expected: int):
+    """Reads one stream until it has seen `expected` events, recording their latency"""
+    received = 0
+    frames = event_frames(topics, keepalive=60)
+    try:
+        async for chunk in frames:
+            if not chunk.startswith(b"event:"):
+                opened.append(1)
+                if len(opened) == ready.total:
+                    ready.set()
+                continue
+            now = time.perf_counter_ns()
+            for frame in chunk.split(b"\n\n")[:-1]:
+                data = json.loads(frame.split(b"\ndata: ", 1)[1])
+                latencies.append(now - data["sent_ns"])
+                received += 1
+            if received >= expected:
+                return
+    finally:
+        await frames.aclose()
+
+
+def publisher(args, users, publish_times: list):
+    rng = random.Random(args.seed)
+    for n in range(args.events + args.notifications):
+        started = time.perf_counter_ns()
+        if n < args.events:
+            team_id = rng.randrange(args.teams)
+            # The task payload plus a send timestamp; sent_ns is what the streams measure against
+            topics = [("team", team_id), ("user", rng.choice(users).id)]
+            broker.publish(topics, "task", {"action": "updated", "task_id": n, "sent_ns": started})
+        else:
+            user = rng.choice(users)
+            publish_notifications([{"recipient_email": user.email, "subject": f"Notification {n}", "sent_ns": started}])
+        publish_times.append(time.perf_counter_ns() - started)
+        time.sleep(args.interval / 1000)
+
+
+def expected_events(args, users):
+    """Replays the publisher's choices to know how many events each stream will receive"""
+    rng = random.Random(args.seed)
+    counts = {user.id: 0 for user in users}
+    by_team = {}
+    for user in users:
+        by_team.setdefault(user.team_id, []).append(user.id)
+    for n in range(args.events + args.notifications):
+        if n < args.events:
+            team_id = rng.randrange(args.teams)
+            reached = set(by_team.get(team_id, ())) | {rng.choice(users).id}
+        else:
+            reached = {rng.choice(users).id}
+        for user_id in reached:
+            counts[user_id] += 1
+    return counts
+
+
+async def run(args):
+    users = [
+        SimpleNamespace(id=user_id, team_id=user_id % args.teams, email=f"user{user_id}@example.com")
+        for user_id in range(args.subscribers)
+    ]
+    counts = expected_events(args, users)
+    latencies = []
+    publish_times = []
+    opened = []
+    ready = asyncio.Event()
+    ready.total = len(users)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    consumers = [
+        asyncio.ensure_future(consume(user_topics(user), latencies, ready, opened, counts[user.id]))
+        for user in users if counts[user.id]
+    ]
+    ready.total = len(consumers)
+    await ready.wait()
+    per_stream = (tracemalloc.get_traced_memory()[0] - before) / len(consumers)
+    tracemalloc.stop()
+    streams_open = broker.stats()["subscribers"]
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=publisher, args=(args, users, publish_times))
+    thread.start()
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - started
+    thread.join()
+
+    ms = [latency / 1e6 for latency in latencies]
+    return {
+        "params": vars(args),
+        "streams_open": streams_open,
+        "bytes_per_open_stream": round(per_stream),
+        "events_published": args.events + args.notifications,
+        "deliveries": len(latencies),
+        "deliveries_per_second": round(len(latencies) / elapsed),
+        "publish_us": {
+            "mean": round(statistics.mean(publish_times) / 1000, 1),
+            "max": round(max(publish_times) / 1000, 1),
+        },
+        "latency_ms": {
+            "p50": round(percentile(ms, 0.5), 3),
+            "p99": round(percentile(ms, 0.99), 3),
+            "max": round(max(ms), 3),
+        },
+        "streams_after": broker.stats()["subscribers"],
+        # The notification hook polled the unread count once a minute per signed-in user
+        "replaced_polls_per_minute": len(users),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--teams", type=int, default=100)
+    parser.add_argument("--events", type=int, default=500, help="Task events (team + one user topic each)")
+    parser.add_argument("--notifications", type=int, default=500, help="Notification events (one user each)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Milliseconds between publishes")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
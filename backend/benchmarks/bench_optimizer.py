@@ -0,0 +1,74 @@
+"""
+Load-balancing planner benchmark: overload before/after and planning time on synthetic teams.
+
+Builds a team of --users members and --tasks tasks spread over a --days planning range.
+Tasks are handed out with a Zipf-like skew (a few members hold most of the work), about
+a quarter of them have a partner, and a share is in progress and therefore pinned. Each
+scenario runs the planner greedy-only and with local search, under the given time budget.
+
+Run from the backend directory:
+    python -m benchmarks.bench_optimizer --users 50 --tasks 10000 --days 365
+"""
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+from scheduling import plan_assignments
+
+
+def synthetic_team(users: int, tasks: int, days: int, skew: float, pinned: float, mean_labor: float, seed: int):
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    team = [{"id": user_id, "capacity": 8.0} for user_id in range(1, users + 1)]
+    weights = [1 / (rank ** skew) for rank in range(1, users + 1)]
+    items = []
+    for task_id in range(1, tasks + 1):
+        task_start = start + timedelta(days=rng.randrange(days))
+        task_end = task_start + timedelta(days=rng.randint(0, 9))
+        movable = rng.random() >= pinned
+        owners = {rng.choices(range(1, users + 1), weights=weights)[0]}
+        if rng.random() < 0.25:
+            owners.add(rng.randint(1, users))
+        for user_id in owners:
+            items.append({
+                "task_id": task_id,
+                "user_id": user_id,
+                "start_date": task_start,
+                "completion_date": task_end,
+                "labor": rng.uniform(0.25, 1.75) * mean_labor,
+                "movable": movable,
+            })
+    return team, items, start, start + timedelta(days=days - 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--tasks", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365, help="length of the planning range")
+    parser.add_argument("--mean-labor", type=float, default=8.0, help="average remaining labor per assignment")
+    parser.add_argument("--pinned", type=float, default=0.2, help="share of tasks that are in progress (not movable)")
+    parser.add_argument("--time-budget-ms", type=float, default=2000.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    report = {"params": vars(args), "scenarios": {}}
+    for name, skew in (("balanced", 0.0), ("skewed", 1.0), ("hotspot", 2.0)):
+        team, items, start, end = synthetic_team(
+            args.users, args.tasks, args.days, skew, args.pinned, args.mean_labor, args.seed
+        )
+        scenario = {"assignments": len(items)}
+        for label, local_search in (("greedy", False), ("greedy+local_search", True)):
+            plan = plan_assignments(team, items, start, end, local_search=local_search, time_budget=args.time_budget_ms / 1000)
+            scenario[label] = {key: plan[key] for key in (
+                "peak_overload_before", "peak_overload_after", "total_overload_before", "total_overload_after",
+                "start", "local_search_moves", "timed_out", "elapsed_ms"
+            )}
+            scenario[label]["reassignments"] = len(plan["reassignments"])
+        report["scenarios"][name] = scenario
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
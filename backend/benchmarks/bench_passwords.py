@@ -0,0 +1,102 @@
+"""
+Login throughput benchmark: where bcrypt runs during a burst of logins.
+
+Runs --logins password checks (passwords._check, what POST /auth/token does per login)
+from --concurrency concurrent coroutines on one event loop, like simultaneous login
+requests, with the check running:
+  - inline     on the event loop (bcrypt called directly from an async endpoint),
+  - threads    on a thread pool (the DB executor, which logins used before),
+  - processes  on a process pool of 1..--max-workers workers (passwords.hash_pool).
+Reports logins/s, logins/s per worker, and event loop lag: how late a 10 ms ticker runs
+while the burst is in progress, i.e. what every other request on the server waits.
+
+Run from the backend directory:
+    python -m benchmarks.bench_passwords --rounds 10 --max-workers 4
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from passwords import _check, _hash, _ready
+
+TICK_SECONDS = 0.01
+
+
+async def measure_lag(stop: asyncio.Event, lags: list):
+    while not stop.is_set():
+        expected = time.perf_counter() + TICK_SECONDS
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def burst(args, hashed: str, executor) -> dict:
+    loop = asyncio.get_running_loop()
+    remaining = args.logins
+
+    async def login_client():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            if executor is None:
+                ok = _check(args.password, hashed)
+            else:
+                ok = await loop.run_in_executor(executor, _check, args.password, hashed)
+            assert ok
+
+    stop = asyncio.Event()
+    lags = []
+    ticker = asyncio.ensure_future(measure_lag(stop, lags))
+    started = time.perf_counter()
+    await asyncio.gather(*(login_client() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    lags.sort()
+    return {
+        "logins_per_second": round(args.logins / elapsed, 1),
+        "loop_lag_ms": {
+            "p50": round(lags[len(lags) // 2] * 1000, 1) if lags else None,
+            "max": round(lags[-1] * 1000, 1) if lags else None,
+        },
+    }
+
+
+def run_mode(args, hashed: str, executor, workers: int) -> dict:
+    result = asyncio.run(burst(args, hashed, executor))
+    result["workers"] = workers
+    result["logins_per_second_per_worker"] = round(result["logins_per_second"] / workers, 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost of the stored hashes")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--password", default="correct horse battery staple")
+    args = parser.parse_args()
+
+    hashed = _hash(args.password, args.rounds)
+    report = {"params": vars(args), "cpu_count": os.cpu_count(), "results": {}}
+    report["results"]["inline"] = run_mode(args, hashed, None, 1)
+
+    with ThreadPoolExecutor(max_workers=args.max_workers) as threads:
+        report["results"]["threads"] = run_mode(args, hashed, threads, args.max_workers)
+
+    workers = 1
+    while workers <= args.max_workers:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as processes:
+            for future in [processes.submit(_ready) for _ in range(workers)]:
+                future.result() # Process start-up is not part of the burst
+            report["results"][f"processes_{workers}"] = run_mode(args, hashed, processes, workers)
+        workers *= 2
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Row mapping benchmark: dict(zip(columns, row)) vs rows.RowMapper records on a large result.
+
+Loads --rows task rows into an in-memory SQLite table (the standard library driver stands
+in for pyodbc: both return sequence rows with a DB-API cursor.description) and compares,
+for the old dict mapping and the compiled task mapper:
+  - fetch + map time and rows/s (cursor to list of dicts / records),
+  - map-only time from already fetched rows,
+  - memory held by the mapped result (tracemalloc),
+  - encoding the result to JSON with serialization.dump_json.
+
+Run from the backend directory:
+    python -m benchmarks.bench_rows --rows 100000
+"""
+import argparse
+import gc
+import json
+import random
+import sqlite3
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from queries import TASK_ROWS
+from serialization import dump_json
+
+
+def load_table(rows: int, seed: int) -> sqlite3.Connection:
+    rng = random.Random(seed)
+    db = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+    # Declared DATE columns come back as datetime.date, like pyodbc returns them
+    db.execute(f"CREATE TABLE tasks ({', '.join(c + (' DATE' if c.endswith('_date') else '') for c in TASK_ROWS.columns)})")
+    start = date(2025, 1, 1)
+    data = []
+    for task_id in range(1, rows + 1):
+        task_start = start + timedelta(days=rng.randrange(365))
+        data.append((
+            task_id, f"Task {task_id}", rng.choice(("High", "Medium", "Low")), 1, task_start,
+            task_start + timedelta(days=rng.randint(0, 9)), 1, rng.uniform(1, 40), rng.uniform(0, 10),
+            rng.randint(1, 5), "Q1", "In Progress",
+        ))
+    db.executemany(f"INSERT INTO tasks VALUES ({', '.join('?' * len(TASK_ROWS.columns))})", data)
+    return db
+
+
+def as_dicts(cursor):
+    # The previous per-router pattern
+    columns = [col[0] for col in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def best_of(repeat: int, run):
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def retained_bytes(run) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = run()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    db = load_table(args.rows, args.seed)
+    sql = f"SELECT {TASK_ROWS.select_list()} FROM tasks ORDER BY id"
+    fetched = db.execute(sql).fetchall()
+    mappers = {
+        "dict_zip": (lambda: as_dicts(db.execute(sql)), lambda: [dict(zip(TASK_ROWS.columns, row)) for row in fetched]),
+        "row_mapper": (lambda: TASK_ROWS.all(db.execute(sql)), lambda: list(TASK_ROWS.map(fetched))),
+    }
+
+    report = {"params": vars(args), "results": {}}
+    outputs = {}
+    for name, (fetch_and_map, map_only) in mappers.items():
+        fetch_time, mapped = best_of(args.repeat, fetch_and_map)
+        map_time, _ = best_of(args.repeat, map_only)
+        encode_time, outputs[name] = best_of(args.repeat, lambda: dump_json(mapped))
+        report["results"][name] = {
+            "fetch_and_map_ms": round(fetch_time * 1000, 1),
+            "rows_per_second": round(args.rows / fetch_time),
+            "map_only_ms": round(map_time * 1000, 1),
+            "retained_bytes_per_row": round(retained_bytes(map_only) / args.rows),
+            "encode_ms": round(encode_time * 1000, 1),
+        }
+    # Records gain the (empty) assignees field; everything else must encode identically
+    decoded = [json.loads(outputs[name]) for name in mappers]
+    for task in decoded[1]:
+        del task["assignees"]
+    report["identical_json"] = decoded[0] == decoded[1]
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,498 @@
+"""
+Scale benchmark: every router against a seeded database at 1k / 100k / 1M tasks.
+
+For each --scales entry, wipes and seeds a dedicated local SQL Server database with
+synthetic teams, users, tasks, assignees, history and notifications (deterministic for
+a given --seed), rebuilds the user_day_labor rollup, then sends each endpoint case
+through the ASGI app in-process (fastapi.testclient, startup and middleware included).
+Per case it reports:
+  - latency percentiles (p50/p90/p95/p99/max, ms) over --requests requests,
+  - SQL statements and DB time per request, and the statements run (queries.query_stats),
+  - response size and peak Python memory while serving one request (tracemalloc).
+The in-process caches are cleared before every request unless --warm-cache, so each one
+does its DB work. Write cases create, update and delete their own tasks.
+
+The routers run T-SQL, so the stand-in is a local SQL Server (e.g. the Developer edition
+container) rather than SQLite. Point DB_SERVER/DB_USERNAME/DB_PASSWORD at it and
+DB_DATABASE at an empty database whose name contains "bench": its tables are wiped.
+schemas/schema.sql is applied first if the tables do not exist yet.
+
+The report is JSON with the commit it ran on; --compare flags regressions against an
+earlier report (exit status 1 if there are any):
+    DB_DATABASE=TASK_MANAGEMENT_BENCH python -m benchmarks.bench_scale --scales 1k,100k --output base.json
+    DB_DATABASE=TASK_MANAGEMENT_BENCH python -m benchmarks.bench_scale --scales 1k,100k --compare base.json
+
+Run from the backend directory.
+"""
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+from cache import caches
+from database import DATABASE, db_connection, executemany_fast
+from passwords import _hash
+from queries import query_stats
+from rollups import rebuild_user_day_labor
+from schemas import UserInfo
+from tokens import create_access_token
+import main as api
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "schemas", "schema.sql")
+SEED_BATCH_SIZE = 10000
+USERS_PER_TEAM = 20
+STATUSES = (("Completed", 40), ("In Progress", 25), ("Not Started", 20), ("Paused", 10), ("Cancelled", 5))
+PRIORITIES = ("High", "Medium", "Low")
+HISTORY_ACTIONS = ("created", "updated", "status_changed", "commented")
+
+
+# --- Data ---
+def parse_scale(text: str) -> int:
+    """"1k" -> 1000, "1m" -> 1000000, "2500" -> 2500"""
+    text = text.strip().lower()
+    factor = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text[:-1] if factor > 1 else text) * factor)
+
+
+def scale_profile(tasks: int, args) -> dict:
+    # Teams grow with the square root of the data, so both the number of teams and the
+    # tasks per team grow: 1k -> 2 teams of 500 tasks, 100k -> 16 x 6250, 1M -> 50 x 20000
+    teams = max(2, round(math.sqrt(tasks) / 20))
+    return {
+        "tasks": tasks,
+        "teams": teams,
+        "users": teams * USERS_PER_TEAM,
+        "history_per_task": args.history_per_task,
+        "notifications": int(tasks * args.notifications_per_task),
+        "days": args.days,
+    }
+
+
+def weighted_choice(rng, choices):
+    total = sum(weight for _, weight in choices)
+    pick = rng.uniform(0, total)
+    for value, weight in choices:
+        pick -= weight
+        if pick <= 0:
+            return value
+    return choices[-1][0]
+
+
+def team_user_ids(team_id: int) -> range:
+    """Users of a team are numbered in blocks; the first of each block manages the team"""
+    first = (team_id - 1) * USERS_PER_TEAM + 1
+    return range(first, first + USERS_PER_TEAM)
+
+
+def email(user_id: int) -> str:
+    return f"user{user_id}@bench.example"
+
+
+def generate_tasks(profile: dict, rng, today: date):
+    """Yields (task row, assignee rows); task i belongs to team ((i - 1) % teams) + 1"""
+    days = profile["days"]
+    first_day = today - timedelta(days=days * 3 // 4) # Mostly past work, some planned ahead
+    for task_id in range(1, profile["tasks"] + 1):
+        team_id = (task_id - 1) % profile["teams"] + 1
+        members = team_user_ids(team_id)
+        start = first_day + timedelta(days=rng.randrange(days))
+        completion = start + timedelta(days=rng.randint(0, 30))
+        planned = float(rng.randint(2, 80))
+        status = weighted_choice(rng, STATUSES)
+        actual = round(planned * rng.uniform(0.8, 1.3), 1) if status == "Completed" else (
+            round(planned * rng.uniform(0, 0.8), 1) if status in ("In Progress", "Paused") else 0.0
+        )
+        task = (
+            task_id, f"Bench task {task_id}", rng.choice(PRIORITIES), team_id, start, completion,
+            members[0], planned, actual, rng.randint(1, 5), f"Step 1\nStep 2\nTask {task_id}", status,
+        )
+
+        assignee, partner = rng.sample(members, 2)
+        assignees = []
+        if rng.random() < 0.3:
+            share = round(planned * 0.6, 1)
+            assignees.append((task_id, assignee, "assignee", share, round(actual * 0.6, 1)))
+            assignees.append((task_id, partner, "partner", planned - share, round(actual - actual * 0.6, 1)))
+        else:
+            assignees.append((task_id, assignee, "assignee", planned, actual))
+        if rng.random() < 0.1:
+            assignees.append((task_id, members[0], "notified", None, 0.0))
+        yield task, assignees
+
+
+def batches(rows, size: int = SEED_BATCH_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ensure_schema(db):
+    cursor = db.cursor()
+    if cursor.execute("SELECT OBJECT_ID('tasks')").fetchone()[0] is None:
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            cursor.execute(f.read())
+        db.commit()
+
+
+def wipe(db):
+    cursor = db.cursor()
+    for table in ("task_history", "task_assignees", "notifications", "user_day_labor", "refresh_tokens", "revoked_tokens"):
+        cursor.execute(f"TRUNCATE TABLE {table}")
+    # Referenced tables cannot be truncated; DELETE and restart their identities
+    cursor.execute("DELETE FROM tasks")
+    cursor.execute("UPDATE teams SET manager_id = NULL")
+    cursor.execute("DELETE FROM users")
+    cursor.execute("DELETE FROM teams")
+    for table in ("tasks", "users", "teams"):
+        cursor.execute(f"DBCC CHECKIDENT ('{table}', RESEED, 0) WITH NO_INFOMSGS")
+    db.commit()
+
+
+def insert_with_ids(cursor, table: str, sql: str, rows):
+    cursor.execute(f"SET IDENTITY_INSERT {table} ON")
+    try:
+        for batch in batches(rows):
+            executemany_fast(cursor, sql, batch)
+    finally:
+        cursor.execute(f"SET IDENTITY_INSERT {table} OFF")
+
+
+def seed(profile: dict, seed_value: int) -> dict:
+    rng = random.Random(seed_value)
+    today = date.today()
+    started = time.perf_counter()
+    password_hash = _hash("bench password", 4) # Tokens are issued directly; nobody logs in
+    with db_connection() as db:
+        wipe(db)
+        cursor = db.cursor()
+        insert_with_ids(cursor, "teams", "INSERT INTO teams (id, name, manager_id) VALUES (?, ?, NULL)",
+                        ((team_id, f"Bench team {team_id}") for team_id in range(1, profile["teams"] + 1)))
+        insert_with_ids(
+            cursor, "users",
+            "INSERT INTO users (id, username, password_hash, email, name, role, team_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((user_id, f"user{user_id}", password_hash, email(user_id), f"Bench User {user_id}",
+              "manager" if user_id == team_user_ids(team_id)[0] else "employee", team_id)
+             for team_id in range(1, profile["teams"] + 1) for user_id in team_user_ids(team_id))
+        )
+
+        assignee_rows = []
+        assignee_sql = "INSERT INTO task_assignees (task_id, user_id, role, planned_labor, actual_labor) VALUES (?, ?, ?, ?, ?)"
+        history_rows = []
+        history_sql = "INSERT INTO task_history (task_id, user_id, action, timestamp, details) VALUES (?, ?, ?, ?, ?)"
+        cursor.execute("SET IDENTITY_INSERT tasks ON")
+        try:
+            for batch in batches(generate_tasks(profile, rng, today)):
+                executemany_fast(cursor, """
+                    INSERT INTO tasks (id, description, priority, team_id, start_date, completion_date, creator_id,
+                                       planned_labor, actual_labor, work_size, roadmap, status)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """, [task for task, _ in batch])
+                for task, assignees in batch:
+                    assignee_rows.extend(assignees)
+                    created = datetime.combine(task[4], datetime.min.time())
+                    for index in range(profile["history_per_task"]):
+                        action = HISTORY_ACTIONS[min(index, len(HISTORY_ACTIONS) - 1)]
+                        history_rows.append((task[0], assignees[0][1], action, created + timedelta(hours=index * 5), f"{action} by bench"))
+                # Child rows follow their tasks batch by batch, so memory stays bounded at 1M tasks
+                executemany_fast(cursor, assignee_sql, assignee_rows)
+                executemany_fast(cursor, history_sql, history_rows)
+                assignee_rows, history_rows = [], []
+        finally:
+            cursor.execute("SET IDENTITY_INSERT tasks OFF")
+
+        now = datetime.now()
+        notification_sql = "INSERT INTO notifications (recipient_email, subject, body, sent_at, is_read) VALUES (?, ?, ?, ?, ?)"
+        notifications = (
+            (email(rng.randint(1, profile["users"])), f"Bench notification {n}", "Body",
+             now - timedelta(minutes=rng.randrange(profile["days"] * 24 * 60)), rng.random() < 0.7)
+            for n in range(profile["notifications"])
+        )
+        for batch in batches(notifications):
+            executemany_fast(cursor, notification_sql, batch)
+
+        cursor.execute("""
+            UPDATE teams SET manager_id = (SELECT MIN(u.id) FROM users u WHERE u.team_id = teams.id AND u.role = 'manager')
+        """)
+        rollup_rows = rebuild_user_day_labor(db)
+        db.commit()
+    return {"seconds": round(time.perf_counter() - started, 1), "user_day_labor_rows": rollup_rows}
+
+
+def seeded_counts(db) -> tuple:
+    cursor = db.cursor()
+    return (cursor.execute("SELECT COUNT(*) FROM tasks").fetchone()[0],
+            cursor.execute("SELECT COUNT(*) FROM users").fetchone()[0])
+
+
+# --- Endpoint cases ---
+def user_info(user_id: int, team_id: int, role: str) -> UserInfo:
+    return UserInfo(id=user_id, username=f"user{user_id}", email=email(user_id),
+                    name=f"Bench User {user_id}", role=role, team_id=team_id)
+
+
+def endpoint_cases(profile: dict, rng, notification_ids: list, today: date) -> list:
+    """(name, token user, request factory); a factory returns (method, url, kwargs) for request i"""
+    manager = user_info(team_user_ids(1)[0], 1, "manager")
+    employee = user_info(team_user_ids(1)[1], 1, "employee")
+    teams = profile["teams"]
+    team_tasks = (profile["tasks"] - 1) // teams + 1 # Team 1 holds tasks 1, 1 + teams, 1 + 2 * teams, ...
+
+    def team_task(i):
+        return 1 + teams * rng.randrange(team_tasks)
+
+    month = {"start_date": str(today - timedelta(days=30)), "end_date": str(today)}
+    quarter = {"start_date": str(today - timedelta(days=60)), "end_date": str(today + timedelta(days=30))}
+    created = [] # Task ids from tasks.create, for the update and delete cases
+
+    def new_task(i):
+        start = today + timedelta(days=rng.randrange(30))
+        return ("POST", "/api/tasks/", {"json": {
+            "description": f"Bench created task {i}", "priority": "Medium", "team_id": 1,
+            "start_date": str(start), "completion_date": str(start + timedelta(days=5)),
+            "planned_labor": 16, "work_size": 2, "roadmap": "Bench", "status": "Not Started",
+            "assignees": [{"user_id": employee.id, "role": "assignee", "planned_labor": 16}],
+        }})
+
+    cases = [
+        ("auth.me", employee, lambda i: ("GET", "/api/auth/me", {})),
+        ("tasks.list", manager, lambda i: ("GET", "/api/tasks/", {})),
+        ("tasks.page", manager, lambda i: ("GET", "/api/tasks/", {"params": {"limit": 50, "sort": "completion_date:asc"}})),
+        ("tasks.overdue_page", manager, lambda i: ("GET", "/api/tasks/", {"params": {"filter": "overdue", "limit": 100}})),
+        ("tasks.stream", manager, lambda i: ("GET", "/api/tasks/", {"params": {"stream": "true"}})),
+        ("tasks.get", manager, lambda i: ("GET", f"/api/tasks/{team_task(i)}", {})),
+        ("tasks.history", manager, lambda i: ("GET", f"/api/tasks/{team_task(i)}/history", {})),
+        ("users.list", manager, lambda i: ("GET", "/api/users/", {})),
+        ("users.tasks", employee, lambda i: ("GET", f"/api/users/{employee.id}/tasks", {})),
+        ("users.tasks_page", employee, lambda i: ("GET", f"/api/users/{employee.id}/tasks", {"params": {"limit": 50}})),
+        ("teams.list", manager, lambda i: ("GET", "/api/teams/", {})),
+        ("teams.members", manager, lambda i: ("GET", "/api/teams/1/members", {})),
+        ("analytics.user_distribution", manager, lambda i: (
+            "GET", "/api/analytics/user-detailed-distribution", {"params": {"user_id": employee.id, **quarter}})),
+        ("analytics.user_distribution_compact", manager, lambda i: (
+            "GET", "/api/analytics/user-detailed-distribution", {"params": {"user_id": employee.id, "compact": "true", **quarter}})),
+        ("analytics.daily_labor_team", manager, lambda i: ("GET", "/api/analytics/daily-labor", {"params": {"team_id": 1, **quarter}})),
+        ("analytics.optimize", manager, lambda i: (
+            "POST", "/api/analytics/optimize-task-distribution", {"json": {"team_id": 1, "compact": True, **month}})),
+        ("analytics.plan", manager, lambda i: (
+            "POST", "/api/analytics/optimize-task-distribution/plan", {"json": {"team_id": 1, "time_budget_ms": 500, **month}})),
+        ("notifications.page", employee, lambda i: (
+            "GET", "/api/notifications/", {"params": {"recipient_email": employee.email, "limit": 50}})),
+        ("notifications.list", employee, lambda i: ("GET", "/api/notifications/", {"params": {"recipient_email": employee.email}})),
+        ("notifications.unread_count", employee, lambda i: (
+            "GET", "/api/notifications/unread-count", {"params": {"recipient_email": employee.email}})),
+        ("tasks.create", manager, new_task),
+        ("tasks.update", manager, lambda i: ("PUT", f"/api/tasks/{created[i % len(created)]}", {"json": {
+            "status": "In Progress" if i % 2 == 0 else "Paused", "history_note": "bench"}})),
+        ("tasks.delete", manager, lambda i: ("DELETE", f"/api/tasks/{created.pop()}", {})),
+    ]
+    if notification_ids:
+        cases.append(("notifications.mark_read", employee, lambda i: (
+            "PUT", f"/api/notifications/{notification_ids[i % len(notification_ids)]}/read",
+            {"json": {"recipient_email": employee.email}})))
+    return cases, created
+
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
+
+
+def query_totals() -> dict:
+    return {entry["name"]: (entry["calls"], entry["total_ms"]) for entry in query_stats()}
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def measure(client: TestClient, name: str, user: UserInfo, factory, args, created: list) -> dict:
+    headers = {"Authorization": f"Bearer {create_access_token(user)}"}
+
+    def send(i):
+        method, url, kwargs = factory(i)
+        if not args.warm_cache:
+            clear_caches()
+        response = client.request(method, url, headers=headers, **kwargs)
+        if name == "tasks.create" and response.status_code == 201:
+            created.append(response.json()["id"])
+        return response
+
+    # Creates and deletes are not repeatable: one per request, no warm-up
+    warmup = 0 if name in ("tasks.create", "tasks.delete") else args.warmup
+    needs_created = name in ("tasks.update", "tasks.delete")
+    if needs_created and not created:
+        return {"requests": 0, "skipped": "tasks.create made no tasks"}
+    for i in range(warmup):
+        send(i)
+
+    before = query_totals()
+    latencies, sizes, errors, statuses = [], [], 0, {}
+    for i in range(args.requests):
+        if name == "tasks.delete" and not created:
+            break
+        started = time.perf_counter()
+        response = send(i)
+        latencies.append((time.perf_counter() - started) * 1000)
+        sizes.append(len(response.content))
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        errors += response.status_code >= 400
+    after = query_totals()
+
+    count = len(latencies)
+    statements = {}
+    for query_name, (calls, total_ms) in (after.items() if count else ()):
+        previous_calls, previous_ms = before.get(query_name, (0, 0.0))
+        if calls > previous_calls:
+            statements[query_name] = {"per_request": round((calls - previous_calls) / count, 2),
+                                      "ms_per_request": round((total_ms - previous_ms) / count, 3)}
+
+    result = {"requests": count, "errors": errors, "status_codes": {str(code): n for code, n in sorted(statuses.items())}}
+    if count:
+        latencies.sort()
+        result["latency_ms"] = {
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(latencies[-1], 3),
+            "mean": round(sum(latencies) / count, 3),
+        }
+        result["queries_per_request"] = round(sum(s["per_request"] for s in statements.values()), 2)
+        result["db_ms_per_request"] = round(sum(s["ms_per_request"] for s in statements.values()), 3)
+        result["response_bytes"] = {"mean": round(sum(sizes) / count), "max": max(sizes)}
+        result["statements"] = dict(sorted(statements.items(), key=lambda item: -item[1]["ms_per_request"]))
+
+    # Peak memory of one more request, traced separately so tracing does not skew the timings
+    if count and name not in ("tasks.create", "tasks.delete"):
+        gc.collect()
+        tracemalloc.start()
+        send(count)
+        result["peak_memory_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+    return result
+
+
+def run_scale(client: TestClient, label: str, args) -> dict:
+    profile = scale_profile(parse_scale(label), args)
+    with db_connection() as db:
+        ensure_schema(db)
+        reuse = args.reuse and seeded_counts(db) == (profile["tasks"], profile["users"])
+    seeding = {"reused": True} if reuse else seed(profile, args.seed)
+    print(f"{label}: {'reusing' if reuse else 'seeded'} {profile['tasks']} tasks, {profile['users']} users", file=sys.stderr)
+
+    with db_connection() as db:
+        notification_ids = [row[0] for row in db.cursor().execute(
+            "SELECT TOP 100 id FROM notifications WHERE recipient_email = ? ORDER BY id", (email(team_user_ids(1)[1]),)
+        ).fetchall()]
+    query_stats(reset=True)
+    rng = random.Random(args.seed)
+    cases, created = endpoint_cases(profile, rng, notification_ids, date.today())
+    selected = set(args.cases.split(",")) if args.cases else None
+    endpoints = {}
+    for name, user, factory in cases:
+        if selected is not None and name not in selected:
+            continue
+        endpoints[name] = measure(client, name, user, factory, args, created)
+        print(f"  {name}: p50 {endpoints[name].get('latency_ms', {}).get('p50')} ms", file=sys.stderr)
+    return {"profile": profile, "seeding": seeding, "endpoints": endpoints}
+
+
+# --- Report ---
+def git_commit() -> dict:
+    def git(*command):
+        try:
+            return subprocess.run(["git", *command], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                  capture_output=True, text=True, timeout=10).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> dict:
+    """Per case: p50/p95 ratios against the baseline and the change in statements per request"""
+    cases, regressions = {}, []
+    for label, scale in report["scales"].items():
+        for name, current in scale["endpoints"].items():
+            previous = baseline.get("scales", {}).get(label, {}).get("endpoints", {}).get(name)
+            if not previous or "latency_ms" not in previous or "latency_ms" not in current:
+                continue
+            entry = {
+                "p50_ratio": round(current["latency_ms"]["p50"] / max(previous["latency_ms"]["p50"], 1e-6), 3),
+                "p95_ratio": round(current["latency_ms"]["p95"] / max(previous["latency_ms"]["p95"], 1e-6), 3),
+                "queries_per_request_change": round(current["queries_per_request"] - previous["queries_per_request"], 2),
+            }
+            cases[f"{label}/{name}"] = entry
+            if entry["p50_ratio"] > 1 + tolerance or entry["queries_per_request_change"] > 0:
+                regressions.append(f"{label}/{name}")
+    return {"baseline_commit": baseline.get("git", {}).get("commit"), "tolerance": tolerance,
+            "regressions": regressions, "cases": cases}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="1k,100k,1m", help="task counts to seed, e.g. 1k,100k,1m")
+    parser.add_argument("--requests", type=int, default=50, help="timed requests per endpoint case")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--cases", default=None, help="comma-separated case names (default: all)")
+    parser.add_argument("--warm-cache", action="store_true", help="keep the in-process caches between requests")
+    parser.add_argument("--history-per-task", type=int, default=3)
+    parser.add_argument("--notifications-per-task", type=float, default=0.5)
+    parser.add_argument("--days", type=int, default=730, help="span of the task dates")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="skip seeding when the database already holds this scale")
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", default=None, help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="p50 slowdown allowed by --compare (0.2 = 20%%)")
+    parser.add_argument("--allow-any-database", action="store_true", help="seed even if DB_DATABASE has no 'bench' in it")
+    args = parser.parse_args()
+
+    if "bench" not in DATABASE.lower() and not args.allow_any_database:
+        parser.error(f"DB_DATABASE={DATABASE} would be wiped; use a database named *bench* or --allow-any-database")
+
+    report = {
+        "params": vars(args),
+        "git": git_commit(),
+        "python": platform.python_version(),
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "scales": {},
+    }
+    with TestClient(api.app, raise_server_exceptions=False) as client: # A failing case is reported as errors
+        for label in args.scales.split(","):
+            report["scales"][label] = run_scale(client, label.strip(), args)
+            report["scales"][label]["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Process peak so far
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+        regressions = report["comparison"]["regressions"]
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if regressions:
+        print(f"Regressions against {args.compare}: {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Response serialization benchmark: CPU per response with response_model validation vs the
+trusted-output path (serialization.TrustedJSONResponse).
+
+Serves the same synthetic payloads from two routes of a throwaway app, one returning the
+dicts for FastAPI to validate against the response_model and encode, one returning a
+TrustedJSONResponse, and reports process CPU time per request through the test client.
+Payloads: a task listing (List[TaskResponse]) and a non-compact user distribution
+(UserDetailedTaskDistribution, every day embedding its tasks).
+
+Run from the backend directory:
+    python -m benchmarks.bench_serialization --tasks 5000 --days 90 --repeat 20
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from typing import List
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routers.analytics import calculate_daily_labor_distribution
+from queries import ASSIGNEE_ROWS, TASK_ROWS
+from schemas import TaskResponse, UserDetailedTaskDistribution
+from serialization import orjson, TrustedJSONResponse
+
+
+def synthetic_tasks(count: int, days: int, seed: int) -> list:
+    """Task records as get_tasks_with_assignees returns them"""
+    rng = random.Random(seed)
+    start = date(2025, 1, 1)
+    tasks = []
+    for task_id in range(1, count + 1):
+        task_start = start + timedelta(days=rng.randrange(days))
+        assignees = [
+            ASSIGNEE_ROWS.record(
+                id=task_id * 3 + i, task_id=task_id, user_id=rng.randint(1, 50), role=role,
+                planned_labor=rng.uniform(1, 20) if role != "notified" else None, actual_labor=rng.uniform(0, 5),
+            )
+            for i, role in enumerate(("assignee", "partner", "notified")[:rng.randint(1, 3)])
+        ]
+        tasks.append(TASK_ROWS.record(
+            id=task_id, description=f"Task {task_id}", priority=rng.choice(("High", "Medium", "Low")),
+            team_id=1, start_date=task_start, completion_date=task_start + timedelta(days=rng.randint(0, 9)),
+            creator_id=1, planned_labor=rng.uniform(1, 40), actual_labor=rng.uniform(0, 10),
+            work_size=rng.randint(1, 5), roadmap="Q1", status="In Progress", assignees=assignees,
+        ))
+    return tasks
+
+
+def add_routes(app: FastAPI, name: str, model, payload):
+    # Closures rather than default arguments, which FastAPI would treat as query parameters
+    @app.get(f"/validated/{name}", response_model=model)
+    def validated():
+        return payload
+
+    @app.get(f"/trusted/{name}", response_model=model)
+    def trusted():
+        return TrustedJSONResponse(payload)
+
+
+def build_app(payloads: dict) -> FastAPI:
+    app = FastAPI()
+    for name, (model, payload) in payloads.items():
+        add_routes(app, name, model, payload)
+    return app
+
+
+def cpu_per_request(client: TestClient, path: str, repeat: int) -> float:
+    client.get(path) # Warm-up
+    started = time.process_time()
+    for _ in range(repeat):
+        client.get(path)
+    return (time.process_time() - started) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=5000, help="tasks in the listing payload")
+    parser.add_argument("--distribution-tasks", type=int, default=300, help="tasks behind the distribution payload")
+    parser.add_argument("--days", type=int, default=90, help="days in the distribution range")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    start, end = date(2025, 1, 1), date(2025, 1, 1) + timedelta(days=args.days - 1)
+    user_tasks = synthetic_tasks(args.distribution_tasks, args.days, args.seed)
+    payloads = {
+        "tasks": (List[TaskResponse], synthetic_tasks(args.tasks, args.days, args.seed)),
+        "distribution": (UserDetailedTaskDistribution, {
+            "user_id": 1, "user_name": "User 1",
+            "daily_distribution": calculate_daily_labor_distribution(user_tasks, start, end),
+            "tasks": None,
+        }),
+    }
+    client = TestClient(build_app(payloads))
+
+    report = {"params": vars(args), "encoder": "orjson" if orjson is not None else "json", "payloads": {}}
+    for name in payloads:
+        validated = cpu_per_request(client, f"/validated/{name}", args.repeat)
+        trusted = cpu_per_request(client, f"/trusted/{name}", args.repeat)
+        same = client.get(f"/validated/{name}").json() == client.get(f"/trusted/{name}").json()
+        report["payloads"][name] = {
+            "response_bytes": len(client.get(f"/trusted/{name}").content),
+            "validated_cpu_ms": round(validated, 2),
+            "trusted_cpu_ms": round(trusted, 2),
+            "speedup": round(validated / trusted, 1) if trusted else None,
+            "identical_json": same,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Every cache registers itself here so its stats can be served from /api/monitoring/caches
+caches = {}
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe in-process cache with a bounded size (least recently used entries are
+    evicted first) and a time-to-live per entry. Keeps hit/miss/eviction counters.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        caches[name] = self
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING or item[0] <= now:
+                if item is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._data.pop(key, _MISSING) is not _MISSING:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class DataVersions:
+    """
+    In-process version counters per data scope, e.g. ("team", 1) or ("user", 7). Writers
+    bump the scopes they touched after committing; readers stamp the versions into cache
+    keys and ETags, so a bump makes every dependent cached response stale at once.
+    Versions carry a per-process prefix, so ETags from before a restart never match.
+    """
+
+    def __init__(self):
+        self._epoch = f"{int(time.time() * 1000):x}"
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope) -> str:
+        with self._lock:
+            return f"{self._epoch}.{self._versions.get(scope, 0)}"
+
+    def bump(self, kind: str, ids):
+        with self._lock:
+            for scope_id in ids:
+                if scope_id is not None:
+                    scope = (kind, scope_id)
+                    self._versions[scope] = self._versions.get(scope, 0) + 1
+
+
+data_versions = DataVersions()
+
+
+def bump_data_versions(team_ids=(), user_ids=()):
+    """Call after committing a write to tasks, assignees or team membership"""
+    data_versions.bump("team", team_ids)
+    data_versions.bump("user", user_ids)
@@ -1,32 +1,357 @@
 import pyodbc
 import os # Recommended: Use environment variables for credentials
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from fastapi import HTTPException, status
 
-def get_db():
-    # It's highly recommended to use environment variables instead of hardcoding
-    # Example using os.environ.get():
-    # SERVER = os.environ.get("DB_SERVER", "YH_YH") # Default value if env var not set
-    # DATABASE = os.environ.get("DB_DATABASE", "TASK_MANAGEMENT")
-    # USERNAME = os.environ.get("DB_USERNAME", "admin_ap")
-    # PASSWORD = os.environ.get("DB_PASSWORD", "adminadmin")
-
-    SERVER = "YH_YH"  # <-- UPDATE if needed
-    DATABASE = "TASK_MANAGEMENT_V2" # <-- UPDATE if needed (Your script uses this)
-    USERNAME = "admin_ap" # <-- UPDATE if needed
-    PASSWORD = "adminadmin" # <-- UPDATE if needed
-    
-    # Ensure you have the correct ODBC driver installed and named
-    connectionString = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
-    
-    conn = None # Initialize conn to None
+# It's highly recommended to use environment variables instead of hardcoding
+SERVER = os.environ.get("DB_SERVER", "YH_YH")  # <-- UPDATE if needed
+DATABASE = os.environ.get("DB_DATABASE", "TASK_MANAGEMENT_V2") # <-- UPDATE if needed (Your script uses this)
+USERNAME = os.environ.get("DB_USERNAME", "admin_ap") # <-- UPDATE if needed
+PASSWORD = os.environ.get("DB_PASSWORD", "adminadmin") # <-- UPDATE if needed
+
+# Ensure you have the correct ODBC driver installed and named
+connectionString = f'DRIVER={{ODBC Driver 17 for SQL Server}};SERVER={SERVER};DATABASE={DATABASE};UID={USERNAME};PWD={PASSWORD}'
+
+# Pool sizing (tune under load using the stats from /api/monitoring/db-pool)
+POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "30")) # Seconds to wait for a free connection
+POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300")) # Close connections idle longer than this
+POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800")) # Recycle connections older than this
+POOL_PING_AFTER = float(os.environ.get("DB_POOL_PING_AFTER", "5")) # Pre-ping connections idle longer than this (0 = always, negative = never)
+# Threads for blocking DB work started from async code; sized to the pool so none idle waiting for a connection
+DB_EXECUTOR_WORKERS = int(os.environ.get("DB_EXECUTOR_WORKERS", str(POOL_MAX_SIZE)))
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class _PooledConnection:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = self.last_used = time.monotonic()
+
+
+class _Waiter:
+    __slots__ = ("event", "entry", "reserved")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.entry = None # Set when an idle connection is handed over
+        self.reserved = False # Set when a free slot is handed over instead
+
+
+class ConnectionPool:
+    """
+    Thread-safe, bounded pool of pyodbc connections.
+
+    Connections are checked out with acquire()/release() or the connection() context
+    manager. Waiting threads are served first-come first-served. Idle connections are
+    evicted after idle_timeout (keeping min_size open), connections older than
+    max_lifetime are recycled, connections idle longer than ping_after are pinged before
+    being handed out, and every returned connection is rolled back so the next user
+    gets a clean session.
+    """
+
+    def __init__(self, connect, min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE, timeout=POOL_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, max_lifetime=POOL_MAX_LIFETIME, ping_after=POOL_PING_AFTER):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+
+        self._lock = threading.Lock()
+        self._idle = deque() # Most recently used connections at the right
+        self._waiters = deque() # Threads blocked in acquire(), oldest first
+        self._checked_out = {} # id(conn) -> _PooledConnection
+        self._size = 0 # Open connections plus slots reserved for connections being opened
+        self._closed = False
+
+        self._checkouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+
+    # --- Internal helpers (call with the lock held unless noted) ---
+    def _is_expired(self, entry, now):
+        return self.max_lifetime > 0 and now - entry.created_at > self.max_lifetime
+
+    def _evict_idle(self, now):
+        expired = []
+        for entry in list(self._idle):
+            stale = self.idle_timeout > 0 and now - entry.last_used > self.idle_timeout and self._size - len(expired) > self.min_size
+            if stale or self._is_expired(entry, now):
+                self._idle.remove(entry)
+                expired.append(entry)
+        self._size -= len(expired)
+        self._discarded += len(expired)
+        return expired
+
+    def _free_slot(self):
+        # A connection went away: give its slot to the oldest waiter, if any
+        if self._waiters:
+            waiter = self._waiters.popleft()
+            waiter.reserved = True
+            waiter.event.set()
+        else:
+            self._size -= 1
+
+    @staticmethod
+    def _close_quietly(conn):
+        # Called without the lock held
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _ping(self, conn) -> bool:
+        # Called without the lock held
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def _open(self):
+        # Called without the lock held, after a slot was reserved in _size
+        try:
+            entry = _PooledConnection(self._connect())
+        except Exception:
+            with self._lock:
+                self._free_slot()
+            raise
+        with self._lock:
+            self._created += 1
+        return entry
+
+    def _discard(self, entry):
+        # Called without the lock held
+        self._close_quietly(entry.conn)
+        with self._lock:
+            self._discarded += 1
+            self._free_slot()
+
+    def _wait_for_turn(self, deadline, timeout):
+        # Returns (entry, reserved) once another thread hands over a connection or a slot
+        waiter = _Waiter()
+        with self._lock:
+            self._waiters.append(waiter)
+            self._waits += 1
+        waited_since = time.monotonic()
+        waiter.event.wait(max(0.0, deadline - waited_since))
+
+        with self._lock:
+            if not waiter.event.is_set():
+                self._waiters.remove(waiter)
+                self._timeouts += 1
+                raise PoolTimeout(f"No database connection available within {timeout:.1f}s (pool size {self.max_size})")
+            waited = time.monotonic() - waited_since
+            self._wait_time_total += waited
+            self._wait_time_max = max(self._wait_time_max, waited)
+        return waiter.entry, waiter.reserved
+
+    # --- Public API ---
+    def acquire(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        while True:
+            entry = None
+            reserved = False
+            must_wait = False
+            with self._lock:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                to_close = self._evict_idle(time.monotonic())
+                if self._waiters:
+                    must_wait = True # Don't jump the queue
+                elif self._idle:
+                    entry = self._idle.pop()
+                elif self._size < self.max_size:
+                    self._size += 1
+                    reserved = True
+                else:
+                    must_wait = True
+
+            for expired in to_close:
+                self._close_quietly(expired.conn)
+
+            if must_wait:
+                entry, reserved = self._wait_for_turn(deadline, timeout)
+
+            if reserved:
+                entry = self._open()
+            elif self.ping_after >= 0 and time.monotonic() - entry.last_used >= self.ping_after and not self._ping(entry.conn):
+                self._discard(entry)
+                continue
+
+            with self._lock:
+                self._checked_out[id(entry.conn)] = entry
+                self._checkouts += 1
+            return entry.conn
+
+    def release(self, conn, discard=False):
+        with self._lock:
+            entry = self._checked_out.pop(id(conn), None)
+        if entry is None:
+            self._close_quietly(conn) # Not ours (or already released)
+            return
+
+        if not discard:
+            try:
+                conn.rollback() # Never hand out a session with an open transaction
+            except Exception:
+                discard = True
+
+        now = time.monotonic()
+        if discard or self._closed or self._is_expired(entry, now):
+            self._discard(entry)
+            return
+
+        entry.last_used = now
+        with self._lock:
+            if self._waiters:
+                waiter = self._waiters.popleft()
+                waiter.entry = entry
+                waiter.event.set()
+            else:
+                self._idle.append(entry)
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        finally:
+            # A broken session fails the rollback in release() and is discarded there
+            self.release(conn)
+
+    def warm(self):
+        """Opens connections up to min_size (call at startup)"""
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            entry = self._open()
+            entry.last_used = time.monotonic()
+            with self._lock:
+                if self._waiters:
+                    waiter = self._waiters.popleft()
+                    waiter.entry = entry
+                    waiter.event.set()
+                else:
+                    self._idle.append(entry)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for entry in idle:
+            self._close_quietly(entry.conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": len(self._checked_out),
+                "idle": len(self._idle),
+                "waiting": len(self._waiters),
+                "checkouts": self._checkouts,
+                "created": self._created,
+                "discarded": self._discarded,
+                "waits": self._waits,
+                "wait_time_total_ms": round(self._wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self._wait_time_max * 1000, 3),
+                "timeouts": self._timeouts,
+            }
+
+
+def connect():
+    return pyodbc.connect(connectionString)
+
+pool = ConnectionPool(connect)
+
+
+# SQL Server rejects statements with more than 2100 parameters, so IN lists are chunked below that.
+MAX_IN_CLAUSE_PARAMS = 2000
+
+def chunked(values: list, size: int = MAX_IN_CLAUSE_PARAMS):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def executemany_fast(cursor, sql: str, rows: list):
+    """executemany with pyodbc's fast_executemany: parameters are sent as arrays in one round trip per batch"""
+    if not rows:
+        return
+    cursor.fast_executemany = True
     try:
-        conn = pyodbc.connect(connectionString)
+        cursor.executemany(sql, rows)
+    finally:
+        cursor.fast_executemany = False
+
+
+# --- Async-safe data access ---
+# pyodbc calls block, so they must never run on the asyncio event loop. Endpoints declared
+# with plain "def" are already run in a worker thread by FastAPI. "async def" endpoints and
+# dependencies must hand every DB call (and any other blocking work) to run_db().
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+async def run_db(func, *args, **kwargs):
+    """Runs blocking DB work on the dedicated executor and awaits its result"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context() # Keeps the statements counted against the calling request
+    return await loop.run_in_executor(db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+
+@contextmanager
+def db_connection(timeout=None):
+    """Checks a pooled connection out for code that does not run as a FastAPI dependency"""
+    with pool.connection(timeout) as conn:
         yield conn
+
+
+@contextmanager
+def request_connection():
+    """A pooled connection for request handlers that check one out themselves; exhaustion becomes a 503"""
+    try:
+        with pool.connection() as conn:
+            yield conn
+    except PoolTimeout as ex:
+        print(f"Database pool exhausted: {ex}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is busy, please retry")
     except pyodbc.Error as ex:
         sqlstate = ex.args[0]
         print(f"Database connection error: {sqlstate} - {ex}")
         # Depending on your error handling strategy, you might raise an HTTPException here
         # For now, we let the error propagate or handle it in the endpoint
         raise # Re-raise the exception
-    finally:
-        if conn:
-            conn.close()
+
+
+def get_db():
+    with request_connection() as conn:
+        yield conn
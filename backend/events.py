@@ -0,0 +1,177 @@
+"""
+In-process publish/subscribe behind the server-sent event stream (GET /api/events).
+
+Topics are scopes like the data version scopes: ("team", team_id) and ("user", user_id)
+for task changes, ("notifications", email) for new notifications. Writers publish after
+committing, from any thread. A publish encodes each event once and hands delivery to each
+subscriber's event loop with one call, however many subscribers it reaches. A subscriber
+that falls EVENT_QUEUE_SIZE events behind loses the oldest ones and is sent a "resync"
+event, after which it should refetch what it shows.
+
+Subscribers only exist in this process: with several worker processes, each stream sees
+the writes made by its own worker.
+"""
+import asyncio
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+from serialization import dump_json
+
+EVENT_QUEUE_SIZE = int(os.environ.get("EVENT_QUEUE_SIZE", "100")) # Undelivered events kept per subscriber
+EVENT_KEEPALIVE_SECONDS = float(os.environ.get("EVENT_KEEPALIVE_SECONDS", "15"))
+EVENT_RETRY_MS = 5000 # Reconnect delay suggested to clients
+
+RESYNC_FRAME = b"event: resync\ndata: {}\n\n"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def encode_event(event_type: str, data) -> bytes:
+    return b"event: " + event_type.encode("utf-8") + b"\ndata: " + dump_json(data) + b"\n\n"
+
+
+class Subscription:
+    """Queue of encoded frames for one stream; only touched on the loop it was created on"""
+    __slots__ = ("topics", "loop", "_frames", "_waiter", "_missed")
+
+    def __init__(self, topics, loop, queue_size: int):
+        self.topics = tuple(topics)
+        self.loop = loop
+        self._frames = deque(maxlen=queue_size)
+        self._waiter = None # Future the stream is waiting on, if any
+        self._missed = False
+
+    def _push(self, frame: bytes):
+        if len(self._frames) == self._frames.maxlen:
+            self._missed = True
+        self._frames.append(frame)
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def next_frames(self, timeout: float) -> list:
+        """Waits up to timeout seconds for events; returns every frame queued so far ([] on timeout)"""
+        if not self._frames:
+            # A bare future and timer: cheaper per wake-up than wait_for, which starts a task per wait
+            self._waiter = self.loop.create_future()
+            timer = self.loop.call_later(timeout, _wake, self._waiter)
+            try:
+                await self._waiter
+            finally:
+                timer.cancel()
+                self._waiter = None
+        frames = list(self._frames)
+        self._frames.clear()
+        if self._missed:
+            self._missed = False
+            frames.insert(0, RESYNC_FRAME)
+        return frames
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class EventBroker:
+    def __init__(self, queue_size: int = EVENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._topics = {} # topic -> {subscription: None}, in subscription order
+        self._subscribers = 0
+        self._published = 0
+        self._delivered = 0
+
+    def subscribe(self, topics) -> Subscription:
+        """Must be called on the event loop that will read the subscription"""
+        subscription = Subscription(topics, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            for topic in subscription.topics:
+                self._topics.setdefault(topic, {})[subscription] = None
+            self._subscribers += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.pop(subscription, None)
+                    if not subscribers:
+                        del self._topics[topic]
+            self._subscribers -= 1
+
+    def publish(self, topics, event_type: str, data):
+        self.publish_many([(topics, event_type, data)])
+
+    def publish_many(self, events):
+        """events: (topics, event_type, data) tuples. A subscriber on several of an event's topics gets it once."""
+        deliveries = {} # loop -> [(subscription, frame)]
+        with self._lock:
+            for topics, event_type, data in events:
+                reached = {}
+                for topic in topics:
+                    subscribers = self._topics.get(topic)
+                    if subscribers:
+                        reached.update(subscribers)
+                if not reached:
+                    continue
+                frame = encode_event(event_type, data)
+                for subscription in reached:
+                    deliveries.setdefault(subscription.loop, []).append((subscription, frame))
+                self._delivered += len(reached)
+            self._published += len(events)
+        for loop, batch in deliveries.items():
+            try:
+                loop.call_soon_threadsafe(_push_all, batch)
+            except RuntimeError:
+                pass # Loop already closed (shutdown); its streams are gone
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "subscribers": self._subscribers,
+                "topics": len(self._topics),
+                "published": self._published,
+                "delivered": self._delivered,
+            }
+
+
+def _push_all(batch):
+    for subscription, frame in batch:
+        subscription._push(frame)
+
+
+broker = EventBroker()
+
+
+def user_topics(user) -> list:
+    """Topics of the events a signed-in user receives"""
+    return [("user", user.id), ("team", user.team_id), ("notifications", user.email)]
+
+
+async def event_frames(topics, keepalive: float = EVENT_KEEPALIVE_SECONDS):
+    """Body of an SSE stream; subscribes when iteration starts and unsubscribes when it stops"""
+    subscription = broker.subscribe(topics)
+    try:
+        yield f"retry: {EVENT_RETRY_MS}\nevent: ready\ndata: {{}}\n\n".encode("ascii")
+        while True:
+            frames = await subscription.next_frames(keepalive)
+            yield b"".join(frames) if frames else KEEPALIVE_FRAME
+    finally:
+        broker.unsubscribe(subscription)
+
+
+def publish_task_event(action: str, task_id: Optional[int], team_ids=(), user_ids=()):
+    """Call after committing a task write, with the same scopes as bump_data_versions (task_id is None for bulk imports)"""
+    topics = [("team", team_id) for team_id in set(team_ids) if team_id is not None]
+    topics += [("user", user_id) for user_id in set(user_ids) if user_id is not None]
+    broker.publish(topics, "task", {"action": action, "task_id": task_id})
+
+
+def publish_notifications(notifications):
+    """Call after committing new notifications (dicts with at least recipient_email)"""
+    broker.publish_many([
+        ([("notifications", notification["recipient_email"])], "notification", notification)
+        for notification in notifications
+    ])
@@ -0,0 +1,269 @@
+"""
+Task history writing.
+
+TASK_HISTORY_MODE selects how the task endpoints record history:
+  sync     - (default) one INSERT inside the caller's transaction, so history commits or
+             rolls back with the change itself.
+  buffered - write-behind: events are queued after the caller commits and inserted in
+             batches (fast_executemany) when TASK_HISTORY_BATCH_SIZE events are waiting or
+             every TASK_HISTORY_FLUSH_INTERVAL seconds. Pending events are flushed on
+             shutdown; a crash loses them.
+  spooled  - buffered, plus every event is appended to a local spool file before it is
+             queued. Spool files are deleted once their events are in the database and
+             replayed at the next start otherwise (at-least-once: a crash between the insert
+             and the delete can repeat a batch).
+
+Callers stage an event with add_task_history() before committing and hand the result to
+publish_task_history() after the commit. Write-behind events whose task has been deleted
+in the meantime are dropped at flush time, as ON DELETE CASCADE would have removed them.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+import pyodbc
+
+from database import chunked, db_connection
+from queries import Query, placeholders
+
+TASK_HISTORY_MODE = os.environ.get("TASK_HISTORY_MODE", "sync")
+TASK_HISTORY_BATCH_SIZE = int(os.environ.get("TASK_HISTORY_BATCH_SIZE", "500"))
+TASK_HISTORY_FLUSH_INTERVAL = float(os.environ.get("TASK_HISTORY_FLUSH_INTERVAL", "1.0")) # Seconds
+TASK_HISTORY_SPOOL_PATH = os.environ.get("TASK_HISTORY_SPOOL_PATH", "task_history.spool")
+TASK_HISTORY_SPOOL_FSYNC = os.environ.get("TASK_HISTORY_SPOOL_FSYNC", "0") == "1" # fsync every append (survives power loss, not just crashes)
+
+INSERT_HISTORY_EVENT = Query(
+    "task_history.insert_event", "INSERT INTO task_history (task_id, user_id, action, timestamp, details) VALUES (?, ?, ?, ?, ?)"
+)
+INSERT_HISTORY_NOW = Query("task_history.insert", """
+    INSERT INTO task_history (task_id, user_id, action, timestamp, details)
+    VALUES (?, ?, ?, GETDATE(), ?)
+""")
+EXISTING_TASK_IDS = Query("task_history.existing_task_ids", "SELECT id FROM tasks WHERE id IN ({ids})")
+
+
+class TaskHistorySink:
+    """
+    Write-behind buffer for task history events (task_id, user_id, action, timestamp,
+    details). record() only appends to memory (and the spool file, if any); a background
+    thread inserts the events in batches. Batches whose insert fails are kept, in order, and
+    retried on the next flush.
+    """
+
+    def __init__(self, spool_path: Optional[str] = None, batch_size: int = TASK_HISTORY_BATCH_SIZE,
+                 flush_interval: float = TASK_HISTORY_FLUSH_INTERVAL, fsync: bool = TASK_HISTORY_SPOOL_FSYNC):
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._buffer = [] # Recorded events not yet handed to a flush
+        self._spool = None
+        self._flush_lock = threading.Lock() # One flush at a time; guards _unwritten
+        self._unwritten = [] # (spool segment or None, events) waiting to be inserted, oldest first
+        self._thread = None
+        self._stopping = False
+        self._written = 0
+        self._dropped = 0
+        self._failures = 0
+        self._last_error = None
+
+    # --- Lifecycle ---
+    def start(self):
+        if self.spool_path:
+            self._recover_spool()
+            self._spool = open(self.spool_path, "a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="task-history-writer", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the writer and flushes what is left; unflushed spool segments stay for the next start"""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+            if os.path.getsize(self.spool_path) == 0:
+                os.remove(self.spool_path)
+        if self._unwritten:
+            print(f"Task history: {sum(len(events) for _, events in self._unwritten)} events could not be written on shutdown")
+
+    # --- Recording ---
+    def record(self, event: tuple):
+        with self._lock:
+            if self._spool is not None:
+                task_id, user_id, action, timestamp, details = event
+                self._spool.write(json.dumps([task_id, user_id, action, timestamp.isoformat(), details]) + "\n")
+                self._spool.flush()
+                if self.fsync:
+                    os.fsync(self._spool.fileno())
+            self._buffer.append(event)
+            if len(self._buffer) >= self.batch_size:
+                self._wakeup.notify()
+
+    def has_pending(self, task_id: int) -> bool:
+        with self._lock:
+            if any(event[0] == task_id for event in self._buffer):
+                return True
+        return any(event[0] == task_id for _, events in list(self._unwritten) for event in events)
+
+    # --- Flushing ---
+    def flush(self) -> int:
+        """Inserts every event recorded so far (plus earlier failed batches). Returns the number written."""
+        with self._flush_lock:
+            with self._lock:
+                if self._buffer:
+                    self._unwritten.append((self._seal_spool(), self._buffer))
+                    self._buffer = []
+            written = 0
+            while self._unwritten:
+                segment, events = self._unwritten[0]
+                try:
+                    inserted = self._insert(events)
+                except Exception as e:
+                    # Keep the batch (and its spool segment) and retry it on the next flush
+                    self._failures += 1
+                    self._last_error = str(e)
+                    print(f"Error flushing {len(events)} task history events: {e}")
+                    break
+                self._unwritten.pop(0)
+                self._written += inserted
+                self._dropped += len(events) - inserted
+                written += inserted
+                if segment is not None:
+                    os.remove(segment)
+            return written
+
+    def _insert(self, events) -> int:
+        with db_connection() as db:
+            cursor = db.cursor()
+            # Skip events of deleted tasks; a delete racing this check fails the batch, and the retry skips it
+            existing = set()
+            for chunk in chunked(list({event[0] for event in events})):
+                existing.update(row[0] for row in EXISTING_TASK_IDS.fetchall(cursor, chunk, ids=placeholders(chunk)))
+            rows = [event for event in events if event[0] in existing]
+            try:
+                INSERT_HISTORY_EVENT.executemany(cursor, rows)
+                db.commit()
+            except (pyodbc.IntegrityError, pyodbc.DataError) as e:
+                # One bad event must not hold back the rest forever: write them one by one
+                db.rollback()
+                print(f"Task history batch rejected ({e}), inserting events individually")
+                rows = self._insert_individually(db, rows)
+        return len(rows)
+
+    def _insert_individually(self, db, rows) -> list:
+        cursor = db.cursor()
+        written = []
+        for row in rows:
+            try:
+                INSERT_HISTORY_EVENT.execute(cursor, row)
+                db.commit()
+                written.append(row)
+            except (pyodbc.IntegrityError, pyodbc.DataError) as e:
+                db.rollback()
+                print(f"Dropping task history event {row[:3]}: {e}")
+        return written
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping and len(self._buffer) < self.batch_size:
+                    self._wakeup.wait(self.flush_interval)
+                if self._stopping:
+                    return
+            self.flush()
+
+    # --- Spool files ---
+    def _seal_spool(self) -> Optional[str]:
+        """Closes the current spool file as a segment holding exactly the buffered events (caller holds _lock)"""
+        if self._spool is None:
+            return None
+        self._spool.close()
+        segment = f"{self.spool_path}.{time.time_ns()}"
+        os.replace(self.spool_path, segment)
+        self._spool = open(self.spool_path, "a", encoding="utf-8")
+        return segment
+
+    def _recover_spool(self):
+        if os.path.exists(self.spool_path):
+            os.replace(self.spool_path, f"{self.spool_path}.{time.time_ns()}")
+        segments = sorted(glob.glob(glob.escape(self.spool_path) + ".*"))
+        recovered = 0
+        for segment in segments:
+            events = []
+            with open(segment, encoding="utf-8") as spool:
+                for line in spool:
+                    try:
+                        task_id, user_id, action, timestamp, details = json.loads(line)
+                    except ValueError:
+                        print(f"Skipping unreadable task history spool line in {segment}") # e.g. torn last write
+                        continue
+                    events.append((task_id, user_id, action, datetime.fromisoformat(timestamp), details))
+            self._unwritten.append((segment, events))
+            recovered += len(events)
+        if recovered:
+            print(f"Task history: replaying {recovered} spooled events")
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "mode": "spooled" if self.spool_path else "buffered",
+            "buffered": buffered,
+            "unwritten": sum(len(events) for _, events in list(self._unwritten)),
+            "written": self._written,
+            "dropped": self._dropped, # Events of deleted tasks and rows the database rejected
+            "flush_failures": self._failures,
+            "last_error": self._last_error,
+        }
+
+
+if TASK_HISTORY_MODE not in ("sync", "buffered", "spooled"):
+    raise ValueError(f"Unknown TASK_HISTORY_MODE {TASK_HISTORY_MODE!r} (expected sync, buffered or spooled)")
+history_sink = None if TASK_HISTORY_MODE == "sync" else TaskHistorySink(
+    TASK_HISTORY_SPOOL_PATH if TASK_HISTORY_MODE == "spooled" else None
+)
+
+
+def insert_task_history(db, task_id: int, user_id: int, action: str, details: Optional[str] = None):
+    """Synchronous history insert in the caller's transaction (commit happens with the main operation)"""
+    try:
+        INSERT_HISTORY_NOW.execute(db.cursor(), (task_id, user_id, action, details))
+    except pyodbc.Error as e:
+        # Log or handle error, but don't let history failure stop main operation?
+        print(f"Error adding task history: {e}")
+    except Exception as e:
+         print(f"Unexpected error in add_task_history: {e}")
+
+
+def add_task_history(db, task_id: int, user_id: int, action: str, details: Optional[str] = None):
+    """
+    Stages a history event for the caller's transaction. In sync mode it is inserted now;
+    otherwise the event is returned and must be passed to publish_task_history() after commit.
+    """
+    if history_sink is None:
+        insert_task_history(db, task_id, user_id, action, details)
+        return None
+    return (task_id, user_id, action, datetime.now(), details)
+
+
+def publish_task_history(event):
+    if event is not None:
+        history_sink.record(event)
+
+
+def flush_task_history(task_id: int):
+    """Makes write-behind events of a task visible before its history is read"""
+    if history_sink is not None and history_sink.has_pending(task_id):
+        history_sink.flush()
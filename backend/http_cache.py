@@ -0,0 +1,50 @@
+"""
+Version-stamped response caching with ETags.
+
+A cached response is keyed on (endpoint, params, versions of the data scopes it reads).
+Writers bump those versions (cache.bump_data_versions), which makes the old entries
+unreachable; the TTL bounds staleness for writes made outside this process. While an
+entry is live, a request whose If-None-Match carries its ETag gets a 304 without any
+database work. Entries hold the encoded JSON body, so a hit is not serialized again.
+"""
+import hashlib
+import json
+
+from fastapi import Request, Response, status
+
+from cache import data_versions
+from database import request_connection
+from serialization import dump_json, TrustedJSONResponse
+
+_MISSING = object()
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip() for tag in header.split(","))
+
+
+def serve_cached(cache, request: Request, response: Response, endpoint: str, params: dict, scopes, load):
+    """
+    Returns the cached response for (endpoint, params) at the scopes' current versions, a 304
+    if the client already has it, or load(db) run on a pooled connection, encoded and cached.
+    load must return data already shaped like the route's response_model (see serialization).
+    """
+    # Read the versions before loading: a write that lands mid-load bumps them past this key
+    versions = tuple(data_versions.get(scope) for scope in scopes)
+    key = (endpoint, json.dumps(params, sort_keys=True, default=str), versions)
+    etag = f'W/"{hashlib.sha1(repr(key).encode()).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    body = cache.get(key, _MISSING)
+    if body is _MISSING:
+        with request_connection() as db:
+            body = dump_json(load(db))
+        cache.set(key, body)
+    elif _etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Headers go on the returned response: FastAPI only merges the injected one into responses it builds
+    return TrustedJSONResponse(body, headers={**response.headers, **headers})
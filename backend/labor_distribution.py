@@ -0,0 +1,83 @@
+"""
+Daily labor distribution engine.
+
+Each task's labor is spread evenly over the days it covers inside the requested range.
+Instead of walking every day of every task, the per-day rates are written into
+difference arrays at each task's first and one-past-last day and summed with a
+cumulative sum, so totals cost O(tasks + days). Per-day membership is returned as
+task ID lists rather than copies of the tasks.
+"""
+from datetime import date, timedelta
+from typing import List
+
+import numpy as np
+
+# Summing rates via cumsum leaves floating point noise around zero
+ROUND_DECIMALS = 6
+
+
+def distribute_labor(tasks: list, start_date: date, end_date: date) -> List[dict]:
+    """
+    Spreads each task's remaining planned labor (planned - actual) and its actual labor
+    evenly over the days between max(start_date, task start) and min(end_date, task
+    completion). Returns one dict per day in the range with planned_labor, actual_labor,
+    remaining_labor and task_ids (the tasks active that day, in input order). Tasks are
+    records with id, start_date, completion_date, planned_labor and actual_labor attributes.
+    """
+    n_days = (end_date - start_date).days + 1
+    if n_days <= 0:
+        return []
+
+    if tasks:
+        origin = start_date.toordinal()
+        task_ids = np.fromiter((task.id for task in tasks), dtype=np.int64, count=len(tasks))
+        starts = np.fromiter((task.start_date.toordinal() for task in tasks), dtype=np.int64, count=len(tasks)) - origin
+        ends = np.fromiter((task.completion_date.toordinal() for task in tasks), dtype=np.int64, count=len(tasks)) - origin
+        planned = np.fromiter((task.planned_labor or 0.0 for task in tasks), dtype=np.float64, count=len(tasks))
+        actual = np.fromiter((task.actual_labor or 0.0 for task in tasks), dtype=np.float64, count=len(tasks))
+
+        starts = np.maximum(starts, 0)
+        ends = np.minimum(ends, n_days - 1)
+        active = ends >= starts # Tasks that overlap the range at all
+        task_ids, starts, ends, planned, actual = task_ids[active], starts[active], ends[active], planned[active], actual[active]
+        spans = ends - starts + 1
+    else:
+        task_ids = starts = ends = spans = np.zeros(0, dtype=np.int64)
+        planned = actual = np.zeros(0, dtype=np.float64)
+
+    planned_per_day = (planned - actual) / np.where(spans > 0, spans, 1)
+    actual_per_day = actual / np.where(spans > 0, spans, 1)
+
+    # Difference arrays: +rate on the first day, -rate the day after the last day
+    planned_diff = np.zeros(n_days + 1)
+    actual_diff = np.zeros(n_days + 1)
+    np.add.at(planned_diff, starts, planned_per_day)
+    np.add.at(planned_diff, ends + 1, -planned_per_day)
+    np.add.at(actual_diff, starts, actual_per_day)
+    np.add.at(actual_diff, ends + 1, -actual_per_day)
+    daily_planned = np.round(np.cumsum(planned_diff[:-1]), ROUND_DECIMALS) + 0.0 # + 0.0 turns -0.0 into 0.0
+    daily_actual = np.round(np.cumsum(actual_diff[:-1]), ROUND_DECIMALS) + 0.0
+    daily_remaining = np.round(daily_planned - daily_actual, ROUND_DECIMALS) + 0.0
+
+    # Membership: one (day, task) pair per covered day, grouped by day with a stable sort
+    total = int(spans.sum())
+    offsets = np.repeat(np.cumsum(spans) - spans, spans)
+    day_index = np.repeat(starts, spans) + (np.arange(total) - offsets)
+    member_ids = np.repeat(task_ids, spans)
+    order = np.argsort(day_index, kind="stable")
+    counts = np.bincount(day_index, minlength=n_days)
+    per_day_ids = np.split(member_ids[order], np.cumsum(counts)[:-1])
+
+    planned_list = daily_planned.tolist()
+    actual_list = daily_actual.tolist()
+    remaining_list = daily_remaining.tolist()
+    return [
+        {
+            "date": start_date + timedelta(days=i),
+            "planned_labor": planned_list[i],
+            "actual_labor": actual_list[i],
+            "remaining_labor": remaining_list[i],
+            "task_ids": per_day_ids[i].tolist(),
+        }
+        for i in range(n_days)
+    ]
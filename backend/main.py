@@ -1,7 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 # Make sure routers path is correct if structure changed
-from routers import auth, tasks, users, analytics, teams, notifications  # Added teams
+from routers import auth, tasks, users, analytics, teams, notifications, monitoring, events  # Added teams
+from database import pool, db_executor
+from history import history_sink
+from passwords import start_hash_pool, shutdown_hash_pool
+from tokens import revocations
+from queries import query_stats_logger
+from metrics import MetricsMiddleware, metrics_endpoint
 # Potentially add teams router if created
 
 app = FastAPI(
@@ -20,8 +26,33 @@ app.add_middleware(
     # expose_headers=["*"], # Be specific about exposed headers if needed
     max_age=3600,
 )
+# Outermost, so the latency covers the whole stack (served at /metrics)
+app.add_middleware(MetricsMiddleware)
 
 # Database tables are created via the SQL script, not on startup.
+# Open the minimum number of pooled connections up front and close them on shutdown.
+@app.on_event("startup")
+def open_db_pool():
+    try:
+        pool.warm()
+    except Exception as e:
+        # The pool opens connections lazily, so the API can still start without the DB
+        print(f"Could not pre-open database connections: {e}")
+    revocations.start()
+    query_stats_logger.start()
+    if history_sink is not None:
+        history_sink.start() # Also replays events spooled by a previous run
+    start_hash_pool()
+
+@app.on_event("shutdown")
+def close_db_pool():
+    db_executor.shutdown(wait=True)
+    shutdown_hash_pool()
+    revocations.close()
+    query_stats_logger.close()
+    if history_sink is not None:
+        history_sink.close() # Flushes buffered history while the pool is still open
+    pool.close()
 
 # Include routers with consistent prefixing
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -30,6 +61,10 @@ app.include_router(teams.router, prefix="/api/teams", tags=["Teams"]) # Added Te
 app.include_router(tasks.router, prefix="/api/tasks", tags=["Tasks"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
 app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
+app.include_router(monitoring.router, prefix="/api/monitoring", tags=["Monitoring"])
+app.include_router(events.router, prefix="/api/events", tags=["Events"])
+# Prometheus scrape endpoint (METRICS_TOKEN protects it)
+app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
 
 # Optional: Add a root endpoint for health check / info
 @app.get("/", tags=["Root"])
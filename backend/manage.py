@@ -0,0 +1,78 @@
+"""
+Maintenance commands. Run from the backend directory, e.g.:
+    python manage.py reconcile-labor                # repair task totals across the whole DB
+    python manage.py reconcile-labor --team-id 1 --dry-run
+    python manage.py rebuild-rollups                # regenerate user_day_labor from tasks
+    python manage.py check-rollups --repair         # report user_day_labor drift, rebuild if any
+    python manage.py calibrate-password-hash --target-ms 250   # suggest PASSWORD_HASH_ROUNDS
+"""
+import argparse
+import json
+
+from database import db_connection
+
+
+def reconcile_labor(args):
+    from routers.tasks import reconcile_task_labor_totals
+    with db_connection() as db:
+        drifted = reconcile_task_labor_totals(db, args.team_id, repair=not args.dry_run)
+        db.commit()
+    print(json.dumps({"repaired": not args.dry_run, "drifted_tasks": drifted}, indent=2, default=str))
+
+
+def rebuild_rollups(args):
+    from rollups import rebuild_user_day_labor
+    with db_connection() as db:
+        rows = rebuild_user_day_labor(db, args.team_id)
+        db.commit()
+    print(json.dumps({"table": "user_day_labor", "team_id": args.team_id, "rows": rows}, indent=2))
+
+
+def check_rollups(args):
+    from rollups import find_day_labor_drift, rebuild_user_day_labor
+    with db_connection() as db:
+        drifted = find_day_labor_drift(db, args.team_id)
+        rows = None
+        if drifted and args.repair:
+            rows = rebuild_user_day_labor(db, args.team_id)
+            db.commit()
+    print(json.dumps({
+        "table": "user_day_labor", "team_id": args.team_id, "drifted_rows": len(drifted),
+        "sample": drifted[:args.sample], "rebuilt_rows": rows,
+    }, indent=2, default=str))
+
+
+def calibrate_password_hash(args):
+    from passwords import calibrate_rounds
+    print(json.dumps(calibrate_rounds(args.target_ms), indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Task management maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = commands.add_parser("reconcile-labor", help="verify and repair tasks' planned/actual labor totals")
+    reconcile.add_argument("--team-id", type=int, default=None, help="limit to one team (default: all tasks)")
+    reconcile.add_argument("--dry-run", action="store_true", help="only report drift, don't repair it")
+    reconcile.set_defaults(func=reconcile_labor)
+
+    rebuild = commands.add_parser("rebuild-rollups", help="regenerate the user_day_labor rollup from scratch")
+    rebuild.add_argument("--team-id", type=int, default=None, help="limit to one team (default: all teams)")
+    rebuild.set_defaults(func=rebuild_rollups)
+
+    check = commands.add_parser("check-rollups", help="compare user_day_labor with a fresh computation from tasks")
+    check.add_argument("--team-id", type=int, default=None, help="limit to one team (default: all teams)")
+    check.add_argument("--repair", action="store_true", help="rebuild the rollup (for --team-id only, if given) when it drifted")
+    check.add_argument("--sample", type=int, default=20, help="drifted rows to print")
+    check.set_defaults(func=check_rollups)
+
+    calibrate = commands.add_parser("calibrate-password-hash", help="time bcrypt costs and suggest PASSWORD_HASH_ROUNDS")
+    calibrate.add_argument("--target-ms", type=float, default=250, help="longest acceptable hash time per login")
+    calibrate.set_defaults(func=calibrate_password_hash)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
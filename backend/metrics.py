@@ -0,0 +1,210 @@
+"""
+Per-request metrics in Prometheus text format.
+
+MetricsMiddleware times every HTTP request until its last body chunk is sent (streamed
+listings and event streams included) and records, per method and route template:
+requests by status, latency, response size, and the number and time of the SQL statements
+the request ran. Statements are counted by queries.Query; the request's counters travel in
+a context variable, which run_db and FastAPI's threadpool copy into worker threads.
+
+A request that runs one named statement more than METRICS_N_PLUS_ONE_THRESHOLD times is
+logged as a likely N+1 (a query per row instead of one set-based query).
+
+GET /metrics serves the metrics for Prometheus. Set METRICS_TOKEN to require
+"Authorization: Bearer <token>" there.
+"""
+import bisect
+import contextvars
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get("METRICS_N_PLUS_ONE_THRESHOLD", "10")) # 0 disables the warning
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNMATCHED_ROUTE = "unmatched" # Label for 404s, so unknown paths don't each get a series
+
+
+class Histogram:
+    """Cumulative buckets per label set, rendered the way Prometheus expects"""
+
+    def __init__(self, name: str, help_text: str, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {} # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, labels: tuple, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, label_names: tuple) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self._series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class RequestQueries:
+    """SQL statements run on behalf of one request"""
+
+    __slots__ = ("count", "seconds", "by_name", "_lock")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.by_name = {}
+        self._lock = threading.Lock() # A request can run statements from several threads
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+            self.by_name[name] = self.by_name.get(name, 0) + 1
+
+
+_request_queries: contextvars.ContextVar[Optional[RequestQueries]] = contextvars.ContextVar("request_queries", default=None)
+
+
+def record_query(name: str, seconds: float):
+    """Called by queries.Query for every execution; outside a request there is nothing to add to"""
+    current = _request_queries.get()
+    if current is not None:
+        current.record(name, seconds)
+
+
+class RequestMetrics:
+    LABELS = ("method", "route")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {} # (method, route, status) -> count
+        self.in_progress = 0
+        self.n_plus_one_warnings = {} # (method, route, query) -> count
+        self.latency = Histogram("http_request_duration_seconds", "Time until the last byte of the response was sent", LATENCY_BUCKETS)
+        self.db_queries = Histogram("http_request_db_queries", "SQL statements run per request", QUERY_COUNT_BUCKETS)
+        self.db_seconds = Histogram("http_request_db_seconds", "Time spent in SQL statements per request", LATENCY_BUCKETS)
+        self.response_size = Histogram("http_response_size_bytes", "Response body size", SIZE_BUCKETS)
+
+    def started(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def finished(self, method, route, status_code, seconds, size, queries: RequestQueries):
+        labels = (method, route)
+        suspects = [(name, count) for name, count in queries.by_name.items() if 0 < METRICS_N_PLUS_ONE_THRESHOLD < count]
+        with self._lock:
+            self.in_progress -= 1
+            key = (method, route, str(status_code))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.latency.observe(labels, seconds)
+            self.db_queries.observe(labels, queries.count)
+            self.db_seconds.observe(labels, queries.seconds)
+            self.response_size.observe(labels, size)
+            for name, _ in suspects:
+                key = (method, route, name)
+                self.n_plus_one_warnings[key] = self.n_plus_one_warnings.get(key, 0) + 1
+        for name, count in suspects:
+            print(f"Possible N+1: {method} {route} ran {name} {count} times "
+                  f"({queries.count} statements, {queries.seconds * 1000:.1f} ms in the DB)")
+
+    def render(self) -> str:
+        with self._lock:
+            lines = ["# HELP http_requests_total Requests completed, by status",
+                     "# TYPE http_requests_total counter"]
+            for key, count in sorted(self.requests.items()):
+                lines.append(f"http_requests_total{{{_labels(self.LABELS + ('status',), key)}}} {count}")
+            lines += ["# HELP http_requests_in_progress Requests being handled or streamed",
+                      "# TYPE http_requests_in_progress gauge",
+                      f"http_requests_in_progress {self.in_progress}"]
+            for histogram in (self.latency, self.db_queries, self.db_seconds, self.response_size):
+                lines += histogram.render(self.LABELS)
+            lines += ["# HELP http_request_n_plus_one_total Requests that repeated one statement more than the N+1 threshold",
+                      "# TYPE http_request_n_plus_one_total counter"]
+            for key, count in sorted(self.n_plus_one_warnings.items()):
+                lines.append(f"http_request_n_plus_one_total{{{_labels(self.LABELS + ('query',), key)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def route_template(scope) -> str:
+    """The matched route's path with its {parameters}, e.g. /api/tasks/{task_id}"""
+    route = scope.get("route") # Set by the router once a route matched
+    template = getattr(route, "path", None)
+    if template is None:
+        return UNMATCHED_ROUTE
+    path = scope["path"]
+    if route.path_regex.match(path):
+        return template
+    # FastAPI versions that keep included routers nested leave the router prefix out of
+    # route.path; the prefix is whatever precedes the part the route matched
+    for index, char in enumerate(path):
+        if char == "/" and index and route.path_regex.match(path[index:]):
+            return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware, so streamed bodies are timed and counted to the end"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _request_queries.set(queries)
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        request_metrics.started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_queries.reset(token)
+            request_metrics.finished(scope["method"], route_template(scope), response["status"], elapsed, response["size"], queries)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if METRICS_TOKEN:
+        scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(credentials, METRICS_TOKEN):
+            return PlainTextResponse("Unauthorized\n", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,108 @@
+"""
+Password hashing on a dedicated process pool.
+
+bcrypt is deliberately slow (hundreds of milliseconds at production cost), so hashing and
+verifying run in PASSWORD_HASH_WORKERS worker processes: a burst of logins neither blocks
+the event loop nor holds DB executor threads and pooled connections, and the pool size
+caps how many CPU cores hashing can take from the API.
+
+PASSWORD_HASH_ROUNDS is the bcrypt work factor for new hashes. A stored hash with a
+different cost is rehashed at the configured cost on the next successful login (see
+needs_rehash), so raising or lowering the cost migrates users as they sign in.
+"python manage.py calibrate-password-hash" suggests a cost for this hardware.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+PASSWORD_HASH_ROUNDS = int(os.environ.get("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_REHASH_ON_LOGIN = os.environ.get("PASSWORD_REHASH_ON_LOGIN", "1") == "1"
+
+MIN_ROUNDS, MAX_ROUNDS = 4, 31 # bcrypt's limits
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+# --- Worker functions (run in the pool; module level so they can be pickled) ---
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+def _check(password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+
+def _ready() -> int:
+    return os.getpid()
+
+
+# --- Pool ---
+def hash_pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the API process has threads (DB executor, history writer) a fork would copy mid-flight
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def start_hash_pool():
+    """Starts every worker up front, so the first logins don't pay for process start-up"""
+    pool = hash_pool()
+    for future in [pool.submit(_ready) for _ in range(PASSWORD_HASH_WORKERS)]:
+        future.result()
+
+def shutdown_hash_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+# --- API ---
+# The sync versions block only the calling thread (e.g. a def endpoint's threadpool thread)
+def hash_password(password: str, rounds: int = PASSWORD_HASH_ROUNDS) -> str:
+    return hash_pool().submit(_hash, password, rounds).result()
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return hash_pool().submit(_check, plain_password, hashed_password).result()
+
+async def hash_password_async(password: str, rounds: int = PASSWORD_HASH_ROUNDS) -> str:
+    return await asyncio.get_running_loop().run_in_executor(hash_pool(), _hash, password, rounds)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await asyncio.get_running_loop().run_in_executor(hash_pool(), _check, plain_password, hashed_password)
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Work factor of a bcrypt hash ("$2b$12$..." -> 12), None if it is not one"""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+def needs_rehash(hashed_password: str) -> bool:
+    return PASSWORD_REHASH_ON_LOGIN and hash_rounds(hashed_password) != PASSWORD_HASH_ROUNDS
+
+
+def calibrate_rounds(target_ms: float, samples: int = 3) -> dict:
+    """Highest cost whose hash takes at most target_ms on this machine (timed in this process)"""
+    timings = {}
+    rounds = MIN_ROUNDS
+    while rounds <= MAX_ROUNDS:
+        started = time.perf_counter()
+        for _ in range(samples):
+            _hash("calibration password", rounds)
+        timings[rounds] = (time.perf_counter() - started) * 1000 / samples
+        if timings[rounds] > target_ms:
+            break
+        rounds += 1 # Each step doubles the time, so this stops after a few slow samples
+    within = [cost for cost, ms in timings.items() if ms <= target_ms]
+    return {
+        "target_ms": target_ms,
+        "suggested_rounds": max(within) if within else MIN_ROUNDS,
+        "hash_ms_by_rounds": {cost: round(ms, 1) for cost, ms in timings.items()},
+        "configured_rounds": PASSWORD_HASH_ROUNDS,
+    }
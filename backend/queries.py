@@ -0,0 +1,588 @@
+"""
+Named SQL statements.
+
+Every statement the routers run is defined here once, as a Query with a dotted name
+("tasks.by_ids"), and executed through it. A Query times each execution (including
+fetching its rows) and keeps per-name counters: calls, errors, rows returned or affected,
+total and max latency. They are served from /api/monitoring/queries and, every
+QUERY_STATS_LOG_SECONDS, the statements that took the most time are logged.
+
+Helper modules with composed SQL of their own (rollups, history, task_import) create
+their Query objects next to that SQL; every Query registers itself in `registry`.
+
+SQL is parameterized with ?. A few statements have {fragments} for the parts a parameter
+cannot express (IN lists, optional filters, ORDER BY, SET lists); callers fill them only
+from code: placeholders(), whitelisted predicates and column names, never request values.
+All variants of a statement count under its one name.
+"""
+import os
+import threading
+import time
+from typing import Optional
+
+from database import executemany_fast
+from metrics import record_query
+from rows import RowMapper
+from streaming import QueryStream
+
+QUERY_STATS_LOG_SECONDS = float(os.environ.get("QUERY_STATS_LOG_SECONDS", "300")) # 0 disables the periodic log
+QUERY_STATS_LOG_TOP = int(os.environ.get("QUERY_STATS_LOG_TOP", "10"))
+
+# Every Query registers itself here (name -> Query)
+registry = {}
+
+
+def placeholders(values) -> str:
+    """"?,?,?" for an IN list of len(values)"""
+    return ",".join("?" * len(values))
+
+
+class Query:
+    """One named statement, with its execution counters. rows: mapper for one()/all()."""
+
+    def __init__(self, name: str, sql: str, rows: Optional[RowMapper] = None):
+        if name in registry:
+            raise ValueError(f"Query {name} is already defined")
+        self.name = name
+        self.sql = sql
+        self.rows = rows
+        self._lock = threading.Lock()
+        self.reset()
+        registry[name] = self
+
+    def text(self, **fragments) -> str:
+        return self.sql.format(**fragments) if fragments else self.sql
+
+    # --- Execution ---
+    def _run(self, cursor, params, fragments, fetch):
+        started = time.perf_counter()
+        try:
+            cursor.execute(self.text(**fragments), params)
+            result, rows = fetch(cursor)
+        except Exception:
+            self.record(time.perf_counter() - started, 0, failed=True)
+            raise
+        self.record(time.perf_counter() - started, rows)
+        return result
+
+    def execute(self, cursor, params=(), **fragments) -> int:
+        """Runs a statement without a result set; returns the affected row count"""
+        return self._run(cursor, params, fragments, _affected)
+
+    def fetchone(self, cursor, params=(), **fragments):
+        return self._run(cursor, params, fragments, _fetchone)
+
+    def fetchall(self, cursor, params=(), **fragments) -> list:
+        return self._run(cursor, params, fragments, _fetchall)
+
+    def scalar(self, cursor, params=(), **fragments):
+        """First column of the first row, or None"""
+        row = self.fetchone(cursor, params, **fragments)
+        return None if row is None else row[0]
+
+    def one(self, cursor, params=(), **fragments):
+        return self._run(cursor, params, fragments, self._one)
+
+    def all(self, cursor, params=(), **fragments) -> list:
+        return self._run(cursor, params, fragments, self._all)
+
+    def executemany(self, cursor, rows: list):
+        """Batched with fast_executemany (see database.executemany_fast); counts the rows sent"""
+        if not rows:
+            return
+        started = time.perf_counter()
+        try:
+            executemany_fast(cursor, self.sql, rows)
+        except Exception:
+            self.record(time.perf_counter() - started, 0, failed=True)
+            raise
+        self.record(time.perf_counter() - started, len(rows))
+
+    def stream(self, params=(), **fragments) -> QueryStream:
+        """A QueryStream over the result; it records the execution once the rows run out or it is closed"""
+        return QueryStream(self.text(**fragments), params, query=self)
+
+    def _one(self, cursor):
+        record = self.rows.one(cursor)
+        return record, 0 if record is None else 1
+
+    def _all(self, cursor):
+        records = self.rows.all(cursor)
+        return records, len(records)
+
+    # --- Counters ---
+    def record(self, seconds: float, rows: int, failed: bool = False):
+        with self._lock:
+            self.calls += 1
+            self.errors += failed
+            self.rows_total += rows
+            self.total_seconds += seconds
+            if seconds > self.max_seconds:
+                self.max_seconds = seconds
+        record_query(self.name, seconds)
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.errors = 0
+            self.rows_total = 0
+            self.total_seconds = 0.0
+            self.max_seconds = 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "calls": self.calls,
+                "errors": self.errors,
+                "rows": self.rows_total,
+                "total_ms": round(self.total_seconds * 1000, 3),
+                "mean_ms": round(self.total_seconds * 1000 / self.calls, 3) if self.calls else None,
+                "max_ms": round(self.max_seconds * 1000, 3),
+            }
+
+
+def _affected(cursor):
+    affected = max(cursor.rowcount, 0)
+    return affected, affected
+
+def _fetchone(cursor):
+    row = cursor.fetchone()
+    return row, 0 if row is None else 1
+
+def _fetchall(cursor):
+    rows = cursor.fetchall()
+    return rows, len(rows)
+
+
+def query_stats(reset: bool = False) -> list:
+    """Counters of every registered statement, most total time first"""
+    stats = []
+    for query in list(registry.values()):
+        stats.append(query.stats())
+        if reset:
+            query.reset()
+    stats.sort(key=lambda entry: entry["total_ms"], reverse=True)
+    return stats
+
+
+class QueryStatsLogger:
+    """Logs the statements that took the most time in each interval"""
+
+    def __init__(self, interval: float = QUERY_STATS_LOG_SECONDS, top: int = QUERY_STATS_LOG_TOP):
+        self.interval = interval
+        self.top = top
+        self._previous = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0:
+            return
+        self._previous = {entry["name"]: entry for entry in query_stats()}
+        self._thread = threading.Thread(target=self._run, name="query-stats-log", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.log()
+            except Exception as e:
+                print(f"Error logging query stats: {e}")
+
+    def log(self):
+        current = {entry["name"]: entry for entry in query_stats()}
+        interval = []
+        for name, entry in current.items():
+            before = self._previous.get(name)
+            if before is None or before["calls"] > entry["calls"]: # New, or reset since the last log
+                before = {"calls": 0, "rows": 0, "total_ms": 0.0}
+            calls = entry["calls"] - before["calls"]
+            if calls:
+                total_ms = entry["total_ms"] - before["total_ms"]
+                interval.append((total_ms, calls, entry["rows"] - before["rows"], name))
+        self._previous = current
+        if not interval:
+            return
+        interval.sort(reverse=True)
+        lines = [
+            f"  {name}: {calls} calls, {total_ms:.1f} ms total, {total_ms / calls:.2f} ms mean, {rows} rows"
+            for total_ms, calls, rows, name in interval[:self.top]
+        ]
+        print(f"Query stats for the last {self.interval:g}s (top {len(lines)} by time):\n" + "\n".join(lines))
+
+
+query_stats_logger = QueryStatsLogger()
+
+
+# --- Row shapes ---
+# Records in TaskResponse / TaskAssignee shape
+TASK_ROWS = RowMapper("TaskRecord", (
+    "id", "description", "priority", "team_id", "start_date", "completion_date",
+    "creator_id", "planned_labor", "actual_labor", "work_size", "roadmap", "status",
+), extra_fields=("assignees",))
+ASSIGNEE_ROWS = RowMapper("TaskAssigneeRecord", ("id", "task_id", "user_id", "role", "planned_labor", "actual_labor"))
+HISTORY_ROWS = RowMapper("TaskHistoryRecord", ("id", "task_id", "user_id", "action", "timestamp", "details"))
+# Records in UserResponse shape
+USER_ROWS = RowMapper("UserRecord", ("id", "name", "username", "email", "role", "team_id"))
+# Records in Team shape
+TEAM_ROWS = RowMapper("TeamRecord", ("id", "name", "manager_id"))
+NOTIFICATION_ROWS = RowMapper("NotificationRecord", ("id", "recipient_email", "subject", "body", "sent_at", "is_read"))
+
+
+# --- Tasks ---
+TASKS_BY_IDS = Query("tasks.by_ids", f"""
+    SELECT {TASK_ROWS.select_list('t')}
+    FROM tasks t
+    WHERE t.id IN ({{ids}})
+""", TASK_ROWS)
+
+# Keyset page of task ids: where/order are built from tasks.TASK_FILTERS and TASK_SORT_COLUMNS
+TASK_PAGE_IDS = Query("tasks.page_ids", """
+    SELECT {top}t.id, {sort_column} AS sort_value
+    FROM tasks t
+    WHERE {where}
+    ORDER BY {order}
+""")
+
+TASKS_WITH_ASSIGNEES_STREAM = Query("tasks.stream_with_assignees", f"""
+    SELECT {TASK_ROWS.select_list('t')}, {ASSIGNEE_ROWS.select_list('ta')}
+    FROM tasks t
+    LEFT JOIN task_assignees ta ON ta.task_id = t.id
+    WHERE {{where}}
+    ORDER BY {{order}}, ta.id
+""")
+
+INSERT_TASK = Query("tasks.insert", """
+    INSERT INTO tasks (
+        description, priority, team_id, start_date, completion_date, creator_id,
+        planned_labor, work_size, roadmap, status, actual_labor
+    )
+    OUTPUT INSERTED.id
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+
+# assignments: "field = ?, ..." over TaskUpdateData fields
+UPDATE_TASK_FIELDS = Query("tasks.update_fields", """
+    UPDATE tasks
+    SET {assignments}
+    WHERE id = ?
+""")
+
+# Held until commit: concurrent writes to one task queue up, so each reads the state the previous one left
+LOCK_TASK = Query("tasks.lock", "SELECT id FROM tasks WITH (UPDLOCK, HOLDLOCK) WHERE id = ?")
+
+TASK_DELETE_INFO = Query(
+    "tasks.delete_info", "SELECT creator_id, team_id, description FROM tasks WITH (UPDLOCK, HOLDLOCK) WHERE id = ?"
+)
+
+DELETE_TASK = Query("tasks.delete", "DELETE FROM tasks WHERE id = ?") # Cascades to assignees and history
+
+APPLY_TASK_LABOR_DELTA = Query("tasks.apply_labor_delta", """
+    UPDATE tasks
+    SET planned_labor = planned_labor + ?, actual_labor = ISNULL(actual_labor, 0) + ?
+    WHERE id = ?
+""")
+
+COUNT_TEAM_TASKS = Query("tasks.count_by_team", "SELECT COUNT(*) FROM tasks WHERE team_id = ?")
+
+# Task totals against the sums over their assignees, for one team or all (team_id NULL);
+# params: team_id, team_id, tolerance, tolerance
+_ASSIGNEE_SUMS_CTE = """
+    WITH assignee_sums AS (
+        SELECT t.id,
+               ISNULL(SUM(ISNULL(ta.planned_labor, 0)), 0) AS expected_planned,
+               ISNULL(SUM(ISNULL(ta.actual_labor, 0)), 0) AS expected_actual
+        FROM tasks t
+        LEFT JOIN task_assignees ta ON ta.task_id = t.id
+        WHERE (? IS NULL OR t.team_id = ?)
+        GROUP BY t.id
+    )
+"""
+_LABOR_DRIFT_PREDICATE = """
+    ABS(t.planned_labor - s.expected_planned) > ?
+    OR ABS(ISNULL(t.actual_labor, 0) - s.expected_actual) > ?
+"""
+
+FIND_TASK_LABOR_DRIFT = Query("tasks.find_labor_drift", f"""{_ASSIGNEE_SUMS_CTE}
+    SELECT t.id, t.team_id, t.planned_labor, s.expected_planned, t.actual_labor, s.expected_actual
+    FROM tasks t
+    JOIN assignee_sums s ON s.id = t.id
+    WHERE {_LABOR_DRIFT_PREDICATE}
+""")
+
+REPAIR_TASK_LABOR_DRIFT = Query("tasks.repair_labor_drift", f"""{_ASSIGNEE_SUMS_CTE}
+    UPDATE t
+    SET planned_labor = s.expected_planned, actual_labor = s.expected_actual
+    OUTPUT INSERTED.id, INSERTED.team_id, DELETED.planned_labor, INSERTED.planned_labor,
+           DELETED.actual_labor, INSERTED.actual_labor
+    FROM tasks t
+    JOIN assignee_sums s ON s.id = t.id
+    WHERE {_LABOR_DRIFT_PREDICATE}
+""")
+
+
+# --- Task assignees ---
+ASSIGNEES_BY_TASK_IDS = Query("task_assignees.by_task_ids", f"""
+    SELECT {ASSIGNEE_ROWS.select_list()}
+    FROM task_assignees
+    WHERE task_id IN ({{ids}})
+    ORDER BY task_id, id
+""", ASSIGNEE_ROWS)
+
+# Locks the task's assignee rows so concurrent updates can't diff against stale data
+LOCK_TASK_ASSIGNEES = Query("task_assignees.lock_for_task", """
+    SELECT id, user_id, role, planned_labor, actual_labor
+    FROM task_assignees WITH (UPDLOCK, HOLDLOCK)
+    WHERE task_id = ?
+    ORDER BY id
+""")
+
+TASK_ASSIGNEE_USER_IDS = Query("task_assignees.user_ids_by_task", "SELECT user_id FROM task_assignees WHERE task_id = ?")
+
+INSERT_TASK_ASSIGNEE = Query("task_assignees.insert", """
+    INSERT INTO task_assignees (task_id, user_id, role, planned_labor, actual_labor)
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+UPDATE_TASK_ASSIGNEE = Query("task_assignees.update", """
+    UPDATE task_assignees SET role = ?, planned_labor = ?, actual_labor = ? WHERE id = ?
+""")
+
+DELETE_TASK_ASSIGNEES = Query("task_assignees.delete_by_ids", "DELETE FROM task_assignees WHERE id IN ({ids})")
+
+
+# --- Task history ---
+TASK_HISTORY = Query("task_history.by_task", f"""
+    SELECT {HISTORY_ROWS.select_list()}
+    FROM task_history
+    WHERE task_id = ?
+    ORDER BY timestamp DESC
+""", HISTORY_ROWS)
+
+
+# --- Analytics ---
+USER_TASK_IDS_STARTING_BETWEEN = Query("analytics.user_task_ids_starting_between", """
+    SELECT DISTINCT t.id
+    FROM tasks t
+    JOIN task_assignees ta ON t.id = ta.task_id
+    WHERE ta.user_id = ? AND t.start_date BETWEEN ? AND ?
+""")
+
+_DAY_LABOR_SQL = """
+    SELECT user_id, labor_date, SUM(planned_labor), SUM(actual_labor), SUM(task_count)
+    FROM user_day_labor
+    WHERE {scope} = ? AND labor_date BETWEEN ? AND ?
+    GROUP BY user_id, labor_date
+    ORDER BY user_id, labor_date
+"""
+TEAM_DAY_LABOR = Query("user_day_labor.by_team", _DAY_LABOR_SQL.format(scope="team_id"))
+USER_DAY_LABOR = Query("user_day_labor.by_user", _DAY_LABOR_SQL.format(scope="user_id"))
+
+# ORDER BY choices of OptimizationRequest.optimization_param
+TASK_DISTRIBUTION_ORDERINGS = {
+    "priority": "CASE t.priority WHEN 'High' THEN 1 WHEN 'Medium' THEN 2 ELSE 3 END",
+    "work_size": "t.work_size DESC",
+    "completion_date": "t.completion_date",
+}
+TEAM_ASSIGNMENTS_STARTING_BETWEEN = Query("analytics.team_assignments_starting_between", """
+    SELECT u.id as user_id, u.name as user_name, t.id as task_id
+    FROM tasks t
+    JOIN task_assignees ta ON t.id = ta.task_id
+    JOIN users u ON ta.user_id = u.id
+    WHERE t.team_id = ? AND t.start_date BETWEEN ? AND ?
+    ORDER BY {ordering}, t.start_date
+""")
+
+# Labor-carrying assignments of the team's open tasks overlapping a date range
+PLANNABLE_ASSIGNMENTS = Query("analytics.plannable_assignments", """
+    SELECT t.id AS task_id, t.start_date, t.completion_date, t.planned_labor AS task_planned, t.status,
+           ta.user_id, ta.planned_labor, ta.actual_labor
+    FROM tasks t
+    JOIN task_assignees ta ON ta.task_id = t.id
+    JOIN users u ON u.id = ta.user_id
+    WHERE t.team_id = ? AND u.team_id = ?
+      AND ta.role IN ('assignee', 'partner')
+      AND t.status IN ('Not Started', 'In Progress', 'Paused')
+      AND t.start_date <= ? AND t.completion_date >= ?
+""")
+
+
+# --- Users ---
+ALL_USERS = Query("users.all", f"SELECT {USER_ROWS.select_list()} FROM users", USER_ROWS)
+
+USER_BY_ID = Query("users.by_id", f"SELECT {USER_ROWS.select_list()} FROM users WHERE id = ?", USER_ROWS)
+
+USER_INFO_BY_ID = Query("users.info_by_id", "SELECT id, username, name, email, role, team_id FROM users WHERE id = ?")
+
+USER_LOGIN_ROW = Query(
+    "users.login_row", "SELECT id, username, password_hash, role, team_id, name, email FROM users WHERE username = ?"
+)
+
+USER_ID_BY_USERNAME = Query("users.id_by_username", "SELECT id FROM users WHERE username = ?")
+
+USER_ID_BY_EMAIL = Query("users.id_by_email", "SELECT id FROM users WHERE email = ?")
+
+OTHER_USER_ID_BY_EMAIL = Query("users.other_id_by_email", "SELECT id FROM users WHERE email = ? AND id != ?")
+
+USER_ROLE = Query("users.role_by_id", "SELECT role FROM users WHERE id = ?")
+
+USER_NAME = Query("users.name_by_id", "SELECT name FROM users WHERE id = ?")
+
+TEAM_USER_NAMES = Query("users.names_by_team", "SELECT id, name FROM users WHERE team_id = ? ORDER BY id")
+
+COUNT_TEAM_USERS = Query("users.count_by_team", "SELECT COUNT(*) FROM users WHERE team_id = ?")
+
+INSERT_USER = Query("users.insert", """
+    INSERT INTO users (name, username, password_hash, email, role, team_id)
+    OUTPUT INSERTED.id, INSERTED.name, INSERTED.username, INSERTED.email, INSERTED.role, INSERTED.team_id
+    VALUES (?, ?, ?, ?, ?, ?)
+""")
+
+# assignments: "field = ?, ..." over UserUpdate fields
+UPDATE_USER_FIELDS = Query("users.update_fields", "UPDATE users SET {assignments} WHERE id = ?")
+
+USER_PASSWORD_HASH = Query("users.password_hash_by_id", "SELECT password_hash FROM users WHERE id = ?")
+
+# Only replaces the hash the caller checked the password against, so a concurrent password change wins
+REPLACE_PASSWORD_HASH = Query(
+    "users.replace_password_hash", "UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?"
+)
+
+
+# --- Teams ---
+ALL_TEAMS = Query("teams.all", f"SELECT {TEAM_ROWS.select_list()} FROM teams ORDER BY name", TEAM_ROWS)
+
+TEAM_BY_ID = Query("teams.by_id", f"SELECT {TEAM_ROWS.select_list()} FROM teams WHERE id = ?", TEAM_ROWS)
+
+TEAM_EXISTS = Query("teams.exists", "SELECT 1 FROM teams WHERE id = ?")
+
+INSERT_TEAM = Query(
+    "teams.insert", "INSERT INTO teams (name, manager_id) OUTPUT INSERTED.id, INSERTED.name, INSERTED.manager_id VALUES (?, ?)"
+)
+
+# assignments: "field = ?, ..." over TeamUpdate fields
+UPDATE_TEAM_FIELDS = Query("teams.update_fields", "UPDATE teams SET {assignments} WHERE id = ?")
+
+DELETE_TEAM = Query("teams.delete", "DELETE FROM teams WHERE id = ?")
+
+# Members with their workload on the team's tasks only; params: today, today, upcoming until, team_id, team_id
+TEAM_MEMBER_WORKLOAD = Query("teams.member_workload", """
+    SELECT
+        u.id, u.username, u.email, u.name, u.role, u.team_id,
+        SUM(CASE WHEN t.status = 'Not Started' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN t.status = 'In Progress' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN t.status = 'Paused' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN t.status = 'Completed' THEN 1 ELSE 0 END),
+        SUM(CASE WHEN t.status = 'Cancelled' THEN 1 ELSE 0 END),
+        COALESCE(SUM(ta.planned_labor), 0),
+        COALESCE(SUM(ta.actual_labor), 0),
+        SUM(CASE WHEN t.status NOT IN ('Completed', 'Cancelled') AND t.completion_date < ? THEN 1 ELSE 0 END),
+        SUM(CASE WHEN t.status NOT IN ('Completed', 'Cancelled') AND t.completion_date > ? AND t.completion_date <= ? THEN 1 ELSE 0 END)
+    FROM users u
+    LEFT JOIN (
+        task_assignees ta
+        JOIN tasks t ON t.id = ta.task_id AND t.team_id = ?
+    ) ON ta.user_id = u.id AND ta.role IN ('assignee', 'partner')
+    WHERE u.team_id = ?
+    GROUP BY u.id, u.username, u.email, u.name, u.role, u.team_id
+    ORDER BY u.name
+""")
+
+
+# --- Notifications ---
+INSERT_NOTIFICATION = Query("notifications.insert", """
+    INSERT INTO notifications (recipient_email, subject, body, sent_at, is_read)
+    OUTPUT INSERTED.id
+    VALUES (?, ?, ?, ?, ?)
+""")
+
+# recipients: "(?), (?), ..." (up to 1000, the VALUES row limit); params: subject, body, sent_at, *recipients
+INSERT_NOTIFICATIONS_FOR_RECIPIENTS = Query("notifications.insert_for_recipients", """
+    INSERT INTO notifications (recipient_email, subject, body, sent_at, is_read)
+    OUTPUT INSERTED.id, INSERTED.recipient_email
+    SELECT r.recipient_email, ?, ?, ?, 0
+    FROM (VALUES {recipients}) AS r(recipient_email)
+""")
+
+RECIPIENT_NOTIFICATIONS = Query("notifications.by_recipient", f"""
+    SELECT {NOTIFICATION_ROWS.select_list()}
+    FROM notifications
+    WHERE recipient_email = ?
+    ORDER BY sent_at DESC, id DESC
+""", NOTIFICATION_ROWS)
+
+# seek: "" for the first page, else NOTIFICATION_PAGE_SEEK; params: limit, recipient[, sent_at, sent_at, id]
+RECIPIENT_NOTIFICATION_PAGE = Query("notifications.page_by_recipient", f"""
+    SELECT TOP (?) {NOTIFICATION_ROWS.select_list()}
+    FROM notifications
+    WHERE recipient_email = ? {{seek}}
+    ORDER BY sent_at DESC, id DESC
+""", NOTIFICATION_ROWS)
+# Past the last row of the previous page on (sent_at, id); the CAST keeps the comparison in
+# DATETIME precision, which the cursor value came from
+NOTIFICATION_PAGE_SEEK = "AND (sent_at < CAST(? AS DATETIME) OR (sent_at = CAST(? AS DATETIME) AND id < ?))"
+
+UNREAD_NOTIFICATION_COUNT = Query("notifications.unread_count", """
+    SELECT COUNT(*)
+    FROM notifications
+    WHERE recipient_email = ? AND is_read = 0
+""")
+
+MARK_NOTIFICATION_READ = Query("notifications.mark_read", """
+    UPDATE notifications
+    SET is_read = 1
+    WHERE id = ? AND recipient_email = ?
+""")
+
+MARK_NOTIFICATIONS_READ_BATCH = Query("notifications.mark_read_batch", """
+    UPDATE TOP (?) notifications
+    SET is_read = 1
+    WHERE recipient_email = ? AND is_read = 0
+""")
+
+
+# --- Refresh tokens and revocations (see tokens) ---
+INSERT_REFRESH_TOKEN = Query("refresh_tokens.insert", """
+    INSERT INTO refresh_tokens (user_id, family_id, token_hash, issued_at, expires_at)
+    VALUES (?, ?, ?, GETDATE(), DATEADD(day, ?, GETDATE()))
+""")
+
+# One statement: of two requests presenting the same token, only one gets the row
+CONSUME_REFRESH_TOKEN = Query("refresh_tokens.consume", """
+    UPDATE refresh_tokens
+    SET revoked_at = GETDATE()
+    OUTPUT INSERTED.user_id, INSERTED.family_id
+    WHERE token_hash = ? AND revoked_at IS NULL AND expires_at > GETDATE()
+""")
+
+SPENT_REFRESH_TOKEN = Query(
+    "refresh_tokens.spent_by_hash", "SELECT user_id, family_id FROM refresh_tokens WHERE token_hash = ? AND revoked_at IS NOT NULL"
+)
+
+REFRESH_TOKEN_FAMILY = Query("refresh_tokens.family_by_hash", "SELECT family_id FROM refresh_tokens WHERE token_hash = ?")
+
+REVOKE_REFRESH_FAMILY = Query(
+    "refresh_tokens.revoke_family", "UPDATE refresh_tokens SET revoked_at = GETDATE() WHERE family_id = ? AND revoked_at IS NULL"
+)
+
+REVOKE_USER_REFRESH_TOKENS = Query(
+    "refresh_tokens.revoke_user", "UPDATE refresh_tokens SET revoked_at = GETDATE() WHERE user_id = ? AND revoked_at IS NULL"
+)
+
+INSERT_REVOKED_TOKEN = Query("revoked_tokens.insert_token", "INSERT INTO revoked_tokens (jti, expires_at) VALUES (?, ?)")
+
+INSERT_REVOKED_USER = Query(
+    "revoked_tokens.insert_user", "INSERT INTO revoked_tokens (user_id, revoked_before, expires_at) VALUES (?, ?, ?)"
+)
+
+LIVE_REVOCATIONS = Query(
+    "revoked_tokens.live", "SELECT jti, user_id, revoked_before, expires_at FROM revoked_tokens WHERE expires_at > ?"
+)
+
+PRUNE_REVOCATIONS = Query("revoked_tokens.prune", "DELETE FROM revoked_tokens WHERE expires_at <= ?")
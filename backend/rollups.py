@@ -0,0 +1,192 @@
+"""
+user_day_labor rollup: planned/actual labor and task count per (team, user, day).
+
+Every labor-carrying assignment (role assignee or partner) spreads its planned and actual
+labor evenly over the days from its task's start_date to completion_date. The task write
+paths apply the difference between a task's old and new contribution in the same
+transaction; rebuild_user_day_labor() regenerates the table from tasks and task_assignees,
+and find_day_labor_drift() reports rows where the two disagree.
+"""
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from database import chunked, MAX_IN_CLAUSE_PARAMS
+from queries import Query
+
+ROLLUP_ROLES = ('assignee', 'partner')
+ROLLUP_EPSILON = 1e-9
+DRIFT_TOLERANCE = 1e-6 # Labor sums over many days differ from a fresh total in the last digits
+
+# 0..9999 day offsets, enough for any task span; avoids depending on a numbers table
+_DAY_OFFSETS_CTE = """
+    digits AS (SELECT n FROM (VALUES (0), (1), (2), (3), (4), (5), (6), (7), (8), (9)) AS d (n)),
+    day_offsets AS (
+        SELECT a.n + 10 * b.n + 100 * c.n + 1000 * d.n AS n
+        FROM digits a CROSS JOIN digits b CROSS JOIN digits c CROSS JOIN digits d
+    )
+"""
+
+# Expands (team_id, user_id, start_date, completion_date, planned_labor, actual_labor) rows from
+# an "assignments" CTE into one aggregated row per team, user and day
+_EXPAND_ASSIGNMENTS_SQL = """
+    SELECT a.team_id, a.user_id, DATEADD(day, o.n, a.start_date) AS labor_date,
+           SUM(ISNULL(a.planned_labor, 0) / (DATEDIFF(day, a.start_date, a.completion_date) + 1)) AS planned_labor,
+           SUM(ISNULL(a.actual_labor, 0) / (DATEDIFF(day, a.start_date, a.completion_date) + 1)) AS actual_labor,
+           COUNT(*) AS task_count
+    FROM assignments a
+    JOIN day_offsets o ON o.n <= DATEDIFF(day, a.start_date, a.completion_date)
+    GROUP BY a.team_id, a.user_id, DATEADD(day, o.n, a.start_date)
+"""
+
+# Adds a source of (team_id, user_id, labor_date, planned_labor, actual_labor, task_count) deltas;
+# rows whose task count drops to zero are removed
+_MERGE_DELTAS_SQL = """
+    MERGE user_day_labor WITH (HOLDLOCK) AS target
+    USING ({source}) AS src (team_id, user_id, labor_date, planned_labor, actual_labor, task_count)
+    ON target.team_id = src.team_id AND target.user_id = src.user_id AND target.labor_date = src.labor_date
+    WHEN MATCHED AND target.task_count + src.task_count <= 0 THEN DELETE
+    WHEN MATCHED THEN UPDATE SET
+        planned_labor = target.planned_labor + src.planned_labor,
+        actual_labor = target.actual_labor + src.actual_labor,
+        task_count = target.task_count + src.task_count
+    WHEN NOT MATCHED AND src.task_count > 0 THEN
+        INSERT (team_id, user_id, labor_date, planned_labor, actual_labor, task_count)
+        VALUES (src.team_id, src.user_id, src.labor_date, src.planned_labor, src.actual_labor, src.task_count);
+"""
+
+TASK_SPAN = Query("rollups.task_span", "SELECT team_id, start_date, completion_date FROM tasks WHERE id = ?")
+TASK_LABOR_ASSIGNMENTS = Query(
+    "rollups.task_assignments", "SELECT user_id, role, planned_labor, actual_labor FROM task_assignees WHERE task_id = ?"
+)
+# values: "(?, ?, ?, ?, ?, ?), ..." rows of deltas
+MERGE_DAY_LABOR_DELTAS = Query("rollups.merge_deltas", _MERGE_DELTAS_SQL.format(source="VALUES {values}"))
+ADD_STAGED_DAY_LABOR = Query("rollups.add_staged", f"""
+    WITH {_DAY_OFFSETS_CTE},
+    assignments AS (
+        SELECT t.team_id, a.user_id, t.start_date, t.completion_date, a.planned_labor, a.actual_labor
+        FROM #bulk_assignees a
+        JOIN #bulk_ids i ON i.row_no = a.row_no
+        JOIN #bulk_tasks t ON t.row_no = a.row_no
+        WHERE a.role IN ('assignee', 'partner')
+    )
+    {_MERGE_DELTAS_SQL.format(source=_EXPAND_ASSIGNMENTS_SQL)}
+""")
+# team_filter: "" or "AND t.team_id = ?"
+CLEAR_DAY_LABOR = Query("rollups.clear", "DELETE FROM user_day_labor WITH (TABLOCKX) {team_filter}")
+_TASK_ASSIGNMENTS_CTE = """
+    assignments AS (
+        SELECT t.team_id, ta.user_id, t.start_date, t.completion_date, ta.planned_labor, ta.actual_labor
+        FROM tasks t
+        JOIN task_assignees ta ON ta.task_id = t.id
+        WHERE ta.role IN ('assignee', 'partner') {team_filter}
+    )
+"""
+REBUILD_DAY_LABOR = Query("rollups.rebuild", f"""
+    WITH {_DAY_OFFSETS_CTE},
+    {_TASK_ASSIGNMENTS_CTE}
+    INSERT INTO user_day_labor (team_id, user_id, labor_date, planned_labor, actual_labor, task_count)
+    {_EXPAND_ASSIGNMENTS_SQL}
+""")
+# Rows missing from the table, extra in it, or with other values than a rebuild would write.
+# team_filter: "" or "AND t.team_id = ?"; stored_filter: "" or "WHERE team_id = ?"
+FIND_DAY_LABOR_DRIFT = Query("rollups.find_drift", f"""
+    WITH {_DAY_OFFSETS_CTE},
+    {_TASK_ASSIGNMENTS_CTE},
+    expected AS ({_EXPAND_ASSIGNMENTS_SQL}),
+    stored AS (SELECT team_id, user_id, labor_date, planned_labor, actual_labor, task_count FROM user_day_labor {{stored_filter}})
+    SELECT COALESCE(e.team_id, s.team_id), COALESCE(e.user_id, s.user_id), COALESCE(e.labor_date, s.labor_date),
+           s.planned_labor, e.planned_labor, s.actual_labor, e.actual_labor, s.task_count, e.task_count
+    FROM expected e
+    FULL OUTER JOIN stored s ON s.team_id = e.team_id AND s.user_id = e.user_id AND s.labor_date = e.labor_date
+    WHERE e.team_id IS NULL OR s.team_id IS NULL OR s.task_count <> e.task_count
+       OR ABS(s.planned_labor - e.planned_labor) > ? OR ABS(s.actual_labor - e.actual_labor) > ?
+    ORDER BY 1, 3, 2
+""")
+
+DayLabor = Dict[Tuple[int, int, object], list] # (team_id, user_id, date) -> [planned, actual, task_count]
+
+
+def day_labor_contribution(team_id: int, start_date, completion_date, assignees: Iterable[tuple]) -> DayLabor:
+    """A task's rollup rows; assignees are (user_id, role, planned_labor, actual_labor) tuples"""
+    contribution = {}
+    span = (completion_date - start_date).days + 1
+    if span <= 0:
+        return contribution
+    for user_id, role, planned, actual in assignees:
+        if role not in ROLLUP_ROLES:
+            continue
+        daily_planned = (planned or 0.0) / span
+        daily_actual = (actual or 0.0) / span
+        for offset in range(span):
+            row = contribution.setdefault((team_id, user_id, start_date + timedelta(days=offset)), [0.0, 0.0, 0])
+            row[0] += daily_planned
+            row[1] += daily_actual
+            row[2] += 1
+    return contribution
+
+
+def load_task_day_labor(db, task_id: int) -> DayLabor:
+    """The task's current contribution, read inside the caller's transaction"""
+    cursor = db.cursor()
+    task = TASK_SPAN.fetchone(cursor, (task_id,))
+    if not task:
+        return {}
+    assignees = [tuple(row) for row in TASK_LABOR_ASSIGNMENTS.fetchall(cursor, (task_id,))]
+    return day_labor_contribution(task[0], task[1], task[2], assignees)
+
+
+def diff_day_labor(old: DayLabor, new: DayLabor) -> DayLabor:
+    delta = {}
+    for key in old.keys() | new.keys():
+        before = old.get(key, (0.0, 0.0, 0))
+        after = new.get(key, (0.0, 0.0, 0))
+        change = [after[0] - before[0], after[1] - before[1], after[2] - before[2]]
+        if change[2] or abs(change[0]) > ROLLUP_EPSILON or abs(change[1]) > ROLLUP_EPSILON:
+            delta[key] = change
+    return delta
+
+
+def apply_day_labor_delta(db, delta: DayLabor):
+    """Merges the deltas into user_day_labor (the caller commits)"""
+    if not delta:
+        return
+    cursor = db.cursor()
+    rows = [(team_id, user_id, day, *values) for (team_id, user_id, day), values in delta.items()]
+    for chunk in chunked(rows, MAX_IN_CLAUSE_PARAMS // 6):
+        values_sql = ", ".join(["(?, ?, ?, ?, ?, ?)"] * len(chunk))
+        params = [value for row in chunk for value in row]
+        MERGE_DAY_LABOR_DELTAS.execute(cursor, params, values=values_sql)
+
+
+def add_staged_day_labor(db):
+    """Adds the tasks staged by a bulk import (#bulk_tasks/#bulk_assignees/#bulk_ids) in one statement"""
+    ADD_STAGED_DAY_LABOR.execute(db.cursor())
+
+
+def rebuild_user_day_labor(db, team_id: Optional[int] = None) -> int:
+    """Regenerates the rollup (for one team or all) from tasks and task_assignees. Returns the row count."""
+    cursor = db.cursor()
+    team_filter = "AND t.team_id = ?" if team_id is not None else ""
+    params = (team_id,) if team_id is not None else ()
+    # TABLOCKX keeps incremental writers out until the rebuild commits
+    CLEAR_DAY_LABOR.execute(cursor, params, team_filter='WHERE team_id = ?' if team_id is not None else '')
+    return REBUILD_DAY_LABOR.execute(cursor, params, team_filter=team_filter)
+
+
+def find_day_labor_drift(db, team_id: Optional[int] = None) -> list:
+    """Rows where user_day_labor differs from what rebuild_user_day_labor() would write (stored/expected)"""
+    team_params = (team_id,) if team_id is not None else ()
+    rows = FIND_DAY_LABOR_DRIFT.fetchall(
+        db.cursor(), (*team_params, *team_params, DRIFT_TOLERANCE, DRIFT_TOLERANCE),
+        team_filter="AND t.team_id = ?" if team_id is not None else "",
+        stored_filter="WHERE team_id = ?" if team_id is not None else ""
+    )
+    return [
+        {
+            "team_id": row[0], "user_id": row[1], "labor_date": row[2],
+            "stored_planned_labor": row[3], "expected_planned_labor": row[4],
+            "stored_actual_labor": row[5], "expected_actual_labor": row[6],
+            "stored_task_count": row[7], "expected_task_count": row[8],
+        }
+        for row in rows
+    ]
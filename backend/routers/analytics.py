@@ -1,204 +1,243 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
-from database import get_db
-from schemas import UserDetailedTaskDistribution, DailyTaskDistribution, TaskResponse
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Body, Request, Response
+from schemas import UserDetailedTaskDistribution, DailyTaskDistribution, TaskResponse, TaskDistributionPlan, UserDayLabor
+from typing import List, Dict, Optional
 from routers.auth import get_current_user, UserInfo
-from datetime import date, timedelta
+from routers.tasks import get_tasks_with_assignees
+from labor_distribution import distribute_labor
+from scheduling import plan_assignments
+from cache import TTLCache
+from http_cache import serve_cached
+from queries import (
+    USER_TASK_IDS_STARTING_BETWEEN, USER_NAME, TEAM_DAY_LABOR, USER_DAY_LABOR,
+    TASK_DISTRIBUTION_ORDERINGS, TEAM_ASSIGNMENTS_STARTING_BETWEEN, TEAM_USER_NAMES, PLANNABLE_ASSIGNMENTS
+)
+from datetime import date
 import pyodbc
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 router = APIRouter()
 
+# Responses are cached per (endpoint, params, team/user data version) and revalidated with ETags
+ANALYTICS_CACHE_MAX_SIZE = 512
+ANALYTICS_CACHE_TTL_SECONDS = 300
+analytics_cache = TTLCache("analytics_responses", ANALYTICS_CACHE_MAX_SIZE, ANALYTICS_CACHE_TTL_SECONDS)
+
 # Add new request model for optimization parameters
 class OptimizationRequest(BaseModel):
     team_id: int
     optimization_param: str = "priority"
     start_date: date
     end_date: date
+    compact: bool = False # Days reference tasks by id instead of embedding them
+
+# Planning limits: the load matrix is users x days and the planner stops at its time budget
+MAX_PLAN_DAYS = 731
+MAX_PLAN_TIME_BUDGET_MS = 10000
+# In-progress work stays with its assignee; only these tasks may be reassigned
+MOVABLE_TASK_STATUSES = ('Not Started', 'Paused')
+
+class PlanRequest(BaseModel):
+    team_id: int
+    start_date: date
+    end_date: date
+    daily_capacity: float = Field(8.0, ge=0) # Labor each user can take per day
+    capacities: Dict[int, float] = {} # Per-user overrides of daily_capacity
+    local_search: bool = True
+    time_budget_ms: int = Field(2000, ge=1, le=MAX_PLAN_TIME_BUDGET_MS)
 
 # Yardımcı fonksiyon: Günlük işçilik dağılımı hesaplama
-def calculate_daily_labor_distribution(tasks: List[dict], start_date: date, end_date: date):
-    distribution = {}
-    current_date = start_date
-    while current_date <= end_date:
-        distribution[current_date] = {
-            "date": current_date,
-            "planned_labor": 0,
-            "actual_labor": 0,
-            "remaining_labor": 0,
-            "tasks": []
-        }
-        current_date += timedelta(days=1)
-
-    for task in tasks:
-        task_start = max(task["start_date"], start_date)
-        task_end = min(task["completion_date"], end_date)
-        total_days = (task_end - task_start).days + 1
-
-        daily_planned = (task["planned_labor"] - task.get("actual_labor", 0)) / total_days if total_days > 0 else 0
-
-        current_date = task_start
-        while current_date <= task_end:
-            if current_date in distribution:
-                distribution[current_date]["planned_labor"] += daily_planned
-                distribution[current_date]["actual_labor"] += task.get("actual_labor", 0) / total_days if total_days > 0 else 0
-                distribution[current_date]["remaining_labor"] = distribution[current_date]["planned_labor"] - distribution[current_date]["actual_labor"]
-                
-                # Format task according to TaskResponse model
-                formatted_task = {
-                    "id": task["id"],
-                    "description": task["description"],
-                    "priority": task["priority"],
-                    "team_id": task["team_id"],
-                    "start_date": task["start_date"],
-                    "completion_date": task["completion_date"],
-                    "planned_labor": task["planned_labor"],
-                    "actual_labor": task["actual_labor"],
-                    "work_size": task["work_size"],
-                    "roadmap": task["roadmap"],
-                    "status": task["status"],
-                    "creator_id": task["creator_id"],
-                    "assignees": task["assignees"]  # Already formatted in the calling function
-                }
-                distribution[current_date]["tasks"].append(formatted_task)
-            current_date += timedelta(days=1)
-
-    return [DailyTaskDistribution(**day) for day in distribution.values()]
+def calculate_daily_labor_distribution(tasks: list, start_date: date, end_date: date, compact: bool = False):
+    """
+    Per-day planned/actual/remaining labor for the given tasks (see labor_distribution).
+    In compact mode each day lists task_ids referencing the response's single task table;
+    otherwise each day embeds its tasks (the same dicts, not per-day copies).
+    """
+    days = distribute_labor(tasks, start_date, end_date)
+    if compact:
+        for day in days:
+            day["tasks"] = []
+        return days
+
+    tasks_by_id = {task.id: task for task in tasks}
+    for day in days:
+        day["tasks"] = [tasks_by_id[task_id] for task_id in day["task_ids"]]
+        day["task_ids"] = None
+    return days
 
 # Çalışan için detaylı görev dağılımı endpoint'i
 @router.get("/user-detailed-distribution", response_model=UserDetailedTaskDistribution)
 def get_user_detailed_distribution(
+    http_request: Request,
+    response: Response,
     user_id: int,
     start_date: date = Query(...),
     end_date: date = Query(...),
-    db=Depends(get_db),
+    compact: bool = Query(False), # Days reference tasks by id instead of embedding them
     current_user: UserInfo = Depends(get_current_user)
 ):
     if user_id != current_user.id and current_user.role != 'manager':
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
 
-    cursor = db.cursor()
-    cursor.execute("""
-        SELECT t.id, t.description, t.priority, t.team_id, t.start_date, t.completion_date, 
-               t.planned_labor, t.actual_labor, t.work_size, t.roadmap, t.status, t.creator_id,
-               ta.planned_labor as assignee_planned_labor, ta.actual_labor as assignee_actual_labor
-        FROM tasks t
-        JOIN task_assignees ta ON t.id = ta.task_id
-        WHERE ta.user_id = ? AND t.start_date BETWEEN ? AND ?
-    """, (user_id, start_date, end_date))
-
-    tasks = [dict(zip([column[0] for column in cursor.description], row)) for row in cursor.fetchall()]
-
-    # Process tasks to match TaskResponse format
-    processed_tasks = []
-    for task in tasks:
-        processed_task = {
-            "id": task["id"],
-            "description": task["description"],
-            "priority": task["priority"],
-            "team_id": task["team_id"],
-            "start_date": task["start_date"],
-            "completion_date": task["completion_date"],
-            "planned_labor": task["planned_labor"],
-            "actual_labor": task["actual_labor"],
-            "work_size": task["work_size"],
-            "roadmap": task["roadmap"],
-            "status": task["status"],
-            "creator_id": task["creator_id"],
-            "assignees": [{
-                "id": task["id"],  # Using task id as assignee id since we don't have it
-                "task_id": task["id"],
-                "user_id": user_id,
-                "role": "assignee",  # Default role since we don't have it in the query
-                "planned_labor": task["assignee_planned_labor"],
-                "actual_labor": task["assignee_actual_labor"]
-            }]
-        }
-        processed_tasks.append(processed_task)
+    def load(db):
+        cursor = db.cursor()
+        task_ids = [row[0] for row in USER_TASK_IDS_STARTING_BETWEEN.fetchall(cursor, (user_id, start_date, end_date))]
 
-    daily_distribution = calculate_daily_labor_distribution(processed_tasks, start_date, end_date)
+        # Load the tasks with their real assignees in bulk (already in TaskResponse format)
+        processed_tasks = get_tasks_with_assignees(task_ids, db)
 
-    cursor.execute("SELECT name FROM users WHERE id = ?", (user_id,))
-    user_name = cursor.fetchone()[0]
+        daily_distribution = calculate_daily_labor_distribution(processed_tasks, start_date, end_date, compact)
 
-    return UserDetailedTaskDistribution(
-        user_id=user_id,
-        user_name=user_name,
-        daily_distribution=daily_distribution
-    )
+        user_name = USER_NAME.scalar(cursor, (user_id,))
+
+        return {
+            "user_id": user_id,
+            "user_name": user_name,
+            "daily_distribution": daily_distribution,
+            "tasks": processed_tasks if compact else None,
+        }
+
+    params = {"user_id": user_id, "start_date": start_date, "end_date": end_date, "compact": compact}
+    return serve_cached(analytics_cache, http_request, response, "user-detailed-distribution", params, [("user", user_id)], load)
+
+# Günlük işçilik özeti: user_day_labor rollup üzerinde indeksli aralık taraması
+@router.get("/daily-labor", response_model=List[UserDayLabor])
+def get_daily_labor(
+    http_request: Request,
+    response: Response,
+    start_date: date = Query(...),
+    end_date: date = Query(...),
+    team_id: Optional[int] = None, # Every member of the team (managers of that team)
+    user_id: Optional[int] = None, # One user across all teams (defaults to the current user)
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """
+    Per-user, per-day planned/actual labor and task counts from the user_day_labor rollup.
+    Each assignee's own labor is spread over the task's full date span; days without
+    work are omitted.
+    """
+    if team_id is not None and user_id is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Pass either team_id or user_id, not both.")
+    if team_id is not None:
+        if current_user.role != 'manager' or current_user.team_id != team_id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
+        day_labor, scope_value, scope = TEAM_DAY_LABOR, team_id, ("team", team_id)
+    else:
+        user_id = current_user.id if user_id is None else user_id
+        if user_id != current_user.id and current_user.role != 'manager':
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
+        day_labor, scope_value, scope = USER_DAY_LABOR, user_id, ("user", user_id)
+
+    def load(db):
+        rows = day_labor.fetchall(db.cursor(), (scope_value, start_date, end_date))
+        return [
+            {
+                "user_id": row[0],
+                "date": row[1],
+                "planned_labor": row[2],
+                "actual_labor": row[3],
+                "remaining_labor": row[2] - row[3],
+                "task_count": row[4],
+            }
+            for row in rows
+        ]
+
+    params = {"team_id": team_id, "user_id": user_id, "start_date": start_date, "end_date": end_date}
+    return serve_cached(analytics_cache, http_request, response, "daily-labor", params, [scope], load)
 
 # Yönetici için optimize edilmiş görev dağılımı endpoint'i
 @router.post("/optimize-task-distribution", response_model=List[UserDetailedTaskDistribution])
 def optimize_task_distribution(
+    http_request: Request,
+    response: Response,
     request: OptimizationRequest,
-    db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
     if current_user.role != 'manager' or current_user.team_id != request.team_id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
 
-    cursor = db.cursor()
-
-    ordering = {
-        "priority": "CASE t.priority WHEN 'High' THEN 1 WHEN 'Medium' THEN 2 ELSE 3 END",
-        "work_size": "t.work_size DESC",
-        "completion_date": "t.completion_date"
-    }
-
-    cursor.execute(f"""
-        SELECT u.id as user_id, u.name as user_name, 
-               t.id, t.description, t.priority, t.team_id, t.start_date, t.completion_date,
-               t.planned_labor, t.actual_labor, t.work_size, t.roadmap, t.status, t.creator_id,
-               ta.planned_labor as assignee_planned_labor, ta.actual_labor as assignee_actual_labor
-        FROM tasks t
-        JOIN task_assignees ta ON t.id = ta.task_id
-        JOIN users u ON ta.user_id = u.id
-        WHERE t.team_id = ? AND t.start_date BETWEEN ? AND ?
-        ORDER BY {ordering[request.optimization_param]}, t.start_date
-    """, (request.team_id, request.start_date, request.end_date))
-
-    rows = cursor.fetchall()
-    columns = [column[0] for column in cursor.description]
-
-    user_tasks = {}
-    for row in rows:
-        data = dict(zip(columns, row))
-        user_id = data["user_id"]
-        user_name = data["user_name"]
-        user_tasks.setdefault(user_id, {"user_name": user_name, "tasks": []})
-        
-        # Process task to match TaskResponse format
-        processed_task = {
-            "id": data["id"],
-            "description": data["description"],
-            "priority": data["priority"],
-            "team_id": data["team_id"],
-            "start_date": data["start_date"],
-            "completion_date": data["completion_date"],
-            "planned_labor": data["planned_labor"],
-            "actual_labor": data["actual_labor"],
-            "work_size": data["work_size"],
-            "roadmap": data["roadmap"],
-            "status": data["status"],
-            "creator_id": data["creator_id"],
-            "assignees": [{
-                "id": data["id"],  # Using task id as assignee id since we don't have it
-                "task_id": data["id"],
+    def load(db):
+        rows = TEAM_ASSIGNMENTS_STARTING_BETWEEN.fetchall(
+            db.cursor(), (request.team_id, request.start_date, request.end_date),
+            ordering=TASK_DISTRIBUTION_ORDERINGS[request.optimization_param]
+        )
+
+        # Load every referenced task once, with its real assignees, instead of per row
+        tasks_by_id = {task.id: task for task in get_tasks_with_assignees([row.task_id for row in rows], db)}
+
+        user_tasks = {}
+        for row in rows:
+            user_tasks.setdefault(row.user_id, {"user_name": row.user_name, "tasks": []})
+            task = tasks_by_id.get(row.task_id)
+            if task is not None:
+                user_tasks[row.user_id]["tasks"].append(task)
+
+        result = []
+        for user_id, info in user_tasks.items():
+            daily_distribution = calculate_daily_labor_distribution(info["tasks"], request.start_date, request.end_date, request.compact)
+            result.append({
                 "user_id": user_id,
-                "role": "assignee",  # Default role since we don't have it in the query
-                "planned_labor": data["assignee_planned_labor"],
-                "actual_labor": data["assignee_actual_labor"]
-            }]
-        }
-        user_tasks[user_id]["tasks"].append(processed_task)
-
-    response = []
-    for user_id, info in user_tasks.items():
-        daily_distribution = calculate_daily_labor_distribution(info["tasks"], request.start_date, request.end_date)
-        response.append(UserDetailedTaskDistribution(
-            user_id=user_id,
-            user_name=info["user_name"],
-            daily_distribution=daily_distribution
-        ))
-
-    return response
+                "user_name": info["user_name"],
+                "daily_distribution": daily_distribution,
+                "tasks": info["tasks"] if request.compact else None,
+            })
+
+        return result
+
+    return serve_cached(
+        analytics_cache, http_request, response, "optimize-task-distribution", request.dict(), [("team", request.team_id)], load
+    )
+
+# Yönetici için yük dengeleme planı: önerilen yeniden atamalar ve günlük yük
+@router.post("/optimize-task-distribution/plan", response_model=TaskDistributionPlan)
+def plan_task_distribution(
+    http_request: Request,
+    response: Response,
+    request: PlanRequest,
+    current_user: UserInfo = Depends(get_current_user)
+):
+    if current_user.role != 'manager' or current_user.team_id != request.team_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
+    days = (request.end_date - request.start_date).days + 1
+    if days < 1 or days > MAX_PLAN_DAYS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Date range must cover 1 to {MAX_PLAN_DAYS} days.")
+    if any(capacity < 0 for capacity in request.capacities.values()):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Capacities cannot be negative.")
+
+    def load(db):
+        cursor = db.cursor()
+        users = [
+            {"id": row.id, "name": row.name, "capacity": request.capacities.get(row.id, request.daily_capacity)}
+            for row in TEAM_USER_NAMES.fetchall(cursor, (request.team_id,))
+        ]
+
+        # Labor-carrying assignments of the team's open tasks overlapping the range
+        rows = PLANNABLE_ASSIGNMENTS.fetchall(cursor, (request.team_id, request.team_id, request.end_date, request.start_date))
+
+        assignee_counts = {}
+        for row in rows:
+            assignee_counts[row.task_id] = assignee_counts.get(row.task_id, 0) + 1
+        items = []
+        for row in rows:
+            # Assignees without their own planned labor share the task's equally
+            planned = row.planned_labor if row.planned_labor is not None else (row.task_planned or 0.0) / assignee_counts[row.task_id]
+            items.append({
+                "task_id": row.task_id,
+                "user_id": row.user_id,
+                "start_date": row.start_date,
+                "completion_date": row.completion_date,
+                "labor": max(planned - (row.actual_labor or 0.0), 0.0),
+                "movable": row.status in MOVABLE_TASK_STATUSES,
+            })
+
+        plan = plan_assignments(
+            users, items, request.start_date, request.end_date,
+            local_search=request.local_search, time_budget=request.time_budget_ms / 1000
+        )
+        names = {user["id"]: user["name"] for user in users}
+        for allocation in plan["allocations"]:
+            allocation["user_name"] = names[allocation["user_id"]]
+        return {"team_id": request.team_id, "start_date": request.start_date, "end_date": request.end_date, **plan}
+
+    return serve_cached(
+        analytics_cache, http_request, response, "optimize-task-distribution/plan", request.dict(), [("team", request.team_id)], load
+    )
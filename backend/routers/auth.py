@@ -1,115 +1,133 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from database import get_db
+from database import run_db, db_connection, request_connection, PoolTimeout
+from cache import TTLCache, bump_data_versions
 from jose import JWTError, jwt
-from schemas import UserCreate, UserResponse, TokenResponse, TokenData, UserInfo # Updated schemas
-import bcrypt
-from datetime import datetime, timedelta, timezone
+import pyodbc
+from schemas import UserCreate, UserResponse, TokenResponse, TokenData, UserInfo, RefreshTokenRequest, LogoutRequest # Updated schemas
+from passwords import verify_password_async, hash_password_async, needs_rehash
+from tokens import (
+    SECRET_KEY, ALGORITHM, revocations, token_response, user_from_claims,
+    issue_refresh_token, consume_refresh_token, revoke_refresh_token
+)
+from queries import (
+    USER_ID_BY_USERNAME, USER_ID_BY_EMAIL, TEAM_EXISTS, INSERT_USER, USER_LOGIN_ROW, REPLACE_PASSWORD_HASH, USER_INFO_BY_ID
+)
+from typing import Optional
 import os # For environment variables
 
 router = APIRouter()
 
-# It's CRITICAL to use a strong, randomly generated secret key
-# and load it from environment variables, not hardcode it.
-SECRET_KEY = os.environ.get("SECRET_KEY", "42f8b087f248c080cd415cb90e8b84f64ff8cee683e4b9b419eb590f053ffe5d549c360ec721a8bfd95761511c46b35047b5d6f36b161e7134143a7cc9d6f2863502fb460bc9fbaf36fe27430ace346e8fb9f3902968071124972c4ed5907d77031d4c724c878f18ef5a24b58125a43e57a05aefdae48a075d08a8a79c393f644ab2a5e09436a51e451486690c89896436def00de4156f161ff30fe824de98e6c487206af3fb2bcd8c408fc3bab1d3a40b3946db09889113d906ce4b09ed9316facb49e23ddcede3f1d58f565ef3d1667207fa20d341f8df73eca1606cb3ed2d3a1fc0889e865b61f9a83bb93e252562cd9e23c9b3ef9e472668b63daeb7f994") # CHANGE THIS
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Or read from config
+# Tokens issued before refresh tokens carry no user claims; their users are looked up and
+# cached. Writes to a user (profile, password, team) must call invalidate_cached_user().
+USER_CACHE_TTL_SECONDS = float(os.environ.get("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.environ.get("USER_CACHE_MAX_SIZE", "10000"))
+user_cache = TTLCache("auth_users", maxsize=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_cached_user(user_id: int | None = None):
+    """Drops one user (or, without an ID, every user) from the authentication cache"""
+    if user_id is None:
+        user_cache.clear()
+    else:
+        user_cache.invalidate(user_id)
 
 # Use tokenUrl="/api/auth/token" which matches the login endpoint path
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/token", auto_error=False)
 
-def hash_password(password: str) -> str:
-    # Ensure password is bytes
-    password_bytes = password.encode('utf-8')
-    salt = bcrypt.gensalt()
-    hashed_bytes = bcrypt.hashpw(password_bytes, salt)
-    # Decode back to string for storing in DB
-    return hashed_bytes.decode('utf-8')
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    plain_password_bytes = plain_password.encode('utf-8')
-    hashed_password_bytes = hashed_password.encode('utf-8')
-    return bcrypt.checkpw(plain_password_bytes, hashed_password_bytes)
-
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now(timezone.utc) + expires_delta
-    else:
-        expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+# Runs on the DB executor; the checks and the insert each hold a connection only briefly, so
+# hashing the password in between doesn't pin one
+def check_registration(user: UserCreate):
+    with request_connection() as db:
+        cursor = db.cursor()
+        # Check if username exists
+        if USER_ID_BY_USERNAME.fetchone(cursor, (user.username,)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username already registered"
+            )
+        # Check if email exists
+        if USER_ID_BY_EMAIL.fetchone(cursor, (user.email,)):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Email already registered"
+            )
+        # Check if team exists (optional, depends on requirements)
+        if not TEAM_EXISTS.fetchone(cursor, (user.team_id,)):
+             raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Team with id {user.team_id} does not exist"
+            )
 
-@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-def register(user: UserCreate, db=Depends(get_db)):
-    cursor = db.cursor()
-    # Check if username exists
-    cursor.execute("SELECT id FROM users WHERE username=?", (user.username,))
-    if cursor.fetchone():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already registered"
-        )
-    # Check if email exists
-    cursor.execute("SELECT id FROM users WHERE email=?", (user.email,))
-    if cursor.fetchone():
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Email already registered"
-        )
-    # Check if team exists (optional, depends on requirements)
-    cursor.execute("SELECT id FROM teams WHERE id=?", (user.team_id,))
-    if not cursor.fetchone():
-         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Team with id {user.team_id} does not exist"
-        )
+def insert_user(user: UserCreate, hashed_pw: str):
+    with request_connection() as db:
+        try:
+            created_user_row = INSERT_USER.fetchone(
+                db.cursor(), (user.name, user.username, hashed_pw, user.email, user.role, user.team_id)
+            )
+            db.commit()
+            return created_user_row
+        except Exception:
+            db.rollback() # Rollback on error
+            raise
 
-    hashed_pw = hash_password(user.password)
+@router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
+async def register(user: UserCreate):
+    await run_db(check_registration, user)
+    hashed_pw = await hash_password_async(user.password)
     try:
-        cursor.execute("""
-            INSERT INTO users (name, username, password_hash, email, role, team_id)
-            OUTPUT INSERTED.id, INSERTED.name, INSERTED.username, INSERTED.email, INSERTED.role, INSERTED.team_id
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user.name, user.username, hashed_pw, user.email, user.role, user.team_id))
-        created_user_row = cursor.fetchone()
-        db.commit()
-
-        if not created_user_row:
-             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user")
-
-        # Map the output row to the response model
-        user_data = {
-            "id": created_user_row[0],
-            "name": created_user_row[1],
-            "username": created_user_row[2],
-            "email": created_user_row[3],
-            "role": created_user_row[4],
-            "team_id": created_user_row[5]
-        }
-        return UserResponse(**user_data)
-
+        created_user_row = await run_db(insert_user, user, hashed_pw)
+    except HTTPException:
+        raise
     except pyodbc.Error as e:
-        db.rollback() # Rollback on error
         print(f"Database error during registration: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not register user")
     except Exception as e:
-        db.rollback()
         print(f"Unexpected error during registration: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
 
+    bump_data_versions([user.team_id], []) # The team's member list changed
+    if not created_user_row:
+         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create user")
+
+    # Map the output row to the response model
+    user_data = {
+        "id": created_user_row[0],
+        "name": created_user_row[1],
+        "username": created_user_row[2],
+        "email": created_user_row[3],
+        "role": created_user_row[4],
+        "team_id": created_user_row[5]
+    }
+    return UserResponse(**user_data)
+
+
+# Runs on the DB executor; the connection goes back to the pool before the (slow) password check
+def fetch_login_row(username: str):
+    with request_connection() as db:
+        return USER_LOGIN_ROW.fetchone(db.cursor(), (username,))
+
+def store_rehashed_password(user_id: int, old_hash: str, new_hash: str):
+    # Only replaces the hash the login was checked against, so a concurrent password change wins
+    with db_connection() as db:
+        REPLACE_PASSWORD_HASH.execute(db.cursor(), (new_hash, user_id, old_hash))
+        db.commit()
+
+async def rehash_password(user_id: int, password: str, old_hash: str):
+    """Background task after a login: moves the stored hash to the configured work factor"""
+    try:
+        new_hash = await hash_password_async(password)
+        await run_db(store_rehashed_password, user_id, old_hash, new_hash)
+    except Exception as e:
+        print(f"Could not rehash password for user {user_id}: {e}")
 
 # Use OAuth2PasswordRequestForm for standard token endpoint
 @router.post("/token", response_model=TokenResponse) # Changed path to /token
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db=Depends(get_db)):
-    cursor = db.cursor()
-    # Fetch user including id, role, team_id
-    cursor.execute(
-        "SELECT id, username, password_hash, role, team_id FROM users WHERE username=?",
-        (form_data.username,)
-    )
-    user = cursor.fetchone()
+async def login_for_access_token(background_tasks: BackgroundTasks, form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await run_db(fetch_login_row, form_data.username)
+    # bcrypt runs on the password hash pool, off the event loop and without a DB connection
+    if user and not await verify_password_async(form_data.password, user[2]):
+        user = None
 
     if not user:
         raise HTTPException(
@@ -118,31 +136,76 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user_id, username, password_hash, role, team_id = user
+    user_id, username, password_hash, role, team_id, name, email = user
+    if needs_rehash(password_hash):
+        background_tasks.add_task(rehash_password, user_id, form_data.password, password_hash)
+
+    user_info = UserInfo(id=user_id, username=username, name=name, email=email, role=role, team_id=team_id)
+    refresh_token = await run_db(start_login_family, user_id)
+    return token_response(user_info, refresh_token)
+
+def start_login_family(user_id: int) -> str:
+    with request_connection() as db:
+        refresh_token = issue_refresh_token(db, user_id)
+        db.commit()
+    return refresh_token
+
+# Runs on the DB executor: consumes the refresh token and issues its successor in one transaction
+def rotate_refresh_token(refresh_token: str):
+    with request_connection() as db:
+        consumed = consume_refresh_token(db, refresh_token)
+        if consumed is None:
+            db.rollback()
+            return None
+        user_id, family_id = consumed
+        user_db = fetch_user_info_row(db, user_id)
+        if user_db is None:
+            db.rollback()
+            return None
+        new_refresh_token = issue_refresh_token(db, user_id, family_id)
+        db.commit()
+    return user_info_from_row(user_db), new_refresh_token
 
-    if not verify_password(form_data.password, password_hash):
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh_access_token(request: RefreshTokenRequest):
+    """Exchanges a refresh token for a new access token and refresh token (the old one is used up)"""
+    try:
+        rotated = await run_db(rotate_refresh_token, request.refresh_token)
+    except pyodbc.Error as e:
+        print(f"Database error refreshing token: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not refresh token")
+    if rotated is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password",
+            detail="Invalid or expired refresh token",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    user_info, new_refresh_token = rotated
+    return token_response(user_info, new_refresh_token)
 
-    # Data to include in the JWT payload
-    token_data = {
-        "sub": username, # Use 'sub' (subject) for username as standard
-        "user_id": user_id,
-        "role": role,
-        "team_id": team_id
-    }
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data=token_data, expires_delta=access_token_expires
-    )
+def fetch_user_info_row(db, user_id: int):
+    return USER_INFO_BY_ID.fetchone(db.cursor(), (user_id,))
 
-    return {"access_token": access_token, "token_type": "bearer"}
+# Runs on the DB executor with its own pooled connection, only on cache misses
+def load_user_info(user_id: int) -> UserInfo | None:
+    with db_connection() as db:
+        user_db = fetch_user_info_row(db, user_id)
+    if user_db is None:
+        return None
+    return user_info_from_row(user_db)
+
+def user_info_from_row(user_db) -> UserInfo:
+    return UserInfo(
+        id=user_db[0],
+        username=user_db[1],
+        name=user_db[2],
+        email=user_db[3],
+        role=user_db[4],
+        team_id=user_db[5]
+    )
 
 # Dependency to get the current user from the token
-async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)) -> UserInfo:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInfo:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -159,24 +222,27 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_d
         if username is None or user_id is None or role is None: # team_id might be optional depending on logic
             raise credentials_exception
 
-        # Optional: Verify user still exists in DB
-        cursor = db.cursor()
-        cursor.execute("SELECT id, username, name, email, role, team_id FROM users WHERE id=?", (user_id,))
-        user_db = cursor.fetchone()
-        if user_db is None:
-            raise credentials_exception
+        # Current tokens carry the user: no database round trip, only the in-memory revocation check
+        if "jti" in payload:
+            if revocations.is_revoked(payload["jti"], user_id, payload["iat"]):
+                raise credentials_exception
+            return user_from_claims(payload)
 
-        # Return user info extracted from token (or DB)
-        # Using token data is faster, but DB check confirms user validity
-        return UserInfo(
-            id=user_db[0],
-            username=user_db[1],
-            name=user_db[2],
-            email=user_db[3],
-            role=user_db[4],
-            team_id=user_db[5]
-        )
+        # Verify user still exists, from the cache when possible (DB access stays off the event loop)
+        user_info = user_cache.get(user_id)
+        if user_info is None:
+            user_info = await run_db(load_user_info, user_id)
+            if user_info is None:
+                raise credentials_exception
+            user_cache.set(user_id, user_info)
 
+        return user_info
+
+    except HTTPException:
+        raise
+    except PoolTimeout as e:
+        print(f"Database pool exhausted in get_current_user: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is busy, please retry")
     except JWTError as e:
         print(f"JWT Error: {e}") # Log the error
         raise credentials_exception
@@ -190,8 +256,34 @@ async def read_users_me(current_user: UserInfo = Depends(get_current_user)):
     # The dependency already fetches and validates the user
     return current_user
 
-# Logout doesn't do much server-side with JWT, client discards token
+# Logout revokes the access token and the refresh token's login family on the server
 @router.post("/logout")
-async def logout():
-     # Optionally: Add token to a blacklist if using a more complex setup
+async def logout(
+    request: Optional[LogoutRequest] = None,
+    token: Optional[str] = Depends(optional_oauth2_scheme)
+):
+    access_claims = None
+    if token:
+        try:
+            access_claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            pass # Expired or invalid: nothing left to revoke
+    refresh_token = request.refresh_token if request else None
+
+    def revoke():
+        with request_connection() as db:
+            revoked = None
+            if access_claims is not None and "jti" in access_claims:
+                revoked = revocations.revoke_token(db, access_claims["jti"], access_claims["exp"])
+            if refresh_token:
+                revoke_refresh_token(db, refresh_token)
+            db.commit()
+        if revoked is not None:
+            revocations.apply(revoked)
+
+    try:
+        await run_db(revoke)
+    except pyodbc.Error as e:
+        print(f"Database error during logout: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not log out")
     return {"message": "Successfully logged out"}
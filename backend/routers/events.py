@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from routers.auth import get_current_user, UserInfo
+from events import event_frames, user_topics
+
+router = APIRouter()
+
+@router.get("/")
+async def stream_events(current_user: UserInfo = Depends(get_current_user)):
+    """
+    Server-sent events for the current user: "task" (created/updated/deleted/imported in the
+    user's team or assigned to them), "notification" (a new notification, as returned by
+    GET /notifications) and "resync" (events were missed; refetch). Replaces polling.
+    """
+    return StreamingResponse(
+        event_frames(user_topics(current_user)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # No proxy buffering of the stream
+    )
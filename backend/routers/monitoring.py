@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from database import pool
+from cache import caches
+from history import history_sink, TASK_HISTORY_MODE
+from events import broker
+from tokens import revocations
+from queries import query_stats
+from routers.auth import get_current_user, UserInfo
+
+router = APIRouter()
+
+# Helper: operational stats are only for managers
+def require_manager(current_user: UserInfo = Depends(get_current_user)) -> UserInfo:
+    if current_user.role != 'manager':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only managers can view monitoring data.")
+    return current_user
+
+@router.get("/db-pool")
+def get_db_pool_stats(current_user: UserInfo = Depends(require_manager)):
+    """Connection pool usage: in use, idle, waits and wait time (for sizing the pool under load)"""
+    return pool.stats()
+
+@router.get("/caches")
+def get_cache_stats(current_user: UserInfo = Depends(require_manager)):
+    """Hit/miss counters and sizes of the in-process caches"""
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@router.get("/task-history")
+def get_task_history_stats(current_user: UserInfo = Depends(require_manager)):
+    """Write-behind task history writer: buffered/unwritten events, flush failures"""
+    if history_sink is None:
+        return {"mode": TASK_HISTORY_MODE}
+    return history_sink.stats()
+
+@router.get("/events")
+def get_event_stats(current_user: UserInfo = Depends(require_manager)):
+    """Open event streams, topics, and events published/delivered"""
+    return broker.stats()
+
+@router.get("/token-revocations")
+def get_token_revocation_stats(current_user: UserInfo = Depends(require_manager)):
+    """Revoked access tokens and users held in memory, and the last sync error"""
+    return revocations.stats()
+
+@router.get("/queries")
+def get_query_stats(
+    reset: bool = False, # Start new counters after reading these
+    current_user: UserInfo = Depends(require_manager)
+):
+    """Calls, errors, rows and latency (total/mean/max) per named SQL statement, most total time first"""
+    return query_stats(reset)
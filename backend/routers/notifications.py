@@ -1,12 +1,42 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
-from database import get_db
-from typing import List, Optional
+from database import get_db, request_connection, chunked
+from typing import List, Optional, Union
 from routers.auth import get_current_user, UserInfo
+from schemas import Notification, NotificationPage, UnreadNotificationCount, NotificationBulkCreate, CreatedNotification
+from cache import TTLCache
+from queries import (
+    INSERT_NOTIFICATION, INSERT_NOTIFICATIONS_FOR_RECIPIENTS, RECIPIENT_NOTIFICATIONS, RECIPIENT_NOTIFICATION_PAGE,
+    NOTIFICATION_PAGE_SEEK, UNREAD_NOTIFICATION_COUNT, MARK_NOTIFICATION_READ, MARK_NOTIFICATIONS_READ_BATCH
+)
+from events import publish_notifications
 import pyodbc
+import base64
+import json
+import os
 from datetime import datetime
 
 router = APIRouter()
 
+MAX_NOTIFICATION_PAGE_SIZE = 200
+NOTIFICATION_READ_BATCH_SIZE = int(os.environ.get("NOTIFICATION_READ_BATCH_SIZE", "1000"))
+BULK_INSERT_CHUNK_SIZE = 1000 # Row limit of a T-SQL VALUES table constructor
+
+# Unread counts per recipient; dropped whenever one of the recipient's notifications is created or read
+UNREAD_COUNT_CACHE_MAX_SIZE = 10000
+UNREAD_COUNT_CACHE_TTL_SECONDS = 30
+unread_count_cache = TTLCache("notification_unread_counts", UNREAD_COUNT_CACHE_MAX_SIZE, UNREAD_COUNT_CACHE_TTL_SECONDS)
+
+def encode_notification_cursor(sent_at: datetime, notification_id: int) -> str:
+    payload = json.dumps([sent_at.isoformat(), notification_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_notification_cursor(cursor: str):
+    try:
+        sent_at, notification_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(sent_at), int(notification_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {e}")
+
 @router.post("/", status_code=status.HTTP_201_CREATED)
 def create_notification(
     notification_data: dict,
@@ -14,21 +44,26 @@ def create_notification(
     current_user: UserInfo = Depends(get_current_user)
 ):
     """Create a new notification"""
+    sent_at = datetime.now()
     cursor = db.cursor()
     try:
-        cursor.execute("""
-            INSERT INTO notifications (recipient_email, subject, body, sent_at, is_read)
-            OUTPUT INSERTED.id
-            VALUES (?, ?, ?, ?, ?)
-        """, (
+        notification_id = INSERT_NOTIFICATION.scalar(cursor, (
             notification_data["recipient_email"],
             notification_data["subject"],
             notification_data["body"],
-            datetime.now(),
+            sent_at,
             False
         ))
-        notification_id = cursor.fetchone()[0]
         db.commit()
+        unread_count_cache.invalidate(notification_data["recipient_email"])
+        publish_notifications([{
+            "id": notification_id,
+            "recipient_email": notification_data["recipient_email"],
+            "subject": notification_data["subject"],
+            "body": notification_data["body"],
+            "sent_at": sent_at,
+            "is_read": False,
+        }])
         return {"id": notification_id}
     except pyodbc.Error as e:
         db.rollback()
@@ -39,37 +74,87 @@ def create_notification(
         print(f"Unexpected error creating notification: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
 
-@router.get("/", response_model=List[dict])
+@router.post("/bulk", status_code=status.HTTP_201_CREATED, response_model=List[CreatedNotification])
+def create_notifications_bulk(
+    notification_data: NotificationBulkCreate,
+    db=Depends(get_db),
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """
+    Create the same notification for many recipients in one transaction. Each statement
+    inserts up to BULK_INSERT_CHUNK_SIZE recipients from a VALUES list; duplicate recipients
+    get one notification.
+    """
+    recipients = list(dict.fromkeys(notification_data.recipients))
+    sent_at = datetime.now()
+    cursor = db.cursor()
+    created = []
+    try:
+        for chunk in chunked(recipients, BULK_INSERT_CHUNK_SIZE):
+            rows = INSERT_NOTIFICATIONS_FOR_RECIPIENTS.fetchall(
+                cursor, (notification_data.subject, notification_data.body, sent_at, *chunk),
+                recipients=', '.join(['(?)'] * len(chunk))
+            )
+            created.extend({"id": row[0], "recipient_email": row[1]} for row in rows)
+        db.commit()
+    except pyodbc.Error as e:
+        db.rollback()
+        print(f"Database error creating {len(recipients)} notifications: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create notifications")
+    except Exception as e:
+        db.rollback()
+        print(f"Unexpected error creating notifications: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
+
+    for recipient in recipients:
+        unread_count_cache.invalidate(recipient)
+    created.sort(key=lambda notification: notification["id"])
+    publish_notifications([
+        {**notification, "subject": notification_data.subject, "body": notification_data.body, "sent_at": sent_at, "is_read": False}
+        for notification in created
+    ])
+    return created
+
+@router.get("/", response_model=Union[List[Notification], NotificationPage])
 def get_notifications(
     recipient_email: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_NOTIFICATION_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
     db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
-    """Get notifications for a user"""
+    """
+    Get notifications for a user, newest first. With limit (or cursor) one keyset page is
+    returned as {items, next_cursor}; without either, the full list as before.
+    """
     # Permission check: User can only view their own notifications
     if recipient_email != current_user.email:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot view notifications for other users")
-    
-    cursor = db.cursor()
+
+    paginate = limit is not None or cursor is not None
+    page_size = limit or MAX_NOTIFICATION_PAGE_SIZE
+    seek = ""
+    params = [page_size + 1, recipient_email] # One extra row tells whether another page follows
+    if cursor is not None:
+        sent_at, notification_id = decode_notification_cursor(cursor)
+        seek = NOTIFICATION_PAGE_SEEK
+        params.extend([sent_at, sent_at, notification_id])
+
+    db_cursor = db.cursor()
     try:
-        cursor.execute("""
-            SELECT id, recipient_email, subject, body, sent_at, is_read
-            FROM notifications
-            WHERE recipient_email = ?
-            ORDER BY sent_at DESC
-        """, (recipient_email,))
-        
-        notifications = []
-        for row in cursor.fetchall():
-            notifications.append({
-                "id": row[0],
-                "recipient_email": row[1],
-                "subject": row[2],
-                "body": row[3],
-                "sent_at": row[4],
-                "is_read": row[5]
-            })
-        return notifications
+        if paginate:
+            notifications = RECIPIENT_NOTIFICATION_PAGE.all(db_cursor, params, seek=seek)
+        else:
+            notifications = RECIPIENT_NOTIFICATIONS.all(db_cursor, (recipient_email,))
+        if not paginate:
+            return notifications
+
+        next_cursor = None
+        if len(notifications) > page_size:
+            notifications = notifications[:page_size]
+            last = notifications[-1]
+            next_cursor = encode_notification_cursor(last.sent_at, last.id)
+        return {"items": notifications, "next_cursor": next_cursor}
     except pyodbc.Error as e:
         print(f"Database error fetching notifications: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch notifications")
@@ -77,6 +162,27 @@ def get_notifications(
         print(f"Unexpected error fetching notifications: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
 
+@router.get("/unread-count", response_model=UnreadNotificationCount)
+def get_unread_notification_count(
+    recipient_email: str = Query(...),
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """Number of unread notifications; meant for polling (cached, counted from the filtered unread index)"""
+    if recipient_email != current_user.email:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot view notifications for other users")
+
+    unread = unread_count_cache.get(recipient_email)
+    if unread is None:
+        # Only a miss checks out a connection, so cached polls never wait on the pool
+        try:
+            with request_connection() as db:
+                unread = UNREAD_NOTIFICATION_COUNT.scalar(db.cursor(), (recipient_email,))
+        except pyodbc.Error as e:
+            print(f"Database error counting unread notifications: {e}")
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to count notifications")
+        unread_count_cache.set(recipient_email, unread)
+    return {"recipient_email": recipient_email, "unread": unread}
+
 @router.put("/{notification_id}/read")
 def mark_notification_as_read(
     notification_id: int,
@@ -91,17 +197,15 @@ def mark_notification_as_read(
     
     cursor = db.cursor()
     try:
-        cursor.execute("""
-            UPDATE notifications
-            SET is_read = 1
-            WHERE id = ? AND recipient_email = ?
-        """, (notification_id, data["recipient_email"]))
-        
-        if cursor.rowcount == 0:
+        if MARK_NOTIFICATION_READ.execute(cursor, (notification_id, data["recipient_email"])) == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Notification not found")
         
         db.commit()
+        unread_count_cache.invalidate(data["recipient_email"])
         return {"message": "Notification marked as read"}
+    except HTTPException:
+        db.rollback()
+        raise
     except pyodbc.Error as e:
         db.rollback()
         print(f"Database error marking notification as read: {e}")
@@ -117,21 +221,24 @@ def mark_all_notifications_as_read(
     db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
-    """Mark all notifications as read for a user"""
+    """
+    Mark all notifications as read for a user. Rows are updated and committed in batches of
+    NOTIFICATION_READ_BATCH_SIZE, so a large backlog never holds one long transaction.
+    """
     # Permission check: User can only mark their own notifications as read
     if data["recipient_email"] != current_user.email:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot modify notifications for other users")
     
     cursor = db.cursor()
+    marked = 0
     try:
-        cursor.execute("""
-            UPDATE notifications
-            SET is_read = 1
-            WHERE recipient_email = ? AND is_read = 0
-        """, (data["recipient_email"],))
-        
-        db.commit()
-        return {"message": f"{cursor.rowcount} notifications marked as read"}
+        while True:
+            updated = MARK_NOTIFICATIONS_READ_BATCH.execute(cursor, (NOTIFICATION_READ_BATCH_SIZE, data["recipient_email"]))
+            db.commit()
+            marked += updated
+            if updated < NOTIFICATION_READ_BATCH_SIZE:
+                break
+        return {"message": f"{marked} notifications marked as read"}
     except pyodbc.Error as e:
         db.rollback()
         print(f"Database error marking all notifications as read: {e}")
@@ -140,4 +247,7 @@ def mark_all_notifications_as_read(
         db.rollback()
         print(f"Unexpected error marking all notifications as read: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
+    finally:
+        # Batches committed before a failure are read too
+        unread_count_cache.invalidate(data["recipient_email"])
 
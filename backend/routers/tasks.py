@@ -1,116 +1,277 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body,BackgroundTasks 
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Body,BackgroundTasks, Query, Request
+from database import get_db, run_db, chunked, request_connection
 from schemas import ( # Updated schemas
     Task, TaskResponse, TaskCreateData, TaskUpdateData,
-    TaskAssignee, TaskAssigneeCreate, TaskHistoryCreate
+    TaskAssignee, TaskAssigneeCreate, TaskHistoryCreate, TaskPage, BulkImportResult
 )
-from typing import List, Optional
+from typing import List, Optional, Union
 from routers.auth import get_current_user, UserInfo
 import pyodbc
-from datetime import datetime
+from datetime import datetime, date
+import base64
+import json
+from task_import import RecordStreamParser, import_records, create_staging_tables, drop_staging_tables, MAX_REPORTED_ERRORS
+from rollups import day_labor_contribution, load_task_day_labor, diff_day_labor, apply_day_labor_delta
+from cache import bump_data_versions
+from streaming import ndjson_response, wants_stream
+from serialization import TrustedJSONResponse
+from rows import Record
+from queries import (
+    TASK_ROWS, ASSIGNEE_ROWS, HISTORY_ROWS, placeholders,
+    TASKS_BY_IDS, ASSIGNEES_BY_TASK_IDS, TASK_PAGE_IDS, TASKS_WITH_ASSIGNEES_STREAM, INSERT_TASK,
+    UPDATE_TASK_FIELDS, LOCK_TASK, TASK_DELETE_INFO, DELETE_TASK, APPLY_TASK_LABOR_DELTA, FIND_TASK_LABOR_DRIFT,
+    REPAIR_TASK_LABOR_DRIFT, LOCK_TASK_ASSIGNEES, TASK_ASSIGNEE_USER_IDS, INSERT_TASK_ASSIGNEE,
+    UPDATE_TASK_ASSIGNEE, DELETE_TASK_ASSIGNEES, TASK_HISTORY
+)
+from history import add_task_history, publish_task_history, flush_task_history
+from events import publish_task_event
 from schemas import TaskHistory # Make sure TaskHistory is imported
 router = APIRouter()
 
-# --- Helper Function to Add Task History ---
-def add_task_history(db, task_id: int, user_id: int, action: str, details: Optional[str] = None):
-    try:
-        cursor = db.cursor()
-        cursor.execute("""
-            INSERT INTO task_history (task_id, user_id, action, timestamp, details)
-            VALUES (?, ?, ?, GETDATE(), ?)
-        """, (task_id, user_id, action, details))
-        # Don't commit here, commit happens after the main operation succeeds
-    except pyodbc.Error as e:
-        # Log or handle error, but don't let history failure stop main operation?
-        print(f"Error adding task history: {e}")
-    except Exception as e:
-         print(f"Unexpected error in add_task_history: {e}")
-
+# --- Helpers to load tasks with assignees ---
+def get_tasks_with_assignees(task_ids: List[int], db) -> List[Record]:
+    """
+    Loads tasks and their assignees for any number of task IDs using two set-based
+    queries per chunk of IDs. Returns TaskResponse-shaped records, in the order
+    of the given IDs (duplicates and missing tasks are skipped).
+    """
+    unique_ids = list(dict.fromkeys(task_ids))
+    if not unique_ids:
+        return []
 
-# --- Helper to get task with assignees ---
-def get_task_with_assignees(task_id: int, db) -> Optional[TaskResponse]:
     cursor = db.cursor()
-    cursor.execute("""
-        SELECT
-            t.id, t.description, t.priority, t.team_id, t.start_date, t.completion_date,
-            t.creator_id, t.planned_labor, t.actual_labor, t.work_size, t.roadmap, t.status
-        FROM tasks t
-        WHERE t.id = ?
-    """, (task_id,))
-    task_row = cursor.fetchone()
-    if not task_row:
-        return None
-
-    task_columns = [col[0] for col in cursor.description]
-    task_dict = dict(zip(task_columns, task_row))
-
-    # Fetch assignees
-    cursor.execute("""
-        SELECT id, task_id, user_id, role, planned_labor, actual_labor
-        FROM task_assignees
-        WHERE task_id = ?
-    """, (task_id,))
-    assignees_raw = cursor.fetchall()
-    assignee_columns = [col[0] for col in cursor.description]
-    task_dict['assignees'] = [dict(zip(assignee_columns, row)) for row in assignees_raw]
-
-    return TaskResponse(**task_dict)
-
-
-@router.get("/", response_model=List[TaskResponse])
+    tasks_by_id = {}
+    for chunk in chunked(unique_ids):
+        for task in TASKS_BY_IDS.all(cursor, chunk, ids=placeholders(chunk)):
+            tasks_by_id[task.id] = task
+
+        assignees_by_task = {}
+        for assignee in ASSIGNEES_BY_TASK_IDS.all(cursor, chunk, ids=placeholders(chunk)):
+            assignees_by_task.setdefault(assignee.task_id, []).append(assignee)
+        for task_id, assignees in assignees_by_task.items():
+            if task_id in tasks_by_id:
+                tasks_by_id[task_id].assignees = assignees
+
+    return [tasks_by_id[task_id] for task_id in unique_ids if task_id in tasks_by_id]
+
+def get_task_with_assignees(task_id: int, db) -> Optional[Record]:
+    tasks = get_tasks_with_assignees([task_id], db)
+    return tasks[0] if tasks else None
+
+
+
+# --- Server-side filters, sorting and keyset pagination for task listings ---
+OPEN_TASK_PREDICATE = "t.status NOT IN ('Completed', 'Cancelled')"
+TASK_FILTERS = {
+    "overdue": f"t.completion_date < CAST(GETDATE() AS DATE) AND {OPEN_TASK_PREDICATE}",
+    # Due today or within the next 3 days, matching the dashboard alerts
+    "upcoming": f"t.completion_date BETWEEN CAST(GETDATE() AS DATE) AND DATEADD(day, 3, CAST(GETDATE() AS DATE)) AND {OPEN_TASK_PREDICATE}",
+    "in-progress": "t.status = 'In Progress'",
+    "not-started": "t.status = 'Not Started'",
+    "paused": "t.status = 'Paused'",
+    "completed": "t.status = 'Completed'",
+    "cancelled": "t.status = 'Cancelled'",
+}
+
+# Sort keys accepted as ?sort=<key>:<asc|desc>. Tasks have no created_at column, but the
+# identity id grows with creation order, so created_at sorts by id.
+TASK_SORT_COLUMNS = {
+    "id": "t.id",
+    "created_at": "t.id",
+    "start_date": "t.start_date",
+    "completion_date": "t.completion_date",
+    "work_size": "t.work_size",
+}
+DATE_SORT_KEYS = {"start_date", "completion_date"}
+MAX_PAGE_SIZE = 500
+
+def parse_task_sort(sort: Optional[str]):
+    key, _, direction = (sort or "id:asc").partition(":")
+    direction = (direction or "asc").lower()
+    if key not in TASK_SORT_COLUMNS or direction not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid sort '{sort}'. Use <field>:<asc|desc> with field one of {', '.join(TASK_SORT_COLUMNS)}"
+        )
+    return key, direction
+
+def encode_task_cursor(sort_key: str, sort_value, task_id: int) -> str:
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_key, sort_value, task_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+def decode_task_cursor(cursor: str, sort_key: str):
+    try:
+        cursor_key, sort_value, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if cursor_key != sort_key:
+            raise ValueError("cursor was issued for a different sort")
+        if sort_key in DATE_SORT_KEYS:
+            sort_value = date.fromisoformat(sort_value)
+        return sort_value, int(task_id)
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid cursor: {e}")
+
+def build_task_listing(
+    where_clauses: List[str],
+    params: list,
+    task_filter: Optional[str] = None,
+    sort: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Adds the named filter and the keyset predicate for cursor to where_clauses (written
+    against alias t). Returns (where_clauses, params, sort_key, sort_column, direction).
+    """
+    where_clauses = list(where_clauses)
+    params = list(params)
+
+    if task_filter:
+        predicate = TASK_FILTERS.get(task_filter.strip().lower().replace(" ", "-"))
+        if predicate is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown filter '{task_filter}'. Use one of {', '.join(TASK_FILTERS)}"
+            )
+        where_clauses.append(predicate)
+
+    sort_key, direction = parse_task_sort(sort)
+    sort_column = TASK_SORT_COLUMNS[sort_key]
+    comparison = ">" if direction == "asc" else "<"
+
+    if cursor:
+        last_value, last_id = decode_task_cursor(cursor, sort_key)
+        if sort_column == "t.id":
+            where_clauses.append(f"t.id {comparison} ?")
+            params.append(last_id)
+        else:
+            where_clauses.append(f"({sort_column} {comparison} ? OR ({sort_column} = ? AND t.id {comparison} ?))")
+            params.extend([last_value, last_value, last_id])
+
+    return where_clauses, params, sort_key, sort_column, direction
+
+def query_task_page(
+    db,
+    where_clauses: List[str],
+    params: list,
+    task_filter: Optional[str] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Selects the IDs of the tasks matching where_clauses (written against alias t) plus the
+    named filter, ordered by (sort key, id). With a limit, reads one extra row to decide
+    whether another page exists and seeks past the cursor instead of using OFFSET.
+    Returns (task_ids, next_cursor).
+    """
+    where_clauses, params, sort_key, sort_column, direction = build_task_listing(
+        where_clauses, params, task_filter, sort, cursor
+    )
+
+    top_clause = ""
+    if limit is not None:
+        top_clause = "TOP (?) "
+        params.insert(0, limit + 1)
+
+    rows = TASK_PAGE_IDS.fetchall(
+        db.cursor(), params,
+        top=top_clause, sort_column=sort_column, where=' AND '.join(where_clauses) or '1=1',
+        order=f"{sort_column} {direction.upper()}, t.id {direction.upper()}"
+    )
+
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_task_cursor(sort_key, rows[-1][1], rows[-1][0])
+    return [row[0] for row in rows], next_cursor
+
+def stream_tasks(
+    where_clauses: List[str],
+    params: list,
+    task_filter: Optional[str] = None,
+    sort: Optional[str] = None,
+):
+    """
+    Streams the matching tasks, with their assignees, as NDJSON in TaskResponse shape. One
+    joined query ordered by (sort key, task id) is read with fetchmany; rows of the same
+    task are adjacent, so each task is emitted as soon as the next one starts.
+    """
+    where_clauses, params, _, sort_column, direction = build_task_listing(where_clauses, params, task_filter, sort)
+    rows = TASKS_WITH_ASSIGNEES_STREAM.stream(
+        params, where=' AND '.join(where_clauses) or '1=1', order=f"{sort_column} {direction.upper()}, t.id {direction.upper()}"
+    )
+    task_width = len(TASK_ROWS.columns)
+    make_task, make_assignee = TASK_ROWS.record, ASSIGNEE_ROWS.record
+
+    def records():
+        task = None
+        for row in rows:
+            if task is None or task.id != row[0]:
+                if task is not None:
+                    yield task
+                task = make_task(*row[:task_width])
+                if row[task_width] is not None:
+                    task.assignees = []
+            if row[task_width] is not None:
+                task.assignees.append(make_assignee(*row[task_width:]))
+        if task is not None:
+            yield task
+
+    return ndjson_response(records(), rows)
+
+
+@router.get("/", response_model=Union[List[TaskResponse], TaskPage])
 def get_tasks(
-    db=Depends(get_db),
+    request: Request,
     current_user: UserInfo = Depends(get_current_user),
     # Add filters based on requirements (e.g., team, status)
     team_id: Optional[int] = None,
     status: Optional[str] = None,
-    assigned_to_user_id: Optional[int] = None # Filter by specific assigned user
+    assigned_to_user_id: Optional[int] = None, # Filter by specific assigned user
+    filter: Optional[str] = None, # overdue, upcoming, in-progress, not-started, ...
+    sort: Optional[str] = None, # e.g. completion_date:asc, created_at:desc
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), # Returns a TaskPage envelope when set
+    cursor: Optional[str] = None,
+    stream: bool = False # NDJSON, one task per line (also via Accept: application/x-ndjson)
 ):
-    cursor = db.cursor()
-    
-    query = """
-        SELECT DISTINCT t.id
-        FROM tasks t
-        LEFT JOIN task_assignees ta ON t.id = ta.task_id
-        WHERE 1=1
-    """
-    params = []
-
     # Apply filters
     # Requirement: Employees see their team's tasks, Managers see their team's tasks
     # Let's assume everyone can see tasks in their own team by default
-    query += " AND t.team_id = ?"
-    params.append(current_user.team_id)
+    where_clauses = ["t.team_id = ?"]
+    params = [current_user.team_id]
 
     # Optional filters from query parameters
     if team_id is not None: # Allow overriding team filter if needed? Or restrict based on role?
         if current_user.role == 'manager': # Manager can potentially view other teams? TBD by exact req.
-             query += " AND t.team_id = ?"
+             where_clauses.append("t.team_id = ?")
              params.append(team_id)
         # else: employee restricted to their team only (already applied)
-            
+
     if status:
-        query += " AND t.status = ?"
+        where_clauses.append("t.status = ?")
         params.append(status)
 
     if assigned_to_user_id:
-        query += " AND ta.user_id = ? AND ta.role IN ('assignee', 'partner')" # Ensure user is involved
+        # Ensure user is involved; EXISTS avoids the DISTINCT a join would need
+        where_clauses.append("""EXISTS (
+            SELECT 1 FROM task_assignees ta
+            WHERE ta.task_id = t.id AND ta.user_id = ? AND ta.role IN ('assignee', 'partner')
+        )""")
         params.append(assigned_to_user_id)
 
-    cursor.execute(query, params)
-    
-    task_ids = [row[0] for row in cursor.fetchall()]
-    if not task_ids:
-        return []
+    if wants_stream(request, stream, limit, cursor):
+        return stream_tasks(where_clauses, params, filter, sort)
 
-    # Fetch full task details for these tasks
-    tasks_list = []
-    for task_id in task_ids:
-        task_details = get_task_with_assignees(task_id, db)
-        if task_details:
-            tasks_list.append(task_details)
+    with request_connection() as db:
+        task_ids, next_cursor = query_task_page(db, where_clauses, params, filter, sort, limit, cursor)
 
-    return tasks_list
+        # Fetch full task details for these tasks in bulk
+        tasks_list = get_tasks_with_assignees(task_ids, db)
+    # The rows are already TaskResponse-shaped, so they skip response_model validation
+    if limit is None and cursor is None:
+        return TrustedJSONResponse(tasks_list)
+    return TrustedJSONResponse({"items": tasks_list, "next_cursor": next_cursor})
 
 
 @router.post("/", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
@@ -120,29 +281,24 @@ async def create_task( # Make endpoint async (if not already)
     db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
+    # All pyodbc work blocks, so it runs on the DB executor instead of the event loop
+    return await run_db(create_task_in_db, task_data, db, current_user)
+
+def create_task_in_db(task_data: TaskCreateData, db, current_user: UserInfo) -> Record:
     # ... (permission checks, validation) ...
     cursor = db.cursor()
     newly_created_task_id = None
     newly_created_task_description = task_data.description
 
     try:
-        # Insert the task - NOTE: We are setting the task's initial planned_labor here directly.
-        # This might be overridden by the sum later. Decide which source of truth is primary.
-        # Option A: Task planned_labor is the master, assignee planned is distribution (don't call helper for planned)
-        # Option B: Sum of assignees is the master (call helper for planned AND actual) - Let's assume Option B for now.
-        cursor.execute("""
-            INSERT INTO tasks (
-                description, priority, team_id, start_date, completion_date, creator_id,
-                planned_labor, work_size, roadmap, status, actual_labor
-            )
-            OUTPUT INSERTED.id
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
-        """, (
+        # Task totals are the sum of the assignees' labor, so compute them up front and
+        # insert them with the task instead of re-aggregating after the assignee insert.
+        total_planned, total_actual = sum_assignee_labor(task_data.assignees)
+        task_id = INSERT_TASK.scalar(cursor, (
             task_data.description, task_data.priority, task_data.team_id, task_data.start_date,
-            task_data.completion_date, current_user.id, 0, # Set initial task planned_labor to 0, rely on sum
-            task_data.work_size, task_data.roadmap, task_data.status
+            task_data.completion_date, current_user.id, total_planned,
+            task_data.work_size, task_data.roadmap, task_data.status, total_actual
         ))
-        task_id = cursor.fetchone()[0]
         newly_created_task_id = task_id
 
         recipient_user_ids_for_email = set()
@@ -159,19 +315,19 @@ async def create_task( # Make endpoint async (if not already)
                 ))
 
         # Insert task assignees if any
-        if assignee_values_to_insert:
-            insert_assignees_sql = """
-                INSERT INTO task_assignees (task_id, user_id, role, planned_labor, actual_labor)
-                VALUES (?, ?, ?, ?, ?)
-            """
-            cursor.executemany(insert_assignees_sql, assignee_values_to_insert)
+        INSERT_TASK_ASSIGNEE.executemany(cursor, assignee_values_to_insert)
 
-            # *** Call the helper function AFTER inserting assignees ***
-            update_task_total_labor(db, task_id)
+        apply_day_labor_delta(db, day_labor_contribution(
+            task_data.team_id, task_data.start_date, task_data.completion_date,
+            [(a.user_id, a.role, a.planned_labor, a.actual_labor) for a in task_data.assignees]
+        ))
 
-        add_task_history(db, task_id, current_user.id, "create", f"Task '{task_data.description[:50]}...' created.")
+        history = add_task_history(db, task_id, current_user.id, "create", f"Task '{task_data.description[:50]}...' created.")
 
         db.commit() # Commit all changes together
+        publish_task_history(history)
+        bump_data_versions([task_data.team_id], [a.user_id for a in task_data.assignees])
+        publish_task_event("created", task_id, [task_data.team_id], [a.user_id for a in task_data.assignees])
 
         # --- Trigger Email Notifications (After Commit) ---
         # ... (existing email notification logic using background_tasks) ...
@@ -191,6 +347,91 @@ async def create_task( # Make endpoint async (if not already)
     return created_task_details
 
 
+@router.post("/bulk", response_model=BulkImportResult)
+async def bulk_import_tasks(
+    request: Request,
+    chunk_size: int = Query(1000, ge=1, le=20000), # Rows per transaction
+    return_ids: bool = False,
+    db=Depends(get_db),
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """
+    Import many tasks (with assignees) from an NDJSON body or a JSON array of TaskCreateData
+    objects. The body is parsed as it streams in; every chunk_size rows are validated and
+    inserted in one transaction. Invalid rows are reported individually and skipped.
+    """
+    if current_user.role != 'manager':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only managers can bulk import tasks")
+
+    parser = RecordStreamParser()
+    pending = []
+    created_ids = []
+    errors = []
+    imported = 0
+
+    async def flush():
+        nonlocal imported
+        created, chunk_errors = await run_db(import_records, db, list(pending), current_user.id)
+        pending.clear()
+        imported += len(created)
+        errors.extend(chunk_errors)
+        if return_ids:
+            created_ids.extend(task_id for _, task_id in created)
+
+    async def consume(parsed):
+        for row_no, record, error in parsed:
+            if error:
+                errors.append((row_no, error))
+                continue
+            pending.append((row_no, record))
+            if len(pending) >= chunk_size:
+                await flush()
+
+    try:
+        await run_db(create_staging_tables, db)
+        async for data in request.stream():
+            await consume(parser.feed(data))
+        await consume(parser.close())
+        if pending:
+            await flush()
+    except pyodbc.Error as e:
+        print(f"Database error during bulk import: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Bulk import failed")
+    finally:
+        await run_db(drop_staging_tables, db)
+
+    errors.sort()
+    return BulkImportResult(
+        total_rows=parser.row_no,
+        imported=imported,
+        failed=len(errors),
+        errors=[{"row": row_no, "error": message} for row_no, message in errors[:MAX_REPORTED_ERRORS]],
+        errors_truncated=len(errors) > MAX_REPORTED_ERRORS,
+        task_ids=created_ids if return_ids else None,
+    )
+
+
+@router.post("/reconcile-labor")
+def reconcile_labor_totals(
+    repair: bool = True, # False only reports the drift
+    db=Depends(get_db),
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """Verify (and by default repair) the labor totals of every task in the manager's team"""
+    if current_user.role != 'manager':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only managers can reconcile task totals")
+    try:
+        drifted = reconcile_task_labor_totals(db, current_user.team_id, repair)
+        db.commit()
+        if repair and drifted:
+            bump_data_versions([current_user.team_id], [])
+    except pyodbc.Error as e:
+        db.rollback()
+        print(f"Database error reconciling labor totals for team {current_user.team_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to reconcile task totals")
+    return {"team_id": current_user.team_id, "repaired": repair, "drifted_tasks": drifted}
+
+
 @router.get("/{task_id}", response_model=TaskResponse)
 def get_task(
     task_id: int,
@@ -217,7 +458,15 @@ async def update_task(
     db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
+    # All pyodbc work blocks, so it runs on the DB executor instead of the event loop
+    return await run_db(update_task_in_db, task_id, task_update, db, current_user)
+
+def update_task_in_db(task_id: int, task_update: TaskUpdateData, db, current_user: UserInfo) -> Record:
     try:
+        cursor = db.cursor()
+        # Lock the task before reading it, so its old state (and rollup share) can't go stale
+        if LOCK_TASK.fetchone(cursor, (task_id,)) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
         existing_task = get_task_with_assignees(task_id, db)
         if not existing_task:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
@@ -234,11 +483,14 @@ async def update_task(
         if not can_update_fully and not can_update_limited:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to update this task")
 
-        cursor = db.cursor()
         update_data = task_update.dict(exclude_unset=True)
         assignees_to_add_or_replace = update_data.pop('assignees', None)
         history_note = update_data.pop('history_note', None)  # Extract history note if provided
 
+        # The task's share of the daily labor rollup moves if its team, dates or assignees change
+        moves_day_labor = assignees_to_add_or_replace is not None or update_data.keys() & {'team_id', 'start_date', 'completion_date'}
+        old_day_labor = load_task_day_labor(db, task_id) if moves_day_labor else None
+
         # Update task fields
         if update_data:
             update_fields = []
@@ -250,40 +502,31 @@ async def update_task(
             
             if update_fields:
                 update_values.append(task_id)
-                cursor.execute(f"""
-                    UPDATE tasks 
-                    SET {', '.join(update_fields)}
-                    WHERE id = ?
-                """, update_values)
+                UPDATE_TASK_FIELDS.execute(cursor, update_values, assignments=', '.join(update_fields))
 
-        # Handle assignee updates
+        # Handle assignee updates: only the rows that differ are written
+        assignee_changes = None
         if assignees_to_add_or_replace is not None:
-            # Delete existing assignees
-            cursor.execute("DELETE FROM task_assignees WHERE task_id = ?", (task_id,))
-            
-            # Insert new assignees
-            if assignees_to_add_or_replace:
-                for assignee in assignees_to_add_or_replace:
-                    # Convert assignee to dict if it's a Pydantic model
-                    assignee_dict = assignee.dict() if hasattr(assignee, 'dict') else assignee
-                    cursor.execute("""
-                        INSERT INTO task_assignees (task_id, user_id, role, planned_labor, actual_labor)
-                        VALUES (?, ?, ?, ?, ?)
-                    """, (
-                        task_id,
-                        assignee_dict['user_id'],
-                        assignee_dict['role'],
-                        assignee_dict.get('planned_labor', 0),
-                        assignee_dict.get('actual_labor', 0)
-                    ))
-
-        # Update task total labor based on assignees
-        update_task_total_labor(db, task_id)
-
-        # Add task history with the provided note or default message
-        add_task_history(db, task_id, current_user.id, "update", history_note or "Task updated")
+            assignee_changes, planned_delta, actual_delta = sync_task_assignees(db, task_id, assignees_to_add_or_replace)
+
+            # Keep task totals in step with the assignee change
+            apply_task_labor_delta(db, task_id, planned_delta, actual_delta)
+
+        if moves_day_labor:
+            apply_day_labor_delta(db, diff_day_labor(old_day_labor, load_task_day_labor(db, task_id)))
+
+        # Add task history with the provided note or default message, plus what changed in the assignees
+        history_details = history_note or "Task updated"
+        if assignee_changes:
+            history_details += f" | Assignees: {'; '.join(assignee_changes)}"
+        history = add_task_history(db, task_id, current_user.id, "update", history_details)
 
         db.commit()
+        publish_task_history(history)
+        affected_team_ids = [existing_task.team_id, update_data.get('team_id')]
+        affected_user_ids = {a.user_id for a in existing_task.assignees} | {a['user_id'] for a in assignees_to_add_or_replace or []}
+        bump_data_versions(affected_team_ids, affected_user_ids)
+        publish_task_event("updated", task_id, affected_team_ids, affected_user_ids)
 
         # Get updated task
         updated_task = get_task_with_assignees(task_id, db)
@@ -292,6 +535,9 @@ async def update_task(
 
         return updated_task
 
+    except HTTPException:
+        db.rollback()
+        raise
     except pyodbc.Error as e:
         db.rollback()
         print(f"Database error updating task: {e}")
@@ -310,18 +556,13 @@ def delete_task(
 ):
     cursor = db.cursor()
     # Get creator_id and team_id to check permission
-    cursor.execute("SELECT creator_id, team_id, description FROM tasks WHERE id=?", (task_id,))
-    task_info = cursor.fetchone()
+    task_info = TASK_DELETE_INFO.fetchone(cursor, (task_id,))
 
     if not task_info:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
 
     creator_id, team_id, description = task_info
 
-    # Debug logging
-    print(f"Delete task request: task_id={task_id}, creator_id={creator_id}, team_id={team_id}, current_user_id={current_user.id}, current_user_role={current_user.role}, current_user_team_id={current_user.team_id}")
-    print(f"Permission check: is_creator={creator_id == current_user.id}, is_manager_of_team={current_user.role == 'manager' and team_id == current_user.team_id}")
-
     # Permission Check: Creator or manager of the team can delete
     is_creator = creator_id == current_user.id
     is_manager_of_team = current_user.role == 'manager' and team_id == current_user.team_id
@@ -330,18 +571,23 @@ def delete_task(
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to delete this task")
          
     # Add history log *before* deleting
-    add_task_history(db, task_id, current_user.id, "delete", f"Task '{description[:50]}...' deleted.")
+    history = add_task_history(db, task_id, current_user.id, "delete", f"Task '{description[:50]}...' deleted.")
 
     try:
+        apply_day_labor_delta(db, diff_day_labor(load_task_day_labor(db, task_id), {}))
+        assignee_ids = [row[0] for row in TASK_ASSIGNEE_USER_IDS.fetchall(cursor, (task_id,))]
+
         # Delete the task (ON DELETE CASCADE should handle task_assignees and task_history)
-        cursor.execute("DELETE FROM tasks WHERE id=?", (task_id,))
-        rows_deleted = cursor.rowcount
+        rows_deleted = DELETE_TASK.execute(cursor, (task_id,))
 
         if rows_deleted == 0:
              # This shouldn't happen if the initial check passed, but as a safeguard
              raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found during delete")
 
         db.commit()
+        publish_task_history(history) # Dropped by the write-behind flush, like the cascade drops a sync row
+        bump_data_versions([team_id], assignee_ids)
+        publish_task_event("deleted", task_id, [team_id], assignee_ids)
         return # Return No Content on success
 
     except pyodbc.Error as e:
@@ -374,17 +620,10 @@ def get_task_history(
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have permission to view this task's history")
 
     # Fetch history if permission is granted
+    flush_task_history(task_id)
     cursor = db.cursor()
     try:
-        cursor.execute("""
-            SELECT id, task_id, user_id, action, timestamp, details
-            FROM task_history
-            WHERE task_id = ?
-            ORDER BY timestamp DESC
-        """, (task_id,))
-        history_raw = cursor.fetchall()
-        columns = [col[0] for col in cursor.description]
-        return [dict(zip(columns, row)) for row in history_raw]
+        return TASK_HISTORY.all(cursor, (task_id,))
     except pyodbc.Error as e:
          print(f"Database error fetching history for task {task_id}: {e}")
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to fetch task history")
@@ -392,38 +631,131 @@ def get_task_history(
          print(f"Unexpected error fetching history for task {task_id}: {e}")
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred")
 
-def update_task_total_labor(db, task_id: int):
+# --- Task labor totals ---
+# tasks.planned_labor / actual_labor always equal the sums over the task's assignees. Writers
+# keep them current incrementally; reconcile_task_labor_totals() verifies and repairs them.
+LABOR_TOLERANCE = 1e-6
+
+def sum_assignee_labor(assignees) -> tuple:
     """
-    Recalculates the sum of planned and actual labor from task_assignees
-    and updates the corresponding fields in the tasks table.
-    Should be called within the same transaction as assignee updates.
+    Sums (planned, actual) labor over assignee models, dicts or (planned, actual) rows,
+    treating missing values as 0.
     """
-    cursor_sum = db.cursor()
-    try:
-        # Calculate sums from assignees
-        cursor_sum.execute("""
-            SELECT
-                SUM(ISNULL(planned_labor, 0)),
-                SUM(ISNULL(actual_labor, 0))
-            FROM task_assignees
-            WHERE task_id = ?
-        """, (task_id,))
-        sums = cursor_sum.fetchone()
-        total_planned = sums[0] if sums and sums[0] is not None else 0.0
-        total_actual = sums[1] if sums and sums[1] is not None else 0.0
-
-        # Update the main task table
-        cursor_sum.execute("""
-            UPDATE tasks
-            SET planned_labor = ?, actual_labor = ?
-            WHERE id = ?
-        """, (total_planned, total_actual, task_id))
-        print(f"Updated task {task_id} totals: Planned={total_planned}, Actual={total_actual}") # Debug log
+    total_planned = total_actual = 0.0
+    for assignee in assignees or []:
+        if isinstance(assignee, dict):
+            planned, actual = assignee.get('planned_labor'), assignee.get('actual_labor')
+        elif hasattr(assignee, 'planned_labor'):
+            planned, actual = assignee.planned_labor, assignee.actual_labor
+        else:
+            planned, actual = assignee[0], assignee[1]
+        total_planned += planned or 0.0
+        total_actual += actual or 0.0
+    return total_planned, total_actual
+
+def apply_task_labor_delta(db, task_id: int, planned_delta: float, actual_delta: float):
+    """
+    Adjusts the task totals by the change in its assignees' labor.
+    Must run in the same transaction as the assignee write; errors propagate so the caller rolls back.
+    """
+    if abs(planned_delta) < LABOR_TOLERANCE and abs(actual_delta) < LABOR_TOLERANCE:
+        return
+    APPLY_TASK_LABOR_DELTA.execute(db.cursor(), (planned_delta, actual_delta, task_id))
 
-    except pyodbc.Error as e:
-        # Log the error, but maybe don't halt the main operation?
-        # Or re-raise if task totals are critical. Let's log for now.
-        print(f"ERROR: Could not update total labor for task {task_id}: {e}")
-        # Optionally raise e here if this update MUST succeed for the transaction to be valid
-    except Exception as e:
-        print(f"Unexpected error in update_task_total_labor for task {task_id}: {e}")
+def _format_labor(value) -> str:
+    return "-" if value is None else f"{value:g}"
+
+def sync_task_assignees(db, task_id: int, incoming) -> tuple:
+    """
+    Brings task_assignees for a task in line with the incoming list (models or dicts) by
+    diffing on user_id: new users are inserted, users whose role or labor changed are
+    updated in place (keeping their row IDs), missing users are deleted, and unchanged
+    rows are left alone. Each kind of write is one batched statement.
+    Returns (list of change descriptions, planned labor delta, actual labor delta).
+    """
+    cursor = db.cursor()
+    current_by_user = {}
+    to_delete = [] # (id, user_id, role, planned, actual)
+    changes = []
+    for row in LOCK_TASK_ASSIGNEES.fetchall(cursor, (task_id,)):
+        row = tuple(row)
+        if row[1] in current_by_user:
+            to_delete.append(row) # Duplicate row for the same user: drop the extras
+            changes.append(f"removed duplicate row for user {row[1]}")
+        else:
+            current_by_user[row[1]] = row
+
+    desired_by_user = {}
+    for assignee in incoming:
+        assignee_dict = assignee.dict() if hasattr(assignee, 'dict') else assignee
+        desired_by_user[assignee_dict['user_id']] = (
+            assignee_dict['role'],
+            assignee_dict.get('planned_labor'),
+            assignee_dict.get('actual_labor') or 0.0,
+        )
+
+    to_insert = []
+    to_update = []
+    planned_delta = actual_delta = 0.0
+    for user_id, (role, planned, actual) in desired_by_user.items():
+        current = current_by_user.pop(user_id, None)
+        if current is None:
+            to_insert.append((task_id, user_id, role, planned, actual))
+            changes.append(f"added user {user_id} as {role}")
+            planned_delta += planned or 0.0
+            actual_delta += actual
+            continue
+        row_id, _, old_role, old_planned, old_actual = current
+        if (role, planned, actual) == (old_role, old_planned, old_actual or 0.0):
+            continue
+        to_update.append((role, planned, actual, row_id))
+        details = []
+        if role != old_role:
+            details.append(f"role {old_role} -> {role}")
+        if planned != old_planned:
+            details.append(f"planned {_format_labor(old_planned)} -> {_format_labor(planned)}")
+        if actual != (old_actual or 0.0):
+            details.append(f"actual {_format_labor(old_actual)} -> {_format_labor(actual)}")
+        changes.append(f"user {user_id}: {', '.join(details)}")
+        planned_delta += (planned or 0.0) - (old_planned or 0.0)
+        actual_delta += actual - (old_actual or 0.0)
+
+    for row in current_by_user.values():
+        to_delete.append(row)
+        changes.append(f"removed user {row[1]} ({row[2]})")
+    for row in to_delete:
+        planned_delta -= row[3] or 0.0
+        actual_delta -= row[4] or 0.0
+
+    for chunk in chunked([row[0] for row in to_delete]):
+        DELETE_TASK_ASSIGNEES.execute(cursor, chunk, ids=placeholders(chunk))
+    UPDATE_TASK_ASSIGNEE.executemany(cursor, to_update)
+    INSERT_TASK_ASSIGNEE.executemany(cursor, to_insert)
+
+    return changes, planned_delta, actual_delta
+
+def reconcile_task_labor_totals(db, team_id: Optional[int] = None, repair: bool = True) -> List[dict]:
+    """
+    Compares every task's totals (of one team, or the whole DB when team_id is None) with the
+    sums over its assignees in a single set-based statement. With repair=True the drifted
+    totals are rewritten in the same statement. Returns one entry per drifted task.
+    The caller commits.
+    """
+    params = (team_id, team_id, LABOR_TOLERANCE, LABOR_TOLERANCE)
+    drift = REPAIR_TASK_LABOR_DRIFT if repair else FIND_TASK_LABOR_DRIFT
+    rows = drift.fetchall(db.cursor(), params)
+
+    drifted = [
+        {
+            "task_id": row[0],
+            "team_id": row[1],
+            "stored_planned_labor": row[2],
+            "expected_planned_labor": row[3],
+            "stored_actual_labor": row[4],
+            "expected_actual_labor": row[5],
+        }
+        for row in rows
+    ]
+    if drifted:
+        print(f"Task labor drift {'repaired' if repair else 'found'} for {len(drifted)} task(s) (team_id={team_id})")
+    return drifted
@@ -1,18 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
 from typing import List
+from datetime import date, timedelta
 from database import get_db
-from schemas import Team, TeamCreate, TeamUpdate, UserResponse # Import necessary schemas
-from routers.auth import get_current_user, UserInfo # Import auth dependency
+from schemas import Team, TeamCreate, TeamUpdate, UserResponse, TeamMemberWorkload # Import necessary schemas
+from routers.auth import get_current_user, UserInfo, invalidate_cached_user # Import auth dependency
+from cache import TTLCache, bump_data_versions
+from http_cache import serve_cached
+from queries import (
+    TEAM_ROWS, USER_ROLE, INSERT_TEAM, ALL_TEAMS, TEAM_BY_ID, TEAM_EXISTS, TEAM_MEMBER_WORKLOAD, UPDATE_TEAM_FIELDS,
+    COUNT_TEAM_USERS, COUNT_TEAM_TASKS, DELETE_TEAM
+)
 import pyodbc
 
 router = APIRouter()
 
+TEAM_MEMBERS_CACHE_MAX_SIZE = 256
+TEAM_MEMBERS_CACHE_TTL_SECONDS = 300
+team_members_cache = TTLCache("team_members", TEAM_MEMBERS_CACHE_MAX_SIZE, TEAM_MEMBERS_CACHE_TTL_SECONDS)
+UPCOMING_TASK_DAYS = 3
+
 # Helper to check if a user exists and is a manager
 def verify_manager(db, user_id: int) -> bool:
-    cursor = db.cursor()
-    cursor.execute("SELECT role FROM users WHERE id = ?", (user_id,))
-    user = cursor.fetchone()
-    return user is not None and user[0] == 'manager'
+    return USER_ROLE.scalar(db.cursor(), (user_id,)) == 'manager'
 
 @router.post("/", response_model=Team, status_code=status.HTTP_201_CREATED)
 def create_team(
@@ -36,11 +45,7 @@ def create_team(
 
     cursor = db.cursor()
     try:
-        cursor.execute(
-            "INSERT INTO teams (name, manager_id) OUTPUT INSERTED.id, INSERTED.name, INSERTED.manager_id VALUES (?, ?)",
-            (team_data.name, team_data.manager_id)
-        )
-        new_team_row = cursor.fetchone()
+        new_team_row = INSERT_TEAM.fetchone(cursor, (team_data.name, team_data.manager_id))
         db.commit()
         if not new_team_row:
              raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to create team")
@@ -69,11 +74,7 @@ def get_teams(
     current_user: UserInfo = Depends(get_current_user) # Require login to view teams
 ):
     # PERMISSION CHECK: Assume all logged-in users can list teams. Adjust if needed.
-    cursor = db.cursor()
-    cursor.execute("SELECT id, name, manager_id FROM teams ORDER BY name")
-    teams_raw = cursor.fetchall()
-    columns = [col[0] for col in cursor.description]
-    return [dict(zip(columns, row)) for row in teams_raw]
+    return ALL_TEAMS.all(db.cursor())
 
 
 @router.get("/{team_id}", response_model=Team)
@@ -82,15 +83,59 @@ def get_team(
     db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user) # Require login
 ):
-    cursor = db.cursor()
-    cursor.execute("SELECT id, name, manager_id FROM teams WHERE id = ?", (team_id,))
-    team = cursor.fetchone()
+    team = TEAM_BY_ID.one(db.cursor(), (team_id,))
     if not team:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
 
     # PERMISSION CHECK: Assume all logged-in users can view team details.
-    columns = [col[0] for col in cursor.description]
-    return dict(zip(columns, team))
+    return team
+
+
+@router.get("/{team_id}/members", response_model=List[TeamMemberWorkload])
+def get_team_members(
+    team_id: int,
+    http_request: Request,
+    response: Response,
+    current_user: UserInfo = Depends(get_current_user)
+):
+    """
+    Members of the team with their workload on the team's tasks. Every task write bumps the
+    version of the task's team, so the response is cached per team version (and day, for
+    the overdue/upcoming counts).
+    """
+    if team_id != current_user.team_id and current_user.role != 'manager':
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Yetkisiz erişim.")
+    today = date.today()
+
+    def load(db):
+        cursor = db.cursor()
+        # Only the team's tasks count, so only writes to this team's tasks change the result
+        rows = TEAM_MEMBER_WORKLOAD.fetchall(
+            cursor, (today, today, today + timedelta(days=UPCOMING_TASK_DAYS), team_id, team_id)
+        )
+        if not rows and TEAM_EXISTS.fetchone(cursor, (team_id,)) is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
+
+        members = []
+        for row in rows:
+            # SUMs over no joined rows are NULL
+            not_started, in_progress, paused, completed, cancelled = (count or 0 for count in row[6:11])
+            members.append({
+                "id": row[0], "username": row[1], "email": row[2], "name": row[3], "role": row[4], "team_id": row[5],
+                "open_tasks": not_started + in_progress + paused,
+                "tasks_by_status": {
+                    "not_started": not_started, "in_progress": in_progress, "paused": paused,
+                    "completed": completed, "cancelled": cancelled,
+                },
+                "planned_labor": float(row[11]),
+                "actual_labor": float(row[12]),
+                "overdue_tasks": row[13] or 0,
+                "upcoming_tasks": row[14] or 0,
+            })
+        return members
+
+    params = {"team_id": team_id, "today": today}
+    return serve_cached(team_members_cache, http_request, response, "team-members", params, [("team", team_id)], load)
 
 
 @router.put("/{team_id}", response_model=Team)
@@ -130,17 +175,15 @@ def update_team(
 
     cursor = db.cursor()
     try:
-        cursor.execute(f"UPDATE teams SET {set_clause} WHERE id=?", params)
-        if cursor.rowcount == 0:
+        if UPDATE_TEAM_FIELDS.execute(cursor, params, assignments=set_clause) == 0:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
 
         db.commit()
+        invalidate_cached_user() # Team changes can affect any cached member
+        bump_data_versions([team_id], [])
 
         # Fetch the updated team data to return
-        cursor.execute("SELECT id, name, manager_id FROM teams WHERE id = ?", (team_id,))
-        updated_team = cursor.fetchone()
-        columns = [col[0] for col in cursor.description]
-        return dict(zip(columns, updated_team))
+        return TEAM_BY_ID.one(cursor, (team_id,))
 
     except pyodbc.Error as e:
         db.rollback()
@@ -167,10 +210,8 @@ def delete_team(
 
     cursor = db.cursor()
     # Check for associated users or tasks before deleting? VERY IMPORTANT!
-    cursor.execute("SELECT COUNT(*) FROM users WHERE team_id = ?", (team_id,))
-    user_count = cursor.fetchone()[0]
-    cursor.execute("SELECT COUNT(*) FROM tasks WHERE team_id = ?", (team_id,))
-    task_count = cursor.fetchone()[0]
+    user_count = COUNT_TEAM_USERS.scalar(cursor, (team_id,))
+    task_count = COUNT_TEAM_TASKS.scalar(cursor, (team_id,))
 
     if user_count > 0 or task_count > 0:
         db.rollback() # Ensure no changes are made
@@ -180,12 +221,13 @@ def delete_team(
         )
 
     try:
-        cursor.execute("DELETE FROM teams WHERE id=?", (team_id,))
-        if cursor.rowcount == 0:
+        if DELETE_TEAM.execute(cursor, (team_id,)) == 0:
             # No rollback needed as delete didn't happen, but raise error
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
 
         db.commit()
+        invalidate_cached_user() # Team changes can affect any cached member
+        bump_data_versions([team_id], [])
         return # Return No Content on success
 
     except pyodbc.Error as e:
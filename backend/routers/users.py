@@ -1,89 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from database import get_db
-from schemas import UserResponse, TaskResponse,UserUpdate, PasswordUpdateRequest # Updated Schemas
-from typing import List
-from routers.auth import get_current_user, UserInfo
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from database import get_db, run_db, request_connection
+from schemas import UserResponse, TaskResponse, TaskPage, UserUpdate, PasswordUpdateRequest # Updated Schemas
+from typing import List, Optional, Union
+from routers.auth import get_current_user, UserInfo, invalidate_cached_user
+from passwords import verify_password_async, hash_password_async
+from tokens import revocations, revoke_user_refresh_tokens, issue_refresh_token, token_response
+from cache import bump_data_versions
+import pyodbc
+from routers.tasks import get_tasks_with_assignees, query_task_page, stream_tasks, MAX_PAGE_SIZE
+from streaming import ndjson_response, wants_stream
+from serialization import TrustedJSONResponse
+from queries import (
+    USER_ROWS, ALL_USERS, USER_BY_ID, OTHER_USER_ID_BY_EMAIL, UPDATE_USER_FIELDS, USER_PASSWORD_HASH, REPLACE_PASSWORD_HASH
+)
 
 router = APIRouter()
 
 # Example: Protect endpoint - only allow logged-in users
 @router.get("/", response_model=List[UserResponse]) #, dependencies=[Depends(get_current_user)])
-def get_users(db=Depends(get_db)):
-    cursor = db.cursor()
+def get_users(
+    request: Request,
+    stream: bool = False # NDJSON, one user per line (also via Accept: application/x-ndjson)
+):
     # Select columns matching UserResponse
-    cursor.execute("SELECT id, name, username, email, role, team_id FROM users")
-    users = cursor.fetchall()
-    # Convert rows to dicts
-    columns = [column[0] for column in cursor.description]
-    return [dict(zip(columns, row)) for row in users]
+    if wants_stream(request, stream):
+        rows = ALL_USERS.stream()
+        return ndjson_response(USER_ROWS.map(rows), rows)
+
+    with request_connection() as db:
+        return ALL_USERS.all(db.cursor())
 
 @router.get("/{user_id}", response_model=UserResponse) #, dependencies=[Depends(get_current_user)])
 def get_user(user_id: int, db=Depends(get_db)):
-    cursor = db.cursor()
-    cursor.execute("""
-        SELECT id, name, username, email, role, team_id
-        FROM users
-        WHERE id=?
-    """, (user_id,))
-    user = cursor.fetchone()
+    user = USER_BY_ID.one(db.cursor(), (user_id,))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
-
-    columns = [column[0] for column in cursor.description]
-    return dict(zip(columns, user))
+    return user
 
 # Get tasks ASSIGNED to a specific user
-@router.get("/{user_id}/tasks", response_model=List[TaskResponse]) #, dependencies=[Depends(get_current_user)])
-def get_user_tasks(user_id: int, db=Depends(get_db)):
-    cursor = db.cursor()
-
+@router.get("/{user_id}/tasks", response_model=Union[List[TaskResponse], TaskPage]) #, dependencies=[Depends(get_current_user)])
+def get_user_tasks(
+    request: Request,
+    user_id: int,
+    filter: Optional[str] = None, # overdue, upcoming, in-progress, not-started, ...
+    sort: Optional[str] = None, # e.g. created_at:desc
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE), # Returns a TaskPage envelope when set
+    cursor: Optional[str] = None,
+    stream: bool = False # NDJSON, one task per line (also via Accept: application/x-ndjson)
+):
     # Fetch tasks where the user is an assignee or partner
-    cursor.execute("""
-        SELECT DISTINCT t.id
-        FROM tasks t
-        JOIN task_assignees ta ON t.id = ta.task_id
-        WHERE ta.user_id = ? AND ta.role IN ('assignee', 'partner')
-    """, (user_id,))
-
-    task_ids = [row[0] for row in cursor.fetchall()]
-    if not task_ids:
-        return []
-
-    # Fetch full task details for these tasks
-    # Using IN clause - be mindful of potential performance issues with very large lists
-    # and the max number of parameters allowed by the driver/db.
-    task_query = f"""
-        SELECT
-            t.id, t.description, t.priority, t.team_id, t.start_date, t.completion_date,
-            t.creator_id, t.planned_labor, t.actual_labor, t.work_size, t.roadmap, t.status
-        FROM tasks t
-        WHERE t.id IN ({','.join('?' * len(task_ids))})
-    """
-    cursor.execute(task_query, task_ids)
-    tasks_raw = cursor.fetchall()
-    task_columns = [col[0] for col in cursor.description]
-    tasks_dict = {row[0]: dict(zip(task_columns, row)) for row in tasks_raw}
-
-    # Fetch assignees for these tasks
-    assignee_query = f"""
-        SELECT id, task_id, user_id, role, planned_labor, actual_labor
-        FROM task_assignees
-        WHERE task_id IN ({','.join('?' * len(task_ids))})
-    """
-    cursor.execute(assignee_query, task_ids)
-    assignees_raw = cursor.fetchall()
-    assignee_columns = [col[0] for col in cursor.description]
-
-    # Group assignees by task_id
-    for assignee_row in assignees_raw:
-        assignee_dict = dict(zip(assignee_columns, assignee_row))
-        task_id = assignee_dict['task_id']
-        if task_id in tasks_dict:
-            if 'assignees' not in tasks_dict[task_id]:
-                tasks_dict[task_id]['assignees'] = []
-            tasks_dict[task_id]['assignees'].append(assignee_dict)
-
-    return list(tasks_dict.values())
+    where_clauses = ["""EXISTS (
+        SELECT 1 FROM task_assignees ta
+        WHERE ta.task_id = t.id AND ta.user_id = ? AND ta.role IN ('assignee', 'partner')
+    )"""]
+    if wants_stream(request, stream, limit, cursor):
+        return stream_tasks(where_clauses, [user_id], filter, sort)
+
+    with request_connection() as db:
+        task_ids, next_cursor = query_task_page(db, where_clauses, [user_id], filter, sort, limit, cursor)
+
+        # Fetch full task details for these tasks in bulk (chunked to respect the parameter limit)
+        tasks_list = get_tasks_with_assignees(task_ids, db)
+    if limit is None and cursor is None:
+        return TrustedJSONResponse(tasks_list)
+    return TrustedJSONResponse({"items": tasks_list, "next_cursor": next_cursor})
+
 @router.patch("/{user_id}", response_model=UserResponse)
 def update_user(
     user_id: int,
@@ -93,13 +74,10 @@ def update_user(
 ):
     # Fetch the user being updated to check permissions and existence
     cursor = db.cursor()
-    cursor.execute("SELECT id, name, username, email, role, team_id FROM users WHERE id=?", (user_id,))
-    target_user_row = cursor.fetchone()
-    if not target_user_row:
+    target_user = USER_BY_ID.one(cursor, (user_id,))
+    if not target_user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User to update not found")
 
-    target_user = dict(zip([col[0] for col in cursor.description], target_user_row))
-
     # --- PERMISSION CHECK ---
     can_update = False
     # 1. Can users update themselves?
@@ -109,7 +87,7 @@ def update_user(
         if user_data.dict(exclude_unset=True).keys() & {'role', 'team_id'}:
              raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Users cannot change their own role or team.")
     # 2. Can managers update users in their team?
-    elif current_user.role == 'manager' and target_user['team_id'] == current_user.team_id:
+    elif current_user.role == 'manager' and target_user.team_id == current_user.team_id:
         can_update = True
         # Managers cannot change user's role or team via this endpoint? (Define this rule)
         # Let's assume for now managers can only update name/email of their team members here.
@@ -124,23 +102,28 @@ def update_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No update data provided.")
 
     # Check for email uniqueness if email is being changed
-    if 'email' in update_dict and update_dict['email'] != target_user['email']:
-        cursor.execute("SELECT id FROM users WHERE email=? AND id != ?", (update_dict['email'], user_id))
-        if cursor.fetchone():
+    if 'email' in update_dict and update_dict['email'] != target_user.email:
+        if OTHER_USER_ID_BY_EMAIL.fetchone(cursor, (update_dict['email'], user_id)):
             raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Email already registered by another user.")
 
     set_clause = ", ".join([f"{field}=?" for field in update_dict])
     params = list(update_dict.values()) + [user_id]
 
     try:
-        cursor.execute(f"UPDATE users SET {set_clause} WHERE id=?", params)
+        UPDATE_USER_FIELDS.execute(cursor, params, assignments=set_clause)
+        # Access tokens carry the role and team the user is authorized by, so changing either signs
+        # them out until they refresh; a stale name or email in a token is harmless until it expires
+        revoked = None
+        if any(update_dict[field] != getattr(target_user, field) for field in update_dict.keys() & {'role', 'team_id'}):
+            revoked = revocations.revoke_user(db, user_id)
         db.commit()
+        if revoked is not None:
+            revocations.apply(revoked)
+        invalidate_cached_user(user_id)
+        bump_data_versions([target_user.team_id], [user_id]) # Names show up in analytics responses
 
         # Fetch the updated user data to return
-        cursor.execute("SELECT id, name, username, email, role, team_id FROM users WHERE id=?", (user_id,))
-        updated_user = cursor.fetchone()
-        columns = [col[0] for col in cursor.description]
-        return dict(zip(columns, updated_user))
+        return USER_BY_ID.one(cursor, (user_id,))
 
     except pyodbc.Error as e:
         db.rollback()
@@ -151,43 +134,66 @@ def update_user(
         print(f"Unexpected error updating user {user_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
 
+# Runs on the DB executor: the lookup and the write each hold a connection only briefly, so the
+# password check and the new hash (on the hash pool) run without one
+def fetch_password_hash(user_id: int):
+    with request_connection() as db:
+        return USER_PASSWORD_HASH.fetchone(db.cursor(), (user_id,))
+
+def store_new_password(user_id: int, old_hash: str, new_hash: str):
+    with request_connection() as db:
+        cursor = db.cursor()
+        try:
+            # Compare-and-set: a password change that committed since the check wins
+            if REPLACE_PASSWORD_HASH.execute(cursor, (new_hash, user_id, old_hash)) != 1:
+                db.rollback()
+                return None
+            # Signs out every session, then starts a new one for this client
+            revoked = revocations.revoke_user(db, user_id)
+            revoke_user_refresh_tokens(db, user_id)
+            refresh_token = issue_refresh_token(db, user_id)
+            db.commit()
+            revocations.apply(revoked)
+            return refresh_token
+        except Exception:
+            db.rollback()
+            raise
+
 # Separate endpoint for password changes is generally more secure
 @router.put("/{user_id}/password")
-def update_password(
+async def update_password(
     user_id: int,
     password_data: PasswordUpdateRequest,
-    db=Depends(get_db),
     current_user: UserInfo = Depends(get_current_user)
 ):
     # PERMISSION CHECK: Only the user themselves can change their password
     if user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Cannot change another user's password.")
 
-    cursor = db.cursor()
     # Verify current password
-    cursor.execute("SELECT password_hash FROM users WHERE id = ?", (user_id,))
-    user_pw = cursor.fetchone()
+    user_pw = await run_db(fetch_password_hash, user_id)
 
     if not user_pw:
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found") # Should not happen if token is valid
 
-    # Use the verify_password function from auth.py (might need to import it or move it to a utils file)
-    from auth import verify_password, hash_password # Quick import, consider refactoring later
-    if not verify_password(password_data.current_password, user_pw[0]):
+    if not await verify_password_async(password_data.current_password, user_pw[0]):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect current password.")
 
     # Hash the new password
-    new_hashed_password = hash_password(password_data.new_password)
+    new_hashed_password = await hash_password_async(password_data.new_password)
 
     try:
-        cursor.execute("UPDATE users SET password_hash = ? WHERE id = ?", (new_hashed_password, user_id))
-        db.commit()
-        return {"message": "Password updated successfully"}
+        refresh_token = await run_db(store_new_password, user_id, user_pw[0], new_hashed_password)
+    except HTTPException:
+        raise
     except pyodbc.Error as e:
-        db.rollback()
         print(f"Database error updating password for user {user_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Could not update password.")
     except Exception as e:
-        db.rollback()
         print(f"Unexpected error updating password for user {user_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="An unexpected error occurred.")
+
+    if refresh_token is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Password was changed concurrently; please retry.")
+    invalidate_cached_user(user_id)
+    return {"message": "Password updated successfully", **token_response(current_user, refresh_token)}
@@ -0,0 +1,286 @@
+"""
+Load-balancing planner for team task assignments.
+
+Every labor-carrying assignment (a task_assignees row) is a work item whose remaining
+labor is spread evenly over the days of its task inside the planning range, the same
+model labor_distribution uses. Load above a user's daily capacity is overload. The
+planner suggests reassignments that minimise the peak daily overload, then the total:
+
+1. Greedy (LPT): movable items, largest daily rate first, each go to the user whose load
+   over the item's days stays lowest. The current assignee keeps the item whenever that
+   causes no overload or ties with the best choice, and afterwards items go back to
+   their assignee wherever that does not raise the overload, which keeps the plan small.
+2. Local search (optional): items are moved off the most overloaded users as long as the
+   (peak, total) overload of the two users involved strictly decreases.
+
+Both phases stop at a deadline, so planning always finishes in bounded time.
+"""
+import time
+from datetime import date, timedelta
+from typing import List
+
+import numpy as np
+
+EPSILON = 1e-6
+ROUND_DECIMALS = 6
+# Items tried per overloaded user in one local search step (largest daily rate first)
+MAX_MOVE_CANDIDATES = 32
+
+
+def _overload_stats(loads, capacity):
+    over = loads - capacity[:, None]
+    peak = max(0.0, float(over.max())) if over.size else 0.0
+    return peak, float(np.maximum(over, 0.0).sum())
+
+
+def _is_better(a, b):
+    # Lexicographic (peak, total) comparison with a tolerance for float noise
+    return a[0] < b[0] - EPSILON or (a[0] <= b[0] + EPSILON and a[1] < b[1] - EPSILON)
+
+
+class _Plan:
+    """Mutable assignment state: per-user daily loads, item owners and task membership"""
+
+    def __init__(self, n_users, n_days, capacity, first, last, rate, owner, members):
+        self.capacity = capacity
+        self.first = first
+        self.last = last
+        self.rate = rate
+        self.owner = owner.copy()
+        self.members = {task_id: set(users) for task_id, users in members.items()}
+        self.loads = np.zeros((n_users, n_days))
+
+    def place(self, item, user, task_id):
+        self.loads[user, self.first[item]:self.last[item] + 1] += self.rate[item]
+        self.owner[item] = user
+        self.members.setdefault(task_id, set()).add(user)
+
+    def unplace(self, item, task_id):
+        user = self.owner[item]
+        self.loads[user, self.first[item]:self.last[item] + 1] -= self.rate[item]
+        self.members[task_id].discard(user)
+
+
+def _greedy(plan, items, task_ids, current_owner, deadline) -> bool:
+    """Places the movable items largest-rate-first. Returns False if the deadline passed."""
+    capacity = plan.capacity
+    order = sorted(items, key=lambda i: (-plan.rate[i], plan.first[i] - plan.last[i]))
+    for count, item in enumerate(order):
+        if count % 256 == 0 and time.perf_counter() > deadline:
+            return False
+        first, last, rate, task_id = plan.first[item], plan.last[item], plan.rate[item], task_ids[item]
+        peaks = plan.loads[:, first:last + 1].max(axis=1) + rate - capacity
+        taken = plan.members.get(task_id)
+        if taken:
+            peaks[list(taken)] = np.inf
+        best = int(np.argmin(peaks))
+        current = int(current_owner[item])
+        # Keep the current assignee whenever that adds no more overload than the best choice
+        if current not in (taken or ()) and (peaks[current] <= max(peaks[best], 0.0) + EPSILON or np.isinf(peaks[best])):
+            best = current
+        plan.place(item, best, task_id)
+    return True
+
+
+def _restore_owners(plan, items, task_ids, original_owner, deadline):
+    """
+    Moves greedy reassignments back to their original assignee wherever that raises
+    neither the pair's peak nor its total overload, so the plan only moves what it must.
+    """
+    capacity = plan.capacity
+    for count, item in enumerate(items):
+        if count % 256 == 0 and time.perf_counter() > deadline:
+            return
+        current, original = int(plan.owner[item]), int(original_owner[item])
+        if current == original or original in plan.members.get(task_ids[item], ()):
+            continue
+        first, last, rate = plan.first[item], plan.last[item], plan.rate[item]
+        rows = plan.loads[[current, original]] - capacity[[current, original], None]
+        old_peak = max(float(rows.max()), 0.0)
+        old_over = float(np.maximum(rows, 0.0).sum())
+        rows[0, first:last + 1] -= rate
+        rows[1, first:last + 1] += rate
+        if max(float(rows.max()), 0.0) <= old_peak + EPSILON and float(np.maximum(rows, 0.0).sum()) <= old_over + EPSILON:
+            plan.unplace(item, task_ids[item])
+            plan.place(item, original, task_ids[item])
+
+
+def _best_move(plan, user, task_ids, movable_mask, user_peak, user_over):
+    """Best single-item move off `user` that lowers the pair's (peak, total) overload, or None"""
+    capacity = plan.capacity
+    over_row = plan.loads[user] - capacity[user]
+    day = int(np.argmax(over_row))
+    candidates = np.flatnonzero(
+        (plan.owner == user) & movable_mask & (plan.first <= day) & (plan.last >= day)
+    )
+    if candidates.size == 0:
+        return None
+    candidates = candidates[np.argsort(-plan.rate[candidates], kind="stable")][:MAX_MOVE_CANDIDATES]
+
+    best = None
+    for item in candidates:
+        first, last, rate = plan.first[item], plan.last[item], plan.rate[item]
+        src_row = over_row.copy()
+        src_row[first:last + 1] -= rate
+        src_peak = float(src_row.max())
+        src_over = float(np.maximum(src_row, 0.0).sum())
+
+        window = plan.loads[:, first:last + 1] - capacity[:, None]
+        dst_peak = np.maximum(user_peak, window.max(axis=1) + rate)
+        dst_over = user_over + (np.maximum(window + rate, 0.0) - np.maximum(window, 0.0)).sum(axis=1)
+
+        old_peak = np.maximum(user_peak, user_peak[user])
+        old_over = user_over + user_over[user]
+        new_peak = np.maximum(dst_peak, src_peak)
+        new_over = dst_over + src_over
+        valid = (new_peak < old_peak - EPSILON) | ((new_peak <= old_peak + EPSILON) & (new_over < old_over - EPSILON))
+        valid[user] = False
+        taken = plan.members.get(task_ids[item])
+        if taken:
+            valid[list(taken)] = False
+        if not valid.any():
+            continue
+        targets = np.flatnonzero(valid)
+        target = int(targets[np.lexsort((new_over[targets], new_peak[targets]))[0]])
+        key = (float(new_peak[target] - old_peak[target]), float(new_over[target] - old_over[target]))
+        if best is None or key < best[0]:
+            best = (key, int(item), target, src_peak, src_over, float(dst_peak[target]), float(dst_over[target]))
+    return best
+
+
+def _local_search(plan, task_ids, movable_mask, deadline):
+    """Moves items off overloaded users until no improving move is left. Returns (moves, timed_out)."""
+    capacity = plan.capacity
+    over = plan.loads - capacity[:, None]
+    user_peak = over.max(axis=1)
+    user_over = np.maximum(over, 0.0).sum(axis=1)
+    moves = 0
+    while True:
+        improved = False
+        for user in np.argsort(-user_peak, kind="stable"):
+            if time.perf_counter() > deadline:
+                return moves, True
+            if user_peak[user] <= EPSILON:
+                break
+            move = _best_move(plan, int(user), task_ids, movable_mask, user_peak, user_over)
+            if move is None:
+                continue
+            _, item, target, src_peak, src_over, dst_peak, dst_over = move
+            plan.unplace(item, task_ids[item])
+            plan.place(item, target, task_ids[item])
+            user_peak[user], user_over[user] = src_peak, src_over
+            user_peak[target], user_over[target] = dst_peak, dst_over
+            moves += 1
+            improved = True
+            break
+        if not improved:
+            return moves, False
+
+
+def plan_assignments(users: List[dict], items: List[dict], start_date: date, end_date: date,
+                     local_search: bool = True, time_budget: float = 2.0) -> dict:
+    """
+    users: dicts with id and capacity (labor per day).
+    items: dicts with task_id, user_id, start_date, completion_date, labor (remaining) and
+    movable; user_id must be one of users. A user never receives a second item of a task
+    they already work on. Returns before/after overload stats, suggested reassignments and
+    each user's resulting day-by-day load.
+    """
+    started = time.perf_counter()
+    deadline = started + time_budget
+    n_days = max((end_date - start_date).days + 1, 0)
+    user_index = {user["id"]: i for i, user in enumerate(users)}
+    capacity = np.array([float(user["capacity"]) for user in users])
+    origin = start_date.toordinal()
+
+    # Items without labor inside the range still count as membership of their task
+    members = {}
+    loaded = []
+    for item in items:
+        user = user_index[item["user_id"]]
+        members.setdefault(item["task_id"], set()).add(user)
+        first = max(item["start_date"].toordinal() - origin, 0)
+        last = min(item["completion_date"].toordinal() - origin, n_days - 1)
+        if last >= first and item["labor"] > EPSILON:
+            loaded.append((item, user, first, last))
+
+    task_ids = [item["task_id"] for item, _, _, _ in loaded]
+    first = np.array([f for _, _, f, _ in loaded], dtype=np.int64)
+    last = np.array([l for _, _, _, l in loaded], dtype=np.int64)
+    rate = np.array([item["labor"] / (l - f + 1) for item, _, f, l in loaded], dtype=np.float64)
+    original_owner = np.array([user for _, user, _, _ in loaded], dtype=np.int64)
+    movable_mask = np.array([bool(item["movable"]) for item, _, _, _ in loaded], dtype=bool)
+    movable_items = np.flatnonzero(movable_mask).tolist()
+    movable_members = {}
+    for i in movable_items:
+        movable_members.setdefault(task_ids[i], set()).add(int(original_owner[i]))
+
+    # Baseline: everything stays where it is
+    baseline = _Plan(len(users), n_days, capacity, first, last, rate, original_owner, members)
+    for i in range(len(loaded)):
+        baseline.loads[original_owner[i], first[i]:last[i] + 1] += rate[i]
+    before = _overload_stats(baseline.loads, capacity)
+
+    # Greedy: pinned items (and unloaded memberships) stay, movable items are placed from scratch
+    greedy_members = {
+        task_id: users_on_task - movable_members.get(task_id, set()) for task_id, users_on_task in members.items()
+    }
+    greedy = _Plan(len(users), n_days, capacity, first, last, rate, original_owner, greedy_members)
+    for i in np.flatnonzero(~movable_mask):
+        greedy.loads[original_owner[i], first[i]:last[i] + 1] += rate[i]
+    greedy_done = _greedy(greedy, movable_items, task_ids, original_owner, deadline)
+
+    plan, start = baseline, "current"
+    if greedy_done:
+        _restore_owners(greedy, movable_items, task_ids, original_owner, deadline)
+        if _is_better(_overload_stats(greedy.loads, capacity), before):
+            plan, start = greedy, "greedy"
+
+    moves, timed_out = 0, not greedy_done
+    if local_search and not timed_out:
+        moves, timed_out = _local_search(plan, task_ids, movable_mask, deadline)
+    after = _overload_stats(plan.loads, capacity)
+
+    reassignments = [
+        {
+            "task_id": task_ids[i],
+            "from_user_id": users[original_owner[i]]["id"],
+            "to_user_id": users[plan.owner[i]]["id"],
+            "labor": round(loaded[i][0]["labor"], ROUND_DECIMALS),
+        }
+        for i in movable_items if plan.owner[i] != original_owner[i]
+    ]
+
+    assigned_tasks = [set() for _ in users]
+    for i, owner in enumerate(plan.owner.tolist()):
+        assigned_tasks[owner].add(task_ids[i])
+    days = [start_date + timedelta(days=d) for d in range(n_days)]
+    loads = np.round(plan.loads, ROUND_DECIMALS) + 0.0 # + 0.0 turns -0.0 into 0.0
+    overloads = np.round(np.maximum(plan.loads - capacity[:, None], 0.0), ROUND_DECIMALS) + 0.0
+    allocations = []
+    for u, user in enumerate(users):
+        load_row, over_row = loads[u].tolist(), overloads[u].tolist()
+        allocations.append({
+            "user_id": user["id"],
+            "capacity": float(capacity[u]),
+            "peak_overload": max(over_row, default=0.0),
+            "total_overload": round(sum(over_row), ROUND_DECIMALS),
+            "task_ids": sorted(assigned_tasks[u]),
+            "daily": [
+                {"date": days[d], "allocated_labor": load_row[d], "overload": over_row[d]}
+                for d in range(n_days)
+            ],
+        })
+
+    return {
+        "peak_overload_before": round(before[0], ROUND_DECIMALS),
+        "total_overload_before": round(before[1], ROUND_DECIMALS),
+        "peak_overload_after": round(after[0], ROUND_DECIMALS),
+        "total_overload_after": round(after[1], ROUND_DECIMALS),
+        "start": start,
+        "local_search_moves": moves,
+        "timed_out": timed_out,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "reassignments": reassignments,
+        "allocations": allocations,
+    }
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, constr
 from datetime import datetime, date
 from typing import Optional, List
 
@@ -17,6 +17,14 @@ class TokenData(BaseModel):
 class TokenResponse(BaseModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: Optional[str] = None # Exchange at /auth/refresh for a new pair before access_token expires
+    expires_in: Optional[int] = None # Seconds
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
 
 # --- Teams ---
 class TeamBase(BaseModel):
@@ -122,6 +130,23 @@ class TaskResponse(Task):
     """Task details including assignees/partners"""
     assignees: List[TaskAssignee] = []
 
+class TaskPage(BaseModel):
+    """One page of tasks; pass next_cursor back as ?cursor= to fetch the next page"""
+    items: List[TaskResponse] = []
+    next_cursor: Optional[str] = None
+
+class BulkImportRowError(BaseModel):
+    row: int # 1-based position of the record in the uploaded stream
+    error: str
+
+class BulkImportResult(BaseModel):
+    total_rows: int
+    imported: int
+    failed: int
+    errors: List[BulkImportRowError] = []
+    errors_truncated: bool = False # Only the first errors are listed for very bad files
+    task_ids: Optional[List[int]] = None # Created task ids in input order (with ?return_ids=true)
+
 class TaskUpdateData(BaseModel):
     """Data for updating a task"""
     description: Optional[str] = Field(None, max_length=255)
@@ -191,6 +216,22 @@ class Team(TeamBase):
     class Config:
         orm_mode = True # or from_attributes = True
 
+class TaskStatusCounts(BaseModel):
+    not_started: int = 0
+    in_progress: int = 0
+    paused: int = 0
+    completed: int = 0
+    cancelled: int = 0
+
+class TeamMemberWorkload(UserResponse):
+    """A team member with aggregates over the team's tasks they are assignee or partner of"""
+    open_tasks: int # Not Started + In Progress + Paused
+    tasks_by_status: TaskStatusCounts
+    planned_labor: float # The member's own share, not the task totals
+    actual_labor: float
+    overdue_tasks: int # Open and past the completion date
+    upcoming_tasks: int # Open and due within the next 3 days
+
 # --- Users (Additions) ---
 class UserUpdate(BaseModel):
     # Fields users might update for themselves or managers might update
@@ -216,6 +257,32 @@ class NotificationBase(BaseModel):
     message: str
     is_read: bool = False
 
+class Notification(BaseModel):
+    id: int
+    recipient_email: str
+    subject: str
+    body: Optional[str] = None
+    sent_at: datetime
+    is_read: bool
+
+class NotificationPage(BaseModel):
+    """One page of notifications, newest first; pass next_cursor back as ?cursor= for the next page"""
+    items: List[Notification] = []
+    next_cursor: Optional[str] = None
+
+class NotificationBulkCreate(BaseModel):
+    recipients: List[constr(min_length=1, max_length=100)] = Field(..., min_length=1, max_length=5000) # recipient_email is NVARCHAR(100)
+    subject: str = Field(..., max_length=255)
+    body: Optional[str] = None
+
+class CreatedNotification(BaseModel):
+    id: int
+    recipient_email: str
+
+class UnreadNotificationCount(BaseModel):
+    recipient_email: str
+    unread: int
+
 
 
 class TeamTaskDistributionItem(BaseModel):
@@ -227,9 +294,55 @@ class DailyTaskDistribution(BaseModel):
     planned_labor: float
     actual_labor: float
     remaining_labor: float
-    tasks: List[TaskResponse]  # Bu tarih için detaylı görev bilgileri
+    tasks: List[TaskResponse] = []  # Bu tarih için detaylı görev bilgileri (empty in compact mode)
+    task_ids: Optional[List[int]] = None  # Compact mode: ids into UserDetailedTaskDistribution.tasks
 
 class UserDetailedTaskDistribution(BaseModel):
     user_id: int
     user_name: str
-    daily_distribution: List[DailyTaskDistribution]
\ No newline at end of file
+    daily_distribution: List[DailyTaskDistribution]
+    tasks: Optional[List[TaskResponse]] = None  # Compact mode: every task once
+
+# --- Load Balancing Plan ---
+class DailyAllocation(BaseModel):
+    date: date
+    allocated_labor: float
+    overload: float  # Labor above the user's daily capacity
+
+class UserAllocation(BaseModel):
+    user_id: int
+    user_name: str
+    capacity: float
+    peak_overload: float
+    total_overload: float
+    task_ids: List[int]
+    daily: List[DailyAllocation]
+
+class TaskReassignment(BaseModel):
+    task_id: int
+    from_user_id: int
+    to_user_id: int
+    labor: float  # Remaining labor that moves with the assignment
+
+class TaskDistributionPlan(BaseModel):
+    team_id: int
+    start_date: date
+    end_date: date
+    peak_overload_before: float
+    total_overload_before: float
+    peak_overload_after: float
+    total_overload_after: float
+    start: str  # 'greedy' or 'current': which assignment local search started from
+    local_search_moves: int
+    timed_out: bool
+    elapsed_ms: float
+    reassignments: List[TaskReassignment]
+    allocations: List[UserAllocation]
+
+class UserDayLabor(BaseModel):
+    user_id: int
+    date: date
+    planned_labor: float
+    actual_labor: float
+    remaining_labor: float
+    task_count: int
@@ -0,0 +1,52 @@
+"""
+Trusted-output JSON responses.
+
+When a route returns plain data, FastAPI validates it against the route's response_model
+and then encodes the result, which for large task listings and analytics payloads costs
+more CPU than the queries behind them. Rows the backend builds itself (e.g.
+get_tasks_with_assignees, the analytics dicts) already have the response model's shape, so
+those routes return a TrustedJSONResponse instead: the body is encoded once, with orjson
+when it is installed, and FastAPI skips validation. The response_model stays on the route,
+so the OpenAPI schema is unchanged. Only use this for data whose shape the code controls.
+Records from rows.RowMapper are encoded through their compiled as_dict.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from fastapi import Response
+
+from rows import Record
+
+try:
+    import orjson
+except ImportError: # Falls back to the standard library encoder
+    orjson = None
+
+
+def _json_default(value):
+    if isinstance(value, Record):
+        return value.as_dict()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_json(content) -> bytes:
+    """Encodes dicts/lists of JSON types, records, dates and Decimals as compact UTF-8 JSON"""
+    if orjson is not None:
+        # Records are dataclasses; as_dict is faster than orjson's generic dataclass path
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(content, default=_json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class TrustedJSONResponse(Response):
+    """JSON response for internally produced data; bytes content is sent as already encoded JSON"""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dump_json(content)
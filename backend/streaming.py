@@ -0,0 +1,113 @@
+"""
+Constant-memory NDJSON streaming for large listings.
+
+A QueryStream holds its own pooled connection (a get_db connection may already be
+released when a streamed body is sent) and reads the result with fetchmany, so only one
+batch of rows plus one output chunk is in memory at a time. Endpoints opt in with
+?stream=1 or an "Accept: application/x-ndjson" header.
+"""
+import threading
+import time
+
+import pyodbc
+from fastapi import HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from database import pool, PoolTimeout
+from serialization import dump_json
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+STREAM_BATCH_SIZE = 500 # Rows per fetchmany
+STREAM_CHUNK_BYTES = 64 * 1024 # Output is sent in chunks of about this size
+
+
+def wants_stream(request: Request, stream: bool, limit=None, cursor=None) -> bool:
+    """True if the client asked for NDJSON; a stream is always the full result, never a page"""
+    if not (stream or NDJSON_MEDIA_TYPE in request.headers.get("accept", "")):
+        return False
+    if limit is not None or cursor is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Streaming cannot be combined with limit or cursor")
+    return True
+
+
+class QueryStream:
+    """
+    Iterates the rows of one query. The query runs when the stream is created, so pool
+    exhaustion and SQL errors surface before any response is sent. The connection goes
+    back to the pool when the rows run out or close() is called, whichever comes first.
+    """
+
+    def __init__(self, sql: str, params=(), batch_size: int = STREAM_BATCH_SIZE, query=None):
+        try:
+            self._conn = pool.acquire()
+        except PoolTimeout as ex:
+            print(f"Database pool exhausted: {ex}")
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Database is busy, please retry")
+        self._lock = threading.Lock()
+        self._batch_size = batch_size
+        # A queries.Query gets the execution recorded when the stream ends: the time spent in
+        # the database (executing and fetching, not sending) and the rows read
+        self._query = query
+        self._db_seconds = 0.0
+        self._rows = 0
+        self._failed = False
+        started = time.perf_counter()
+        try:
+            self._cursor = self._conn.cursor()
+            self._cursor.execute(sql, params)
+        except Exception:
+            if query is not None:
+                query.record(time.perf_counter() - started, 0, failed=True)
+                self._query = None
+            self.close()
+            raise
+        self._db_seconds += time.perf_counter() - started
+
+    def __iter__(self):
+        try:
+            while True:
+                started = time.perf_counter()
+                rows = self._cursor.fetchmany(self._batch_size)
+                self._db_seconds += time.perf_counter() - started
+                if not rows:
+                    return
+                self._rows += len(rows)
+                yield from rows
+        except pyodbc.Error as e:
+            # Headers are already sent, so the best we can do is end the body early
+            self._failed = True
+            print(f"Database error while streaming: {e}")
+        finally:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            conn, self._conn = self._conn, None
+        if conn is not None:
+            pool.release(conn)
+            if self._query is not None:
+                self._query.record(self._db_seconds, self._rows, failed=self._failed)
+
+
+def encode_ndjson(records):
+    """Serializes records one per line, yielding chunks of about STREAM_CHUNK_BYTES"""
+    buffer = []
+    size = 0
+    for record in records:
+        line = dump_json(record)
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= STREAM_CHUNK_BYTES:
+            buffer.append(b"")
+            yield b"\n".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        buffer.append(b"")
+        yield b"\n".join(buffer)
+
+
+def ndjson_response(records, stream: QueryStream) -> StreamingResponse:
+    # The background close covers bodies that are never iterated to the end
+    return StreamingResponse(encode_ndjson(records), media_type=NDJSON_MEDIA_TYPE, background=BackgroundTask(stream.close))
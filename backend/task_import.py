@@ -0,0 +1,303 @@
+"""
+Bulk task import: incremental NDJSON / JSON-array parsing and set-based chunk inserts.
+
+Rows are staged with fast_executemany into session temp tables, then moved into
+tasks, task_assignees, task_history and the user_day_labor rollup with one
+INSERT ... SELECT (or MERGE) each, so a chunk of thousands of tasks costs a handful
+of round trips.
+"""
+import codecs
+import json
+from typing import List, Optional, Tuple
+
+import pyodbc
+from pydantic import ValidationError
+
+from database import chunked
+from queries import Query, placeholders
+from rollups import add_staged_day_labor
+from cache import bump_data_versions
+from events import publish_task_event
+from schemas import TaskCreateData
+
+# Values enforced by CHECK constraints in schemas/schema.sql, validated up front so one
+# bad row fails on its own instead of failing its whole chunk in the database.
+TASK_PRIORITIES = {'High', 'Medium', 'Low'}
+TASK_STATUSES = {'Not Started', 'In Progress', 'Paused', 'Completed', 'Cancelled'}
+ASSIGNEE_ROLES = {'assignee', 'partner', 'notified'}
+
+# A single JSON-array element larger than this is treated as malformed rather than buffered further
+MAX_RECORD_CHARS = 1_000_000
+MAX_REPORTED_ERRORS = 1000
+
+# Staging tables are session temp tables: each import runs on one connection
+_DROP_STAGING_SQL = """
+    IF OBJECT_ID('tempdb..#bulk_tasks') IS NOT NULL DROP TABLE #bulk_tasks;
+    IF OBJECT_ID('tempdb..#bulk_assignees') IS NOT NULL DROP TABLE #bulk_assignees;
+    IF OBJECT_ID('tempdb..#bulk_ids') IS NOT NULL DROP TABLE #bulk_ids;
+"""
+CREATE_STAGING_TABLES = Query("task_import.create_staging", _DROP_STAGING_SQL + """
+    CREATE TABLE #bulk_tasks (
+        row_no INT PRIMARY KEY,
+        description NVARCHAR(255) NOT NULL,
+        priority NVARCHAR(20) NOT NULL,
+        team_id INT NOT NULL,
+        start_date DATE NOT NULL,
+        completion_date DATE NOT NULL,
+        planned_labor FLOAT NOT NULL,
+        actual_labor FLOAT NOT NULL,
+        work_size INT NOT NULL,
+        roadmap NVARCHAR(MAX) NOT NULL,
+        status NVARCHAR(20) NOT NULL
+    );
+    CREATE TABLE #bulk_assignees (
+        row_no INT NOT NULL,
+        user_id INT NOT NULL,
+        role NVARCHAR(20) NOT NULL,
+        planned_labor FLOAT NULL,
+        actual_labor FLOAT NOT NULL
+    );
+    CREATE TABLE #bulk_ids (row_no INT PRIMARY KEY, task_id INT NOT NULL);
+""")
+DROP_STAGING_TABLES = Query("task_import.drop_staging", _DROP_STAGING_SQL)
+CLEAR_STAGING_TABLES = Query("task_import.clear_staging", "DELETE FROM #bulk_tasks; DELETE FROM #bulk_assignees; DELETE FROM #bulk_ids;")
+EXISTING_TEAM_IDS = Query("task_import.existing_team_ids", "SELECT id FROM teams WHERE id IN ({ids})")
+EXISTING_USER_IDS = Query("task_import.existing_user_ids", "SELECT id FROM users WHERE id IN ({ids})")
+STAGE_TASKS = Query("task_import.stage_tasks", """
+    INSERT INTO #bulk_tasks (row_no, description, priority, team_id, start_date, completion_date,
+                             planned_labor, actual_labor, work_size, roadmap, status)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+""")
+STAGE_ASSIGNEES = Query("task_import.stage_assignees", """
+    INSERT INTO #bulk_assignees (row_no, user_id, role, planned_labor, actual_labor)
+    VALUES (?, ?, ?, ?, ?)
+""")
+# MERGE (unlike INSERT) can OUTPUT source columns, which maps each staged row to its new task id
+INSERT_STAGED_TASKS = Query("task_import.insert_tasks", """
+    MERGE INTO tasks AS target
+    USING #bulk_tasks AS src ON 1 = 0
+    WHEN NOT MATCHED THEN
+        INSERT (description, priority, team_id, start_date, completion_date, creator_id,
+                planned_labor, work_size, roadmap, status, actual_labor)
+        VALUES (src.description, src.priority, src.team_id, src.start_date, src.completion_date, ?,
+                src.planned_labor, src.work_size, src.roadmap, src.status, src.actual_labor)
+    OUTPUT src.row_no, INSERTED.id INTO #bulk_ids (row_no, task_id);
+""")
+INSERT_STAGED_ASSIGNEES = Query("task_import.insert_assignees", """
+    INSERT INTO task_assignees (task_id, user_id, role, planned_labor, actual_labor)
+    SELECT i.task_id, a.user_id, a.role, a.planned_labor, a.actual_labor
+    FROM #bulk_assignees a
+    JOIN #bulk_ids i ON i.row_no = a.row_no
+""")
+INSERT_STAGED_HISTORY = Query("task_import.insert_history", """
+    INSERT INTO task_history (task_id, user_id, action, timestamp, details)
+    SELECT i.task_id, ?, 'create', GETDATE(), CONCAT('Task ''', LEFT(t.description, 50), '...'' created (bulk import).')
+    FROM #bulk_ids i
+    JOIN #bulk_tasks t ON t.row_no = i.row_no
+""")
+CREATED_TASK_IDS = Query("task_import.created_ids", "SELECT row_no, task_id FROM #bulk_ids ORDER BY row_no")
+
+
+class RecordStreamParser:
+    """
+    Incrementally parses either NDJSON (one object per line) or a single JSON array of
+    objects, detected from the first non-whitespace character. feed() accepts bytes as
+    they arrive and returns the completed records as (row_no, record, error) tuples;
+    close() flushes the tail. In array mode a syntax error cannot be recovered from, so
+    parsing stops after reporting it.
+    """
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self._buffer = ""
+        self._mode = None # "ndjson" or "array"
+        self._array_closed = False
+        self.aborted = False
+        self.row_no = 0
+
+    def _next_row(self, record=None, error=None):
+        self.row_no += 1
+        return (self.row_no, record, error)
+
+    def _parse_ndjson(self, final: bool):
+        results = []
+        lines = self._buffer.split("\n")
+        self._buffer = "" if final else lines.pop()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                results.append(self._next_row(record=json.loads(line)))
+            except json.JSONDecodeError as e:
+                results.append(self._next_row(error=f"Invalid JSON: {e.msg}"))
+        return results
+
+    def _parse_array(self, final: bool):
+        results = []
+        buffer = self._buffer
+        pos = 0
+        while not self._array_closed and not self.aborted:
+            while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                self._array_closed = True
+                pos += 1
+                break
+            try:
+                record, pos = self._json.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if final or len(buffer) - pos > MAX_RECORD_CHARS:
+                    results.append(self._next_row(error=f"Invalid JSON array element: {e.msg}"))
+                    self.aborted = True
+                break # Otherwise the element is incomplete: wait for more data
+            results.append(self._next_row(record=record))
+        self._buffer = buffer[pos:]
+        if final and not self._array_closed and not self.aborted:
+            results.append(self._next_row(error="JSON array is not terminated with ']'"))
+            self.aborted = True
+        return results
+
+    def _parse(self, final: bool):
+        if self.aborted:
+            return []
+        if self._mode is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self._mode = "array" if stripped[0] == "[" else "ndjson"
+            if self._mode == "array":
+                self._buffer = stripped[1:]
+        if self._mode == "array":
+            return self._parse_array(final)
+        return self._parse_ndjson(final)
+
+    def feed(self, data: bytes):
+        self._buffer += self._decoder.decode(data)
+        return self._parse(final=False)
+
+    def close(self):
+        self._buffer += self._decoder.decode(b"", final=True)
+        return self._parse(final=True)
+
+
+def validate_record(record) -> Tuple[Optional[TaskCreateData], Optional[str]]:
+    """Validates one parsed record against TaskCreateData and the table CHECK constraints"""
+    if not isinstance(record, dict):
+        return None, "Each row must be a JSON object"
+    try:
+        task = TaskCreateData(**record)
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+    if task.priority not in TASK_PRIORITIES:
+        return None, f"priority must be one of {', '.join(sorted(TASK_PRIORITIES))}"
+    if task.status not in TASK_STATUSES:
+        return None, f"status must be one of {', '.join(sorted(TASK_STATUSES))}"
+    bad_roles = {assignee.role for assignee in task.assignees} - ASSIGNEE_ROLES
+    if bad_roles:
+        return None, f"assignee role must be one of {', '.join(sorted(ASSIGNEE_ROLES))}"
+    return task, None
+
+
+def create_staging_tables(db):
+    CREATE_STAGING_TABLES.execute(db.cursor())
+    db.commit() # Keep the staging tables alive across chunk rollbacks
+
+
+def drop_staging_tables(db):
+    try:
+        DROP_STAGING_TABLES.execute(db.cursor())
+        db.commit()
+    except pyodbc.Error as e:
+        print(f"Could not drop bulk import staging tables: {e}")
+
+
+def _existing_ids(cursor, query: Query, ids) -> set:
+    found = set()
+    ids = list(ids)
+    for chunk in chunked(ids):
+        found.update(row[0] for row in query.fetchall(cursor, chunk, ids=placeholders(chunk)))
+    return found
+
+
+def import_task_chunk(db, rows: List[Tuple[int, TaskCreateData]], creator_id: int):
+    """
+    Inserts one chunk of validated rows in its own transaction.
+    Returns (created: list of (row_no, task_id), errors: list of (row_no, message)).
+    Rows referencing unknown teams or users are rejected individually; a database error
+    rolls back and fails the whole chunk.
+    """
+    cursor = db.cursor()
+    errors = []
+
+    # Foreign keys, checked per chunk with one query per table
+    known_teams = _existing_ids(cursor, EXISTING_TEAM_IDS, {task.team_id for _, task in rows})
+    known_users = _existing_ids(cursor, EXISTING_USER_IDS, {a.user_id for _, task in rows for a in task.assignees})
+    valid_rows = []
+    for row_no, task in rows:
+        if task.team_id not in known_teams:
+            errors.append((row_no, f"Team {task.team_id} does not exist"))
+            continue
+        missing_users = sorted({a.user_id for a in task.assignees} - known_users)
+        if missing_users:
+            errors.append((row_no, f"Unknown assignee user id(s): {', '.join(map(str, missing_users))}"))
+            continue
+        valid_rows.append((row_no, task))
+    if not valid_rows:
+        return [], errors
+
+    task_values = []
+    assignee_values = []
+    for row_no, task in valid_rows:
+        # Task totals are the sums over the assignees, as in create_task
+        total_planned = sum(a.planned_labor or 0.0 for a in task.assignees)
+        total_actual = sum(a.actual_labor or 0.0 for a in task.assignees)
+        task_values.append((
+            row_no, task.description, task.priority, task.team_id, task.start_date, task.completion_date,
+            total_planned, total_actual, task.work_size, task.roadmap, task.status
+        ))
+        assignee_values.extend(
+            (row_no, a.user_id, a.role, a.planned_labor, a.actual_labor or 0.0) for a in task.assignees
+        )
+
+    try:
+        CLEAR_STAGING_TABLES.execute(cursor)
+        STAGE_TASKS.executemany(cursor, task_values)
+        STAGE_ASSIGNEES.executemany(cursor, assignee_values)
+        INSERT_STAGED_TASKS.execute(cursor, (creator_id,))
+        INSERT_STAGED_ASSIGNEES.execute(cursor)
+        add_staged_day_labor(db)
+        INSERT_STAGED_HISTORY.execute(cursor, (creator_id,))
+        created = [(row[0], row[1]) for row in CREATED_TASK_IDS.fetchall(cursor)]
+        db.commit()
+        team_ids = {task.team_id for _, task in valid_rows}
+        user_ids = {a.user_id for _, task in valid_rows for a in task.assignees}
+        bump_data_versions(team_ids, user_ids)
+        publish_task_event("imported", None, team_ids, user_ids) # One event per chunk, not per task
+        return created, errors
+    except pyodbc.Error as e:
+        db.rollback()
+        print(f"Database error importing rows {valid_rows[0][0]}-{valid_rows[-1][0]}: {e}")
+        errors.extend((row_no, f"Database error, chunk rolled back: {e}") for row_no, _ in valid_rows)
+        return [], errors
+
+
+def import_records(db, records: List[Tuple[int, object]], creator_id: int):
+    """Validates a chunk of parsed (row_no, record) pairs and imports the valid ones"""
+    valid_rows = []
+    errors = []
+    for row_no, record in records:
+        task, error = validate_record(record)
+        if error:
+            errors.append((row_no, error))
+        else:
+            valid_rows.append((row_no, task))
+    if not valid_rows:
+        return [], errors
+    created, chunk_errors = import_task_chunk(db, valid_rows, creator_id)
+    return created, sorted(errors + chunk_errors)
@@ -0,0 +1,227 @@
+"""
+Access tokens, refresh tokens and revocation.
+
+Access tokens are short-lived JWTs carrying every UserInfo field, so an authenticated
+request costs a signature check plus an in-memory revocation lookup, with no database round
+trip. A name or email edit shows up in tokens issued after it (at the latest on the next
+refresh); role and team changes revoke the older tokens, since access checks rely on them. Refresh tokens are random strings stored as SHA-256 hashes in refresh_tokens. Each
+refresh consumes the token and issues a new pair. Presenting a consumed refresh token again
+revokes its whole family (every token descending from the same login), which cuts off both
+a stolen copy and the original.
+
+Access tokens cannot be recalled, so revocations are recorded in revoked_tokens until the
+tokens they cover have expired. There are two kinds: one token (logout), or every token a
+user was issued before a moment (password, role and team changes). Each process keeps them in
+memory: it loads them at startup, adds its own once they are committed, and merges the table every
+TOKEN_REVOCATION_SYNC_SECONDS so revocations made by other workers apply there too.
+"""
+import hashlib
+import os
+import secrets
+import threading
+import time
+import uuid
+from typing import Optional
+
+from jose import jwt
+
+from database import db_connection
+from queries import (
+    INSERT_REFRESH_TOKEN, CONSUME_REFRESH_TOKEN, SPENT_REFRESH_TOKEN, REFRESH_TOKEN_FAMILY, REVOKE_REFRESH_FAMILY,
+    REVOKE_USER_REFRESH_TOKENS, INSERT_REVOKED_TOKEN, INSERT_REVOKED_USER, LIVE_REVOCATIONS, PRUNE_REVOCATIONS
+)
+from schemas import UserInfo
+
+# It's CRITICAL to use a strong, randomly generated secret key
+# and load it from environment variables, not hardcode it.
+SECRET_KEY = os.environ.get("SECRET_KEY", "42f8b087f248c080cd415cb90e8b84f64ff8cee683e4b9b419eb590f053ffe5d549c360ec721a8bfd95761511c46b35047b5d6f36b161e7134143a7cc9d6f2863502fb460bc9fbaf36fe27430ace346e8fb9f3902968071124972c4ed5907d77031d4c724c878f18ef5a24b58125a43e57a05aefdae48a075d08a8a79c393f644ab2a5e09436a51e451486690c89896436def00de4156f161ff30fe824de98e6c487206af3fb2bcd8c408fc3bab1d3a40b3946db09889113d906ce4b09ed9316facb49e23ddcede3f1d58f565ef3d1667207fa20d341f8df73eca1606cb3ed2d3a1fc0889e865b61f9a83bb93e252562cd9e23c9b3ef9e472668b63daeb7f994") # CHANGE THIS
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.environ.get("REFRESH_TOKEN_EXPIRE_DAYS", "14"))
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.environ.get("TOKEN_REVOCATION_SYNC_SECONDS", "30"))
+
+ACCESS_TOKEN_TTL_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+
+# --- Access tokens ---
+def create_access_token(user: UserInfo) -> str:
+    now = time.time()
+    claims = {
+        "sub": user.username, # Use 'sub' (subject) for username as standard
+        "user_id": user.id,
+        "role": user.role,
+        "team_id": user.team_id,
+        "name": user.name,
+        "email": user.email,
+        "iat": now, # Fractional, so a token issued right after a revocation is newer than it
+        "exp": now + ACCESS_TOKEN_TTL_SECONDS,
+        "jti": uuid.uuid4().hex,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def token_response(user: UserInfo, refresh_token: str) -> dict:
+    return {
+        "access_token": create_access_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_TTL_SECONDS,
+    }
+
+
+# --- Refresh tokens ---
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue_refresh_token(db, user_id: int, family_id: Optional[str] = None) -> str:
+    """Stores a new refresh token (in the caller's transaction); no family_id starts a new login family"""
+    token = secrets.token_urlsafe(32)
+    INSERT_REFRESH_TOKEN.execute(
+        db.cursor(), (user_id, family_id or uuid.uuid4().hex, _token_hash(token), REFRESH_TOKEN_EXPIRE_DAYS)
+    )
+    return token
+
+
+def consume_refresh_token(db, token: str):
+    """
+    Marks a live refresh token used and returns (user_id, family_id), or None. A token that
+    was already used or revoked revokes its family (committed here, whatever the caller does).
+    """
+    token_hash = _token_hash(token)
+    cursor = db.cursor()
+    row = CONSUME_REFRESH_TOKEN.fetchone(cursor, (token_hash,))
+    if row is not None:
+        return row[0], row[1]
+
+    reused = SPENT_REFRESH_TOKEN.fetchone(cursor, (token_hash,))
+    if reused is not None:
+        print(f"Used or revoked refresh token presented for user {reused[0]}, revoking its login family")
+        revoke_refresh_family(db, reused[1])
+        db.commit()
+    return None
+
+
+def revoke_refresh_family(db, family_id: str):
+    REVOKE_REFRESH_FAMILY.execute(db.cursor(), (family_id,))
+
+
+def revoke_user_refresh_tokens(db, user_id: int):
+    REVOKE_USER_REFRESH_TOKENS.execute(db.cursor(), (user_id,))
+
+
+def revoke_refresh_token(db, token: str):
+    """Logout: ends the token's whole login family"""
+    family_id = REFRESH_TOKEN_FAMILY.scalar(db.cursor(), (_token_hash(token),))
+    if family_id is not None:
+        revoke_refresh_family(db, family_id)
+
+
+# --- Revocation of access tokens ---
+class TokenRevocations:
+    """In-memory view of revoked_tokens; all times are epoch seconds"""
+
+    def __init__(self, sync_interval: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._tokens = {} # jti -> expires_at
+        self._users = {} # user_id -> (revoked_before, expires_at)
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_sync_error = None
+
+    def is_revoked(self, jti: str, user_id: int, issued_at: float) -> bool:
+        if jti in self._tokens:
+            return True
+        user = self._users.get(user_id)
+        return user is not None and issued_at < user[0]
+
+    def _add(self, jti, user_id, revoked_before, expires_at):
+        with self._lock:
+            if jti is not None:
+                self._tokens[jti] = expires_at
+            if user_id is not None:
+                current = self._users.get(user_id)
+                if current is None or current[0] < revoked_before:
+                    self._users[user_id] = (revoked_before, expires_at)
+
+    def revoke_token(self, db, jti: str, expires_at: float) -> tuple:
+        """Records a revocation of one access token in the caller's transaction; pass the result to apply() once it commits"""
+        INSERT_REVOKED_TOKEN.execute(db.cursor(), (jti, expires_at))
+        return (jti, None, None, expires_at)
+
+    def revoke_user(self, db, user_id: int) -> tuple:
+        """Records a revocation of every access token issued to the user so far, like revoke_token;
+        clients get new claims by refreshing"""
+        now = time.time()
+        expires_at = now + ACCESS_TOKEN_TTL_SECONDS # Older tokens have expired by then anyway
+        INSERT_REVOKED_USER.execute(db.cursor(), (user_id, now, expires_at))
+        return (None, user_id, now, expires_at)
+
+    def apply(self, pending: tuple):
+        """Enforces a committed revocation in this process right away, instead of at the next sync"""
+        self._add(*pending)
+
+    def sync(self):
+        """Merges unexpired revocations from the table and forgets expired ones"""
+        now = time.time()
+        with db_connection() as db:
+            rows = LIVE_REVOCATIONS.fetchall(db.cursor(), (now,))
+        for jti, user_id, revoked_before, expires_at in rows:
+            self._add(jti, user_id, revoked_before, expires_at)
+        with self._lock:
+            self._tokens = {jti: expires_at for jti, expires_at in self._tokens.items() if expires_at > now}
+            self._users = {user_id: entry for user_id, entry in self._users.items() if entry[1] > now}
+
+    def prune_table(self):
+        with db_connection() as db:
+            PRUNE_REVOCATIONS.execute(db.cursor(), (time.time(),))
+            db.commit()
+
+    def start(self):
+        try:
+            self.prune_table()
+            self.sync()
+        except Exception as e:
+            # Like the pool, start without the DB; the sync thread loads the list once it is reachable
+            self._last_sync_error = str(e)
+            print(f"Could not load token revocations: {e}")
+        self._thread = threading.Thread(target=self._run, name="token-revocation-sync", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            try:
+                self.sync()
+                self._last_sync_error = None
+            except Exception as e:
+                # Keep serving with what is in memory; the next sync catches up
+                self._last_sync_error = str(e)
+                print(f"Error syncing token revocations: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revoked_tokens": len(self._tokens),
+                "revoked_users": len(self._users),
+                "last_sync_error": self._last_sync_error,
+            }
+
+
+revocations = TokenRevocations()
+
+
+def user_from_claims(payload: dict) -> UserInfo:
+    return UserInfo(
+        id=payload["user_id"],
+        username=payload["sub"],
+        email=payload["email"],
+        name=payload["name"],
+        role=payload["role"],
+        team_id=payload["team_id"],
+    )
@@ -2,6 +2,7 @@
 
 import { useState, useEffect } from "react"
 import { api } from "@/lib/api"
+import { eventStream } from "@/lib/events"
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card"
 import { Alert, AlertDescription, AlertTitle } from "@/components/ui/alert"
 import { Badge } from "@/components/ui/badge"
@@ -28,8 +29,6 @@ export function ManagerAlerts({ teamId }: ManagerAlertsProps) {
       if (!teamId) return
 
       try {
-        setIsLoading(true)
-
         // Fetch all team tasks
         const response = await api.get(`/tasks?team_id=${teamId}`)
 
@@ -79,9 +78,12 @@ export function ManagerAlerts({ teamId }: ManagerAlertsProps) {
 
     fetchAlerts()
 
-    // Set up polling for alerts every 5 minutes
-    const intervalId = setInterval(fetchAlerts, 300000)
-    return () => clearInterval(intervalId)
+    // Refetch when the team's tasks change (pushed over the event stream) instead of polling
+    const unsubscribers = [
+      eventStream.subscribe("task", fetchAlerts),
+      eventStream.subscribe("resync", fetchAlerts),
+    ]
+    return () => unsubscribers.forEach((unsubscribe) => unsubscribe())
   }, [teamId])
 
   if (isLoading) {
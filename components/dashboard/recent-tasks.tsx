@@ -33,7 +33,8 @@ export function RecentTasks({ userId }: RecentTasksProps) {
 
       try {
         setIsLoading(true)
-        const response = await api.get(`/users/${userId}/tasks?limit=5&sort=created_at:desc`)
+        // With a limit the API returns one page: { items, next_cursor }
+        const { items: response } = await api.get(`/users/${userId}/tasks?limit=5&sort=created_at:desc`)
         
         // Sort tasks: Incomplete first, then by completion status, then by priority
         const sortedTasks = response.sort((a: Task, b: Task) => {
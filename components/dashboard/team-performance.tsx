@@ -38,56 +38,30 @@ export function TeamPerformance({ teamId }: TeamPerformanceProps) {
       try {
         setIsLoading(true)
 
-        // Fetch team members
-        const usersResponse = await api.get("/users")
-        const teamMembers = usersResponse.filter((user: any) => user.team_id === teamId)
-
-        // Fetch tasks for each team member
-        const membersWithPerformance = await Promise.all(
-          teamMembers.map(async (member: any) => {
-            const tasksResponse = await api.get(`/users/${member.id}/tasks`)
-
-            // Calculate task statistics
-            const total = tasksResponse.length
-            const completed = tasksResponse.filter((t: any) => t.status === "Completed").length
-
-            // Calculate overdue tasks
-            const overdue = tasksResponse.filter((t: any) => {
-              const completionDate = new Date(t.completion_date)
-              completionDate.setHours(23, 59, 59, 999) // Set to end of the day
-              const today = new Date()
-              today.setHours(0, 0, 0, 0) // Set to start of the day
-              return completionDate < today && t.status !== "Completed"
-            }).length
-
-            // Calculate upcoming tasks (due in next 3 days)
-            const upcoming = tasksResponse.filter((t: any) => {
-              const dueDate = new Date(t.completion_date)
-              const today = new Date()
-              const diffTime = dueDate.getTime() - today.getTime()
-              const diffDays = Math.ceil(diffTime / (1000 * 60 * 60 * 24))
-              return diffDays <= 3 && diffDays > 0 && t.status !== "Completed"
-            }).length
-
-            // Calculate efficiency (actual vs planned labor)
-            const totalPlannedLabor = tasksResponse.reduce((sum: number, t: any) => sum + t.planned_labor, 0)
-            const totalActualLabor = tasksResponse.reduce((sum: number, t: any) => sum + t.actual_labor, 0)
-            const efficiency = totalPlannedLabor > 0 ? Math.round((totalActualLabor / totalPlannedLabor) * 100) : 100
-
-            return {
-              id: member.id,
-              name: member.name,
-              role: member.role,
-              tasks: {
-                total,
-                completed,
-                overdue,
-                upcoming,
-              },
-              efficiency,
-            }
-          }),
-        )
+        // Members with their task statistics, aggregated by the backend in one request
+        const teamMembers = await api.get(`/teams/${teamId}/members`)
+
+        const membersWithPerformance = teamMembers.map((member: any) => {
+          const byStatus = member.tasks_by_status
+          const total = Object.values(byStatus).reduce((sum: number, count: any) => sum + count, 0)
+
+          // Calculate efficiency (actual vs planned labor)
+          const efficiency =
+            member.planned_labor > 0 ? Math.round((member.actual_labor / member.planned_labor) * 100) : 100
+
+          return {
+            id: member.id,
+            name: member.name,
+            role: member.role,
+            tasks: {
+              total,
+              completed: byStatus.completed,
+              overdue: member.overdue_tasks,
+              upcoming: member.upcoming_tasks,
+            },
+            efficiency,
+          }
+        })
 
         setMembers(membersWithPerformance)
       } catch (err: any) {
@@ -2,7 +2,7 @@
 
 import { createContext, useContext, useState, useEffect, type ReactNode } from "react"
 import { useRouter } from "next/navigation"
-import { api } from "@/lib/api"
+import { api, storeTokens, clearTokens } from "@/lib/api"
 import { toast } from "sonner"
 
 interface User {
@@ -42,7 +42,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
         const userData = await api.get("/auth/me")
         setUser(userData)
       } catch (error) {
-        localStorage.removeItem("token")
+        clearTokens()
       } finally {
         setIsLoading(false)
       }
@@ -64,7 +64,7 @@ export function AuthProvider({ children }: { children: ReactNode }) {
         },
       })
 
-      localStorage.setItem("token", response.access_token)
+      storeTokens(response)
 
       // Fetch user data
       const userData = await api.get("/auth/me")
@@ -81,16 +81,12 @@ export function AuthProvider({ children }: { children: ReactNode }) {
 
   const logout = async () => {
     try {
-      await api.post("/auth/logout", {
-        headers: {
-          "Content-Type": "application/json",
-        },
-      })
+      await api.post("/auth/logout", { refresh_token: localStorage.getItem("refresh_token") })
       toast.success("Çıkış yapıldı")
     } catch (error) {
       console.error("Logout error:", error)
     } finally {
-      localStorage.removeItem("token")
+      clearTokens()
       setUser(null)
       router.push("/login")
     }
@@ -3,6 +3,7 @@
 import { useState, useEffect } from "react"
 import { api } from "@/lib/api"
 import { useAuth } from "@/context/auth-context"
+import { eventStream } from "@/lib/events"
 
 interface Notification {
   id: number
@@ -13,22 +14,42 @@ interface Notification {
   is_read: boolean
 }
 
+// The header shows the newest few; older ones are fetched page by page on demand
+const PAGE_SIZE = 20
+
+interface NotificationPage {
+  items: Notification[]
+  next_cursor: string | null
+}
+
 export function useNotifications() {
   const { user } = useAuth()
   const [notifications, setNotifications] = useState<Notification[]>([])
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
   const [unreadCount, setUnreadCount] = useState(0)
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState("")
 
   useEffect(() => {
-    const fetchNotifications = async () => {
-      if (!user?.email) return
+    if (!user?.email) return
+    const email = encodeURIComponent(user.email)
+    let lastCount: number | null = null
 
+    const fetchFirstPage = async () => {
+      const page: NotificationPage = await api.get(`/notifications?recipient_email=${email}&limit=${PAGE_SIZE}`)
+      setNotifications(page.items)
+      setNextCursor(page.next_cursor)
+    }
+
+    // Fetches the unread count, and the first page only if the count changed
+    const refresh = async () => {
       try {
-        setIsLoading(true)
-        const response = await api.get(`/notifications?recipient_email=${user.email}`)
-        setNotifications(response)
-        setUnreadCount(response.filter((n: Notification) => !n.is_read).length)
+        const response = await api.get(`/notifications/unread-count?recipient_email=${email}`)
+        if (response.unread !== lastCount) {
+          await fetchFirstPage()
+          lastCount = response.unread
+        }
+        setUnreadCount(response.unread)
       } catch (err: any) {
         setError(err.message || "Failed to fetch notifications")
         console.error("Error fetching notifications:", err)
@@ -37,15 +58,36 @@ export function useNotifications() {
       }
     }
 
-    if (user?.email) {
-      fetchNotifications()
+    setIsLoading(true)
+    refresh()
 
-      // Set up polling for new notifications every minute
-      const intervalId = setInterval(fetchNotifications, 60000)
-      return () => clearInterval(intervalId)
-    }
+    // New notifications are pushed over the event stream instead of polled
+    const unsubscribers = [
+      eventStream.subscribe("notification", (notification: Notification) => {
+        setNotifications((prev) => [notification, ...prev.filter((n) => n.id !== notification.id)])
+        setUnreadCount((prev) => prev + 1)
+        if (lastCount !== null) lastCount += 1
+      }),
+      // (Re)connected or events were missed: catch up
+      eventStream.subscribe("ready", refresh),
+      eventStream.subscribe("resync", refresh),
+    ]
+    return () => unsubscribers.forEach((unsubscribe) => unsubscribe())
   }, [user?.email])
 
+  const loadMore = async () => {
+    if (!user?.email || !nextCursor) return
+    try {
+      const page: NotificationPage = await api.get(
+        `/notifications?recipient_email=${encodeURIComponent(user.email)}&limit=${PAGE_SIZE}&cursor=${nextCursor}`,
+      )
+      setNotifications((prev) => [...prev, ...page.items])
+      setNextCursor(page.next_cursor)
+    } catch (err) {
+      console.error("Error fetching more notifications:", err)
+    }
+  }
+
   const markAsRead = async (notificationId: number) => {
     try {
       await api.put(`/notifications/${notificationId}/read`, {
@@ -83,6 +125,8 @@ export function useNotifications() {
     error,
     markAsRead,
     markAllAsRead,
+    hasMore: nextCursor !== null,
+    loadMore,
   }
 }
 
@@ -1,12 +1,53 @@
-const API_BASE_URL = "http://localhost:8000/api"
+export const API_BASE_URL = "http://localhost:8000/api"
 
 interface ApiOptions {
   headers?: Record<string, string>
   body?: any
 }
 
+// Access tokens are short-lived; the refresh token gets a new pair (and is used up doing so)
+export function storeTokens(response: { access_token: string; refresh_token?: string }) {
+  localStorage.setItem("token", response.access_token)
+  if (response.refresh_token) {
+    localStorage.setItem("refresh_token", response.refresh_token)
+  }
+}
+
+export function clearTokens() {
+  localStorage.removeItem("token")
+  localStorage.removeItem("refresh_token")
+}
+
+let refreshing: Promise<boolean> | null = null
+
+// One refresh at a time: concurrent 401s wait for the same one, since a refresh token works only once
+export function refreshAccessToken(): Promise<boolean> {
+  if (!refreshing) {
+    refreshing = (async () => {
+      const refreshToken = localStorage.getItem("refresh_token")
+      if (!refreshToken) return false
+      try {
+        const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ refresh_token: refreshToken }),
+        })
+        if (!response.ok) return false
+        storeTokens(await response.json())
+        return true
+      } catch (error) {
+        console.error("Token refresh failed:", error)
+        return false
+      }
+    })().finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
 class ApiClient {
-  async request(endpoint: string, method: string, options: ApiOptions = {}) {
+  async request(endpoint: string, method: string, options: ApiOptions = {}, retried = false): Promise<any> {
     const url = `${API_BASE_URL}${endpoint}`
 
     const token = typeof window !== "undefined" ? localStorage.getItem("token") : null
@@ -42,9 +83,12 @@ class ApiClient {
     try {
       const response = await fetch(url, config)
 
-      // Handle 401 Unauthorized - token expired or invalid
+      // Handle 401 Unauthorized - token expired or invalid: refresh once, then give up
       if (response.status === 401) {
-        localStorage.removeItem("token")
+        if (!retried && endpoint !== "/auth/token" && (await refreshAccessToken())) {
+          return this.request(endpoint, method, options, true)
+        }
+        clearTokens()
         if (typeof window !== "undefined") {
           window.location.href = "/login"
         }
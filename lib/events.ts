@@ -0,0 +1,103 @@
+import { API_BASE_URL, refreshAccessToken } from "@/lib/api"
+
+// Server-sent events from GET /api/events, shared by every listener in the tab.
+// EventSource cannot send the Authorization header, so the stream is read with fetch.
+
+type EventHandler = (data: any) => void
+
+const RECONNECT_DELAY_MS = 5000
+
+class EventStream {
+  private handlers = new Map<string, Set<EventHandler>>()
+  private controller: AbortController | null = null
+  private reconnectTimer: ReturnType<typeof setTimeout> | null = null
+
+  // Returns the unsubscribe function; the connection stays open while anyone listens
+  subscribe(eventType: string, handler: EventHandler) {
+    if (!this.handlers.has(eventType)) {
+      this.handlers.set(eventType, new Set())
+    }
+    this.handlers.get(eventType)!.add(handler)
+    this.connect()
+
+    return () => {
+      this.handlers.get(eventType)?.delete(handler)
+      if (![...this.handlers.values()].some((set) => set.size > 0)) {
+        this.disconnect()
+      }
+    }
+  }
+
+  private connect() {
+    if (this.controller || this.reconnectTimer || typeof window === "undefined") return
+    const token = localStorage.getItem("token")
+    if (!token) return
+
+    const controller = new AbortController()
+    this.controller = controller
+    this.read(token, controller)
+      .catch((err) => {
+        if (!controller.signal.aborted) console.error("Event stream error:", err)
+      })
+      .finally(() => {
+        if (this.controller !== controller) return
+        this.controller = null
+        // Events may have been missed while disconnected; "ready" on reconnect tells listeners to refetch
+        this.reconnectTimer = setTimeout(() => {
+          this.reconnectTimer = null
+          this.connect()
+        }, RECONNECT_DELAY_MS)
+      })
+  }
+
+  private disconnect() {
+    if (this.reconnectTimer) {
+      clearTimeout(this.reconnectTimer)
+      this.reconnectTimer = null
+    }
+    this.controller?.abort()
+    this.controller = null
+  }
+
+  private async read(token: string, controller: AbortController) {
+    const response = await fetch(`${API_BASE_URL}/events/`, {
+      headers: { Authorization: `Bearer ${token}`, Accept: "text/event-stream" },
+      signal: controller.signal,
+    })
+    if (response.status === 401) {
+      // Expired access token: the reconnect uses the refreshed one
+      if (await refreshAccessToken()) return
+    }
+    if (!response.ok || !response.body) {
+      throw new Error(`Event stream failed: ${response.status}`)
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader()
+    let buffer = ""
+    while (true) {
+      const { value, done } = await reader.read()
+      if (done) return
+      buffer += value
+      let end
+      while ((end = buffer.indexOf("\n\n")) !== -1) {
+        this.dispatch(buffer.slice(0, end))
+        buffer = buffer.slice(end + 2)
+      }
+    }
+  }
+
+  private dispatch(frame: string) {
+    let eventType = "message"
+    let data = ""
+    for (const line of frame.split("\n")) {
+      if (line.startsWith("event: ")) eventType = line.slice(7)
+      else if (line.startsWith("data: ")) data += line.slice(6)
+    }
+    if (!data) return // Keepalive comment
+
+    const payload = JSON.parse(data)
+    this.handlers.get(eventType)?.forEach((handler) => handler(payload))
+  }
+}
+
+export const eventStream = new EventStream()
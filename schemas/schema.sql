@@ -68,6 +68,66 @@ CREATE TABLE task_history (
     FOREIGN KEY (user_id) REFERENCES users(id)
 );
 
+-- Create Notifications Table (in-app copies of the emails sent by the frontend)
+CREATE TABLE notifications (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    recipient_email NVARCHAR(100) NOT NULL,
+    subject NVARCHAR(255) NOT NULL,
+    body NVARCHAR(MAX),
+    sent_at DATETIME NOT NULL DEFAULT GETDATE(),
+    is_read BIT NOT NULL DEFAULT 0
+);
+
+-- Keyset pages per recipient, newest first
+CREATE INDEX IX_notifications_recipient_sent ON notifications (recipient_email, sent_at DESC, id DESC)
+    INCLUDE (is_read);
+-- Unread counts and read-all touch only unread rows
+CREATE INDEX IX_notifications_unread ON notifications (recipient_email) WHERE is_read = 0;
+
+-- Create User Day Labor Rollup (per user, team and day; maintained by the task write paths,
+-- regenerated with "python manage.py rebuild-rollups")
+CREATE TABLE user_day_labor (
+    team_id INT NOT NULL,
+    user_id INT NOT NULL,
+    labor_date DATE NOT NULL,
+    planned_labor FLOAT NOT NULL DEFAULT 0,
+    actual_labor FLOAT NOT NULL DEFAULT 0,
+    task_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (team_id, labor_date, user_id),
+    FOREIGN KEY (team_id) REFERENCES teams(id),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+);
+
+CREATE INDEX IX_user_day_labor_user ON user_day_labor (user_id, labor_date)
+    INCLUDE (planned_labor, actual_labor, task_count);
+
+-- Refresh tokens, stored as SHA-256 hashes. One login's successive tokens share a family_id.
+CREATE TABLE refresh_tokens (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    user_id INT NOT NULL,
+    family_id CHAR(32) NOT NULL,
+    token_hash CHAR(64) NOT NULL UNIQUE,
+    issued_at DATETIME NOT NULL DEFAULT GETDATE(),
+    expires_at DATETIME NOT NULL,
+    revoked_at DATETIME NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IX_refresh_tokens_family ON refresh_tokens (family_id);
+CREATE INDEX IX_refresh_tokens_user_live ON refresh_tokens (user_id) WHERE revoked_at IS NULL;
+
+-- Revoked access tokens: one token (jti) or every token of a user issued before revoked_before.
+-- Times are epoch seconds, as in the tokens; rows can go once expires_at has passed.
+CREATE TABLE revoked_tokens (
+    id INT IDENTITY(1,1) PRIMARY KEY,
+    jti CHAR(32) NULL,
+    user_id INT NULL,
+    revoked_before FLOAT NULL,
+    expires_at FLOAT NOT NULL
+);
+
+CREATE INDEX IX_revoked_tokens_expires ON revoked_tokens (expires_at);
+
 -- Insert sample data for teams
 INSERT INTO teams (name) VALUES ('Team 1');
 INSERT INTO teams (name) VALUES ('Team 2');